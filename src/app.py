@@ -13,28 +13,58 @@
 ░                 ░ ░                           ░                          
 """
 
-from PIL.Image import open
+from utils import startup  # first, so that startup timings include every import
 import customtkinter as ctk
 from tkinter import PhotoImage
-from utils.misc import setup_db, get_data
-from utils.add_vault_dialog import AddVaultDialog
-from utils.delete_vault_dialog import DeleteVaultDialog
-from utils.enter_password_dialog import EnterPasswordDialog
+from utils import metrics, vacuum
+from utils.db import close_all
+from utils.backup import start_backups, stop_backups
+from utils.tasks import start_scheduler
+from utils.virtual_table import ListSource, VirtualTable
+from utils.vault_grid import VaultRow, vault_rows
+
+# The database layer, the crypto stack and the dialogs are imported on first
+# use, so that the window can be shown before they are loaded.
 
 DB_FILE = "db.sqlite"
 ICON_PNG = "assets/icon.png"
-VAULT_IMG_PATH = "assets/lock.png"
 DEFAULT_WINDOW_WIDTH = 1100
 DEFAULT_WINDOW_HEIGHT = 580
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("blue")
+startup.mark("imports")
+
+
+def load_database(db_file: str) -> list:
+    """Sets up the database and reads the vaults; runs on a worker thread at startup.
+
+    Importing the database layer here also loads the crypto stack off the UI thread.
+
+    Args:
+        db_file (str): The filename of the database to use.
+
+    Returns:
+        list: The vaults.
+    """
+    from utils.misc import setup_db
+    from utils.models import get_vault_store
+
+    # setup application database, running any pending migrations
+    setup_db(db_file)
+    # snapshot the database in the background, on a schedule and after writes
+    start_backups(db_file)
+    return get_vault_store(db_file).vaults()
 
 
 class Cryptical(ctk.CTk):
     """The main class, representing the application itself."""
 
+    VAULTS_PER_ROW = 5
+    VAULT_ROW_HEIGHT = 200
+    CHANGE_POLL_MS = 1000  # how often to check for changes made by other processes
+
     # Used later to detect whether these dialogs exist already or not.
-    del_vault_dialog = add_vault_dialog = enter_pwd_dialog = None
+    del_vault_dialog = add_vault_dialog = enter_pwd_dialog = diagnostics_window = None
 
     def __init__(self) -> None:
         """Initializes the app and its components."""
@@ -49,12 +79,29 @@ class Cryptical(ctk.CTk):
         self.rowconfigure(1, weight=1)  # enable horizontal scaling on resize
         self.columnconfigure(0, weight=1)  # enable vertical scaling on resize
 
-        # setup application database
-        setup_db(DB_FILE)
+        # start the background worker pool used by all windows
+        self.scheduler = start_scheduler(self)
 
-        # setup application ui
+        # setup application ui; the database is loaded once the window is up
         self.build_ui(DB_FILE)
+        startup.mark("window")
+        self.after(0, self.on_first_paint)
+
+        # Ctrl+Shift+D opens the diagnostics window
+        self.bind("<Control-D>", lambda event: self.init_diagnostics_window())
+
+    def on_first_paint(self) -> None:
+        """Records the first paint of the window and starts loading the database."""
+        self.update_idletasks()
+        startup.mark("first paint")
+        self.scheduler.submit(
+            load_database,
+            DB_FILE,
+            on_done=lambda vaults: self.on_vaults_loaded(DB_FILE),
+            owner=self,
+        )
 
+    @metrics.timed("ui.main.build_ui")
     def build_ui(self, db_file: str) -> None:
         """Creates the necessary widgets for the app UI.
 
@@ -79,6 +126,7 @@ class Cryptical(ctk.CTk):
             self.header,
             text="Add Vaults",
             command=lambda db=db_file: self.init_add_vault_dialog(db_file),
+            state="disabled",  # until the database is ready
         )
         self.header.button_add_vaults.pack(side="right", padx=0, pady=10)
 
@@ -87,56 +135,76 @@ class Cryptical(ctk.CTk):
             self.header,
             text="Delete Vaults",
             command=lambda: self.init_delete_vault_dialog(db_file),
+            state="disabled",  # until the database is ready
         )
         self.header.button_del_vaults.pack(
             side="right", padx=20, pady=10, before=self.header.button_add_vaults
         )
 
         # VAULT UI
-        VAULTS_PER_ROW = 5
-        available_vaults = get_data(db_file, "SELECT * FROM vaults;")
-
-        # vault container
-        self.vault_container = ctk.CTkScrollableFrame(self, fg_color="transparent")
-        self.vault_container.grid(row=1, column=0, sticky="nsew")
-
-        # setup vault container's grid
-        rows = (len(available_vaults) // VAULTS_PER_ROW) + 1
-        for i in range(rows):
-            self.vault_container.rowconfigure(i, weight=1)
-        for i in range(VAULTS_PER_ROW):
-            self.vault_container.columnconfigure(i, weight=1)
-
-        for i, vault in enumerate(available_vaults):
-            # Temporary vault frame
-            tmpv_frame = ctk.CTkFrame(
-                self.vault_container, fg_color="#212121", corner_radius=15
-            )
-            r = (i) // VAULTS_PER_ROW
-            c = (i) % VAULTS_PER_ROW
-            tmpv_frame.grid(row=r, column=c, padx=10, pady=10, sticky="nsew")
-
-            # temporary vault image
-            tmpv_img = ctk.CTkImage(
-                light_image=open(VAULT_IMG_PATH),
-                dark_image=open(VAULT_IMG_PATH),
-                size=(50, 60),
-            )
-            tmpv_img_frame = ctk.CTkLabel(tmpv_frame, text="", image=tmpv_img)
-            tmpv_img_frame.pack(expand=True, fill="x", ipady=10, padx=40, pady=10)
-
-            # temporary vault label
-            tmpv_label = ctk.CTkLabel(tmpv_frame, text=vault[1], justify="center")
-            tmpv_label.cget("font").configure(size=18, weight="bold")
-            tmpv_label.pack(expand=True, padx=20)
-
-            # temporary vault button
-            tmpv_button = ctk.CTkButton(
-                tmpv_frame,
-                text="Enter Vault",
-                command=lambda vid=vault[0]: self.init_enter_pwd_dialog(vid, db_file),
-            )
-            tmpv_button.pack(expand=True, pady=15, padx=20)
+        # a progress bar is shown until the vaults have been read
+        self.vault_progress = ctk.CTkProgressBar(self, mode="indeterminate")
+        self.vault_progress.grid(row=1, column=0, sticky="new", padx=20, pady=20)
+        self.vault_progress.start()
+
+    @metrics.timed("ui.main.show_vaults")
+    def on_vaults_loaded(self, db_file: str) -> None:
+        """Creates the vault grid once the vaults have been read.
+
+        Only the rows of tiles in view are built; scrolling rebinds them to
+        other vaults, so startup does not depend on the number of vaults.
+
+        Args:
+         - db_file (str): The filename of the database to use.
+
+        Returns: None
+        """
+        from utils.models import get_vault_store
+
+        startup.mark("database ready")
+        self.vault_progress.stop()
+        self.vault_progress.destroy()
+        self.header.button_add_vaults.configure(state="normal")
+        self.header.button_del_vaults.configure(state="normal")
+
+        store = get_vault_store(db_file)
+        self.vault_grid = VirtualTable(
+            self,
+            ListSource(lambda: vault_rows(store.vaults(), self.VAULTS_PER_ROW)),
+            lambda master: VaultRow(
+                master,
+                self.VAULTS_PER_ROW,
+                on_enter=lambda vid: self.init_enter_pwd_dialog(vid, db_file),
+            ),
+            fg_color="transparent",
+        )
+        self.vault_grid.row_height = self.VAULT_ROW_HEIGHT
+        self.vault_grid.grid(row=1, column=0, sticky="nsew")
+
+        # re-group the tiles in view as vaults are created or deleted
+        store.subscribe(lambda event, vault: self.vault_grid.refresh())
+        # and follow changes made by other instances of the app or the command line
+        self.after(self.CHANGE_POLL_MS, self.poll_external_changes, db_file)
+
+        self.update_idletasks()
+        startup.mark("vaults shown")
+        startup.report()
+        if startup.EXIT_AFTER:
+            self.destroy()
+
+    def poll_external_changes(self, db_file: str) -> None:
+        """Reloads the vaults and open vault windows if another process changed
+        the database, then checks again after CHANGE_POLL_MS.
+
+        Args:
+         - db_file (str): The filename of the database to use.
+
+        Returns: None
+        """
+        from utils.models import reload_external_changes
+
+        reload_external_changes(db_file)
+        self.after(self.CHANGE_POLL_MS, self.poll_external_changes, db_file)
 
     def init_add_vault_dialog(self, db_file: str) -> None:
         """Initializes the Add Vault Dialog if it does not already exist.
@@ -154,6 +222,8 @@ class Cryptical(ctk.CTk):
             self.add_vault_dialog.focus()
             return
 
+        from utils.add_vault_dialog import AddVaultDialog
+
         # If the dialog does not exist, create a new instance of AddVaultDialog
         # and kill any instances of other dialogs if they exist
         self.del_vault_dialog.destroy() if self.del_vault_dialog else None
@@ -176,6 +246,8 @@ class Cryptical(ctk.CTk):
             self.del_vault_dialog.focus()
             return
 
+        from utils.delete_vault_dialog import DeleteVaultDialog
+
         # If the dialog does not exist, create a new instance of DeleteVaultDialog
         # and kill any instances of other dialogs if they exist
         self.add_vault_dialog.destroy() if self.add_vault_dialog else None
@@ -192,18 +264,12 @@ class Cryptical(ctk.CTk):
         Returns: None
         """
 
-        # Get the available vaults from the database
-        available_vaults = get_data(db_file, "SELECT * FROM vaults;")
+        from utils.enter_password_dialog import EnterPasswordDialog
+        from utils.models import get_vault_store
 
         # Find the vault with the specified ID
-        for vault in available_vaults:
-            if vid == vault[0]:
-                selected_vault = vault
-                break
-        else:
-            raise ValueError(f"No vault found with ID {vid}")
-
-        
+        selected_vault = get_vault_store(db_file).get(vid)
+
         # Check if the EnterPasswordDialog has already been created and exists on the screen
         if self.enter_pwd_dialog is not None and self.enter_pwd_dialog.winfo_exists():
             # If it does, give focus to the dialog and return
@@ -216,10 +282,31 @@ class Cryptical(ctk.CTk):
         self.del_vault_dialog.destroy() if self.del_vault_dialog else None
         self.enter_pwd_dialog = EnterPasswordDialog(db_file, selected_vault)
 
+    def init_diagnostics_window(self) -> None:
+        """Opens the Diagnostics window, or focuses it if it is already open."""
+        if self.diagnostics_window is not None and self.diagnostics_window.winfo_exists():
+            self.diagnostics_window.focus()
+            return
+
+        from utils.diagnostics_window import DiagnosticsWindow
+
+        self.diagnostics_window = DiagnosticsWindow(self)
+
 
 def main():
+    # CRYPTICAL_PROFILE=<path prefix> profiles the whole session
+    profiler = metrics.Profiler() if metrics.PROFILE else None
+    if profiler:
+        profiler.start()
     app = Cryptical()
     app.mainloop()
+    if profiler:
+        profiler.stop(metrics.PROFILE)
+    app.scheduler.shutdown()  # stop background workers
+    stop_backups()  # let a running snapshot finish
+    vacuum.wait_for_reclaims()  # a reclaim may still be using a pooled connection
+    close_all()  # close pooled database connections
 
 
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmarks entry encryption for every cipher engine.
+
+Measures the per-entry encrypt and decrypt time and the stored size of a typical
+site password with each engine, as JSON. Run from `src`:
+
+    python -m benchmarks.bench_ciphers [--entries 20000] [--length 16]
+"""
+
+import argparse, json, secrets, time
+from cryptography.fernet import Fernet
+from utils.ciphers import CIPHERS, to_text
+
+
+def run(entries: int = 20000, length: int = 16) -> dict:
+    """Times every engine on the same batch of random passwords.
+
+    Args:
+        entries (int, optional): Passwords encrypted per engine. Defaults to 20000.
+        length (int, optional): Characters per password. Defaults to 16.
+
+    Returns:
+        dict: Results by engine name: microseconds per encrypt and decrypt, and
+        the raw and base64 text sizes of one ciphertext in bytes.
+    """
+    key = Fernet.generate_key()
+    pwds = [secrets.token_urlsafe(length)[:length].encode() for _ in range(entries)]
+    results = {"entries": entries, "length": length, "ciphers": {}}
+    for name, cipher in CIPHERS.items():
+        engine = cipher(key)
+
+        start = time.perf_counter()
+        tokens = [engine.encrypt(pwd) for pwd in pwds]
+        encrypt_us = (time.perf_counter() - start) * 1e6 / entries
+
+        start = time.perf_counter()
+        for token in tokens:
+            engine.decrypt(token)
+        decrypt_us = (time.perf_counter() - start) * 1e6 / entries
+
+        results["ciphers"][name] = {
+            "encrypt_us": round(encrypt_us, 2),
+            "decrypt_us": round(decrypt_us, 2),
+            "raw_bytes": len(tokens[0]),
+            "text_bytes": len(to_text(tokens[0])),
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--entries", type=int, default=20000)
+    parser.add_argument("--length", type=int, default=16)
+    args = parser.parse_args()
+    print(json.dumps(run(args.entries, args.length), indent=2))
+
+
+if __name__ == "__main__":
+    main()
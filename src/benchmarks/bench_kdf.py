@@ -0,0 +1,40 @@
+"""
+Benchmarks master password verification for every KDF.
+
+Calibrates each KDF to the latency target on this machine and prints the chosen
+parameters with their measured verification time as JSON. Run from `src`:
+
+    python -m benchmarks.bench_kdf [--target-ms 250] [--rounds 3]
+"""
+
+import argparse, json
+from utils.kdf import KDFS, TARGET_MS, Sha256Kdf, calibrate, time_kdf, to_spec
+
+
+def run(target_ms: int = TARGET_MS, rounds: int = 3) -> dict:
+    """Calibrates and times every KDF.
+
+    Args:
+        target_ms (int, optional): The latency target. Defaults to TARGET_MS.
+        rounds (int, optional): Derivations averaged per measurement. Defaults to 3.
+
+    Returns:
+        dict: Results by KDF name, each with its spec and measured milliseconds.
+    """
+    results = {"target_ms": target_ms, "kdfs": {}}
+    for name in KDFS:
+        kdf = Sha256Kdf() if name == "sha256" else calibrate(name, target_ms)
+        results["kdfs"][name] = {"spec": to_spec(kdf), "ms": time_kdf(kdf, rounds)}
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--target-ms", type=int, default=TARGET_MS)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(args.target_ms, args.rounds), indent=2))
+
+
+if __name__ == "__main__":
+    main()
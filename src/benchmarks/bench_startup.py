@@ -0,0 +1,58 @@
+"""
+Benchmarks the cold start of the app.
+
+Launches the app repeatedly with startup timing enabled, lets it quit as soon as
+its vaults are shown, and reports the median time to the end of every startup
+phase (imports, window, first paint, database ready, vaults shown), as JSON.
+Needs a display; on a headless machine run it under xvfb-run. Run from `src`:
+
+    python -m benchmarks.bench_startup [--runs 10]
+"""
+
+import argparse, json, os, statistics, subprocess, sys
+
+
+def run(runs: int = 10) -> dict:
+    """Starts the app `runs` times and collects its startup timings.
+
+    The first start is a warm-up and is not counted, so that the numbers
+    reflect a cold interpreter over a warm OS file cache.
+
+    Args:
+        runs (int, optional): Timed starts. Defaults to 10.
+
+    Returns:
+        dict: Median milliseconds from the start to the end of every phase, and
+        the number of runs.
+    """
+    env = dict(os.environ, CRYPTICAL_STARTUP_TIMING="1", CRYPTICAL_STARTUP_EXIT="1")
+    args = [sys.executable, "app.py"]
+
+    samples = {}
+    for i in range(runs + 1):
+        result = subprocess.run(args, env=env, capture_output=True, text=True, check=True)
+        timings = next(
+            json.loads(line)["startup_ms"]
+            for line in result.stderr.splitlines()
+            if line.startswith('{"startup_ms"')
+        )
+        if i == 0:
+            continue  # warm-up
+        for phase, ms in timings.items():
+            samples.setdefault(phase, []).append(ms)
+
+    return {
+        "runs": runs,
+        "median_ms": {phase: statistics.median(ms) for phase, ms in samples.items()},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    print(json.dumps(run(args.runs), indent=2))
+
+
+if __name__ == "__main__":
+    main()
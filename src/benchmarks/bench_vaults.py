@@ -0,0 +1,286 @@
+"""
+Benchmarks the vault paths of the app on synthetic databases.
+
+For every size, generates a database with a number of vaults, the first holding
+that many entries, then times unlocking and master password verification, entry
+queries, encryption, search, adding and deleting entries and, when a display is
+available, building the vault list and vault windows. Prints the results as
+JSON; with --baseline, compares them against saved results and exits with
+status 1 on regressions. Run from `src`:
+
+    python -m benchmarks.bench_vaults [--sizes 10 1000 10000 100000] [--vaults 20]
+        [--repeat 20] [--save baseline.json] [--baseline baseline.json] [--tolerance 0.25]
+
+Set CRYPTICAL_KDF_TARGET_MS to shorten vault creation and unlocking.
+"""
+
+import argparse, json, os, statistics, sys, tempfile, time
+from cryptical import core
+from utils import vacuum
+from utils.db import close_all
+from utils.entry_query import EntryQuery
+from utils.kdf import check_password
+from utils.misc import (
+    add_entries_to_db,
+    add_entry_to_db,
+    add_vault_to_db,
+    delete_entry_from_db,
+    get_data,
+    search_sites,
+    setup_db,
+)
+
+SIZES = (10, 1000, 10000, 100000)
+PASSWORD = "bench-password"
+# Entries are added in batches of this many while generating.
+BATCH = 1000
+
+
+def timed(fn, *args, repeat: int = 1) -> float:
+    """Returns the median milliseconds of `repeat` calls of fn(*args)."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def site(i: int) -> str:
+    """Returns the synthetic site name of entry `i`."""
+    return f"site{i}.example.com"
+
+
+def generate(db_file: str, vaults: int, entries: int) -> None:
+    """Creates a database of `vaults` vaults, the first holding `entries` entries.
+
+    Every vault is named bench_<n> and has the master password PASSWORD; the
+    entries are site<i>.example.com with random passwords.
+
+    Args:
+        db_file (str): The filename of the database to create.
+        vaults (int): Number of vaults, besides the example vault.
+        entries (int): Number of entries in the first vault.
+    """
+    setup_db(db_file)
+    for n in range(vaults):
+        add_vault_to_db(db_file, f"bench_{n}", PASSWORD)
+    session = core.unlock(db_file, "bench_0", PASSWORD)
+    for start in range(0, entries, BATCH):
+        batch = range(start, min(start + BATCH, entries))
+        add_entries_to_db(db_file, session, [(site(i), os.urandom(12).hex()) for i in batch])
+    session.close()
+
+
+def bench_size(db_file: str, vaults: int, entries: int, repeat: int) -> dict:
+    """Generates a database and times every path against it.
+
+    Args:
+        db_file (str): The filename of the database to create.
+        vaults (int): Number of vaults.
+        entries (int): Number of entries in the benchmarked vault.
+        repeat (int): Calls timed per measurement; the median is reported.
+
+    Returns:
+        dict: The measurements; keys ending in _ms and _s are durations, keys
+        ending in _per_s are throughputs.
+    """
+    results = {}
+    start = time.perf_counter()
+    generate(db_file, vaults, entries)
+    results["generate_s"] = round(time.perf_counter() - start, 2)
+
+    # master password verification and unlocking, each running the KDF once
+    vault = core.find_vault(db_file, "bench_0")
+    results["verify_ms"] = timed(check_password, PASSWORD, vault, repeat=3)
+    results["unlock_ms"] = timed(lambda: core.unlock(db_file, vault, PASSWORD).close(), repeat=3)
+    session = core.unlock(db_file, vault, PASSWORD)
+    vid = session.vid
+
+    # entry queries
+    query = EntryQuery(db_file, vid)
+    newest = EntryQuery(db_file, vid, order="created", descending=True)
+    last_page = query.page(offset=max(entries - 2 * query.page_size, 0))
+    after = query.key(last_page[-1]) if last_page else None
+    results["get_data_ms"] = {
+        "vaults": timed(get_data, db_file, "SELECT * FROM vaults;", repeat=repeat),
+        "count": timed(query.count, repeat=repeat),
+        "first_page": timed(query.page, repeat=repeat),
+        "keyset_page": timed(query.page, after, repeat=repeat),
+        "newest_page": timed(newest.page, repeat=repeat),
+        "open_page": timed(lambda: session.open_entries(query.page()), repeat=repeat),
+    }
+
+    # encryption throughput of the session cipher, in passwords per second
+    pwds = [os.urandom(12).hex() for _ in range(1000)]
+    tokens = session.encrypt_many(pwds)
+    encrypt_ms = timed(session.encrypt_many, pwds, repeat=3)
+    decrypt_ms = timed(session.decrypt_many, tokens, repeat=3)
+    results["encrypt_per_s"] = round(len(pwds) * 1000 / encrypt_ms)
+    results["decrypt_per_s"] = round(len(pwds) * 1000 / decrypt_ms)
+
+    # search: a word prefix; a whole site name; and a query without matches,
+    # which is answered by the token index
+    results["search_ms"] = {
+        "prefix": timed(search_sites, db_file, session, "site1", repeat=repeat),
+        "exact": timed(search_sites, db_file, session, site(entries - 1), repeat=repeat),
+        "no_match": timed(search_sites, db_file, session, "zzzz", repeat=repeat),
+    }
+
+    # adding and deleting single entries, each in its own transaction
+    pids = []
+    results["add_ms"] = timed(
+        lambda: pids.append(add_entry_to_db(db_file, session, f"added{len(pids)}.test", "pwd")),
+        repeat=repeat,
+    )
+    results["delete_ms"] = timed(lambda: delete_entry_from_db(db_file, pids.pop()), repeat=repeat)
+
+    results["ui_ms"] = bench_ui(db_file, session)
+    session.close()
+    return results
+
+
+def bench_ui(db_file: str, session) -> dict:
+    """Times building the vault list and the vault window, headless.
+
+    Needs customtkinter and a display (e.g. run under xvfb-run).
+
+    Returns:
+        dict: Milliseconds until each window shows its first rows, or the reason
+        they were skipped.
+    """
+    try:
+        import customtkinter as ctk
+        from app import Cryptical
+        from utils.tasks import start_scheduler
+        from utils.vault_window import VaultWindow
+    except ImportError as e:
+        return {"skipped": f"{type(e).__name__}: {e}"}
+
+    class BenchApp(Cryptical):
+        def __init__(self) -> None:
+            ctk.CTk.__init__(self)  # skip the setup of the app's own database
+
+    results = {}
+    start = time.perf_counter()
+    try:
+        app = BenchApp()
+    except Exception as e:  # no display
+        return {"skipped": f"{type(e).__name__}: {e}"}
+    app.scheduler = start_scheduler(app)
+
+    def settle(widget, table: str) -> None:
+        # run the event loop until the table exists and its first rows are read
+        while getattr(widget, table, None) is None or getattr(widget, table).source.loading:
+            app.update()
+        app.update_idletasks()
+
+    try:
+        app.build_ui(db_file)
+        app.on_vaults_loaded(db_file)
+        settle(app, "vault_grid")
+        results["vault_list"] = round((time.perf_counter() - start) * 1000, 1)
+
+        start = time.perf_counter()
+        window = VaultWindow(db_file, session)
+        settle(window, "table")
+        results["vault_window"] = round((time.perf_counter() - start) * 1000, 1)
+        window.destroy()
+    finally:
+        app.scheduler.shutdown()
+        app.destroy()
+    return results
+
+
+def run(sizes=SIZES, vaults: int = 20, repeat: int = 20) -> dict:
+    """Benchmarks every size on a fresh database in a temporary directory.
+
+    Args:
+        sizes (iterable, optional): Numbers of entries. Defaults to SIZES.
+        vaults (int, optional): Vaults per database. Defaults to 20.
+        repeat (int, optional): Calls timed per measurement. Defaults to 20.
+
+    Returns:
+        dict: The measurements by number of entries.
+    """
+    results = {"vaults": vaults, "repeat": repeat, "sizes": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for entries in sizes:
+            db_file = os.path.join(tmp, f"bench_{entries}.sqlite")
+            results["sizes"][str(entries)] = bench_size(db_file, vaults, entries, repeat)
+            vacuum.wait_for_reclaims()
+            close_all()  # release the database before it is deleted
+    return results
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    """Returns the numeric measurements of nested results by dotted path."""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.25) -> list:
+    """Finds the measurements that got worse than a baseline by more than `tolerance`.
+
+    Durations (_ms, _s) regress when they grow, throughputs (_per_s) when they
+    shrink; measurements missing from either side are ignored.
+
+    Args:
+        results (dict): Results of run().
+        baseline (dict): Earlier results of run().
+        tolerance (float, optional): Allowed relative change. Defaults to 0.25.
+
+    Returns:
+        list: {"name", "baseline", "current", "change"} for every regression,
+        change being the relative change in the bad direction.
+    """
+    current, before = flatten(results["sizes"]), flatten(baseline["sizes"])
+    regressions = []
+    for name in sorted(current.keys() & before.keys()):
+        old, new = before[name], current[name]
+        if old <= 0 or new <= 0:
+            continue
+        parts = name.split(".")
+        if name.endswith("_per_s"):
+            change = old / new - 1
+        elif any(part.endswith(("_ms", "_s")) for part in parts):
+            change = new / old - 1
+        else:
+            continue
+        if change > tolerance:
+            regressions.append(
+                {"name": name, "baseline": old, "current": new, "change": round(change, 3)}
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--vaults", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--save", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.vaults, args.repeat)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        results = {"results": results, "regressions": regressions}
+    print(json.dumps(results, indent=2))
+    if args.baseline and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
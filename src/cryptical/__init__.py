@@ -0,0 +1,4 @@
+"""
+The GUI-free Cryptical library: `cryptical.core` for vault operations and
+`python -m cryptical` for the command line.
+"""
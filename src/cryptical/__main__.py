@@ -0,0 +1,4 @@
+import sys
+from cryptical.cli import main
+
+sys.exit(main())
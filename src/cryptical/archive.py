@@ -0,0 +1,387 @@
+"""
+This is the archive component.
+It exports vaults to a single streamed, encrypted archive file and restores them
+from it. The layout is:
+
+    header   MAGIC, VERSION
+    chunks   one block per CHUNK_SIZE entries, encrypted with the vault's data
+             key; the chunks of a vault follow each other
+    indexes  per vault, blocks of INDEX_BLOCK_SIZE (site, chunk offset, row)
+             rows sorted by site, then a directory of the first site of every
+             block, all encrypted with the vault's data key
+    catalog  a plain JSON block describing the vaults (with their wrapped data
+             key) and where their directory is; each vault's description is
+             authenticated with a MAC keyed from its key-encryption key
+    trailer  the offset of the catalog, MAGIC
+
+Every block is a 4-byte length followed by its payload, and encrypted blocks
+are raw ciphertexts of the vault's cipher engine, so they are authenticated as
+well as encrypted. Exporting holds one chunk of passwords in memory at a time;
+the site index is sorted in a temporary database on disk rather than in
+memory. Looking up one entry reads the trailer, the vault's directory, one
+index block and a single chunk. Only archives of the current VERSION can be
+read.
+"""
+
+import bisect, hashlib, hmac, json, os, sqlite3, struct
+from utils.misc import get_entries_page
+from utils.envelope import derive_kek, open_dek
+from utils.models import get_vault_store
+from utils.session import VaultSession
+from cryptical import core, importer
+
+MAGIC = b"CRYPTARC"
+VERSION = 4
+# Number of entries encrypted together in one chunk.
+CHUNK_SIZE = 256
+# Number of sites per index block.
+INDEX_BLOCK_SIZE = 1024
+# Domain of the MAC key derived from a vault's KEK, see catalog_mac().
+CATALOG_MAC_INFO = b"cryptical/archive-catalog"
+
+BLOCK_LENGTH = struct.Struct(">I")
+TRAILER = struct.Struct(">Q8s")
+
+
+def _write_block(file, payload: bytes) -> int:
+    """Appends a length-prefixed block to the archive and returns its offset."""
+    offset = file.tell()
+    file.write(BLOCK_LENGTH.pack(len(payload)))
+    file.write(payload)
+    return offset
+
+
+def _seal(session: VaultSession, data) -> bytes:
+    """Serializes and encrypts a block payload with the vault key."""
+    return session.encrypt(json.dumps(data, separators=(",", ":")))
+
+
+def catalog_mac(kek: bytes, description: dict) -> str:
+    """Authenticates a vault's catalog description (all of its keys but "mac").
+
+    Without it, the plain catalog could be altered unnoticed, e.g. to weaker
+    KDF parameters. The MAC key is derived from the vault's key-encryption key,
+    so only the master password can produce or verify it.
+
+    Args:
+        kek (bytes): The vault's key-encryption key (see envelope.derive_kek()).
+        description (dict): The vault's entry of the catalog.
+
+    Returns:
+        str: The MAC, as hex.
+    """
+    key = hmac.new(kek, CATALOG_MAC_INFO, hashlib.sha256).digest()
+    fields = {k: v for k, v in description.items() if k != "mac"}
+    message = json.dumps(fields, sort_keys=True, separators=(",", ":")).encode()
+    return hmac.new(key, message, hashlib.sha256).hexdigest()
+
+
+def _write_index(file, session: VaultSession, sites: sqlite3.Connection) -> list:
+    """Writes the sorted index blocks of a vault; returns their directory.
+
+    Args:
+        file: The archive file being written.
+        session (VaultSession): The vault.
+        sites (sqlite3.Connection): The temporary database holding the vault's
+            (site, chunk offset, row) rows.
+
+    Returns:
+        list: The [first site, block offset] of every index block.
+    """
+    directory = []
+    rows = sites.execute("SELECT site, chunk, row FROM sites ORDER BY site;")
+    while True:
+        block = rows.fetchmany(INDEX_BLOCK_SIZE)
+        if not block:
+            break
+        directory.append([block[0][0], _write_block(file, _seal(session, block))])
+    return directory
+
+
+def export_archive(
+    db_file: str, passwords: dict, path: str, chunk_size: int = CHUNK_SIZE, progress=None
+) -> dict:
+    """Streams vaults into an archive file.
+
+    The archive is written next to `path` and moved into place once complete,
+    so an interrupted or failed export never leaves a truncated archive behind.
+
+    Args:
+        db_file (str): The filename of the database to use.
+        passwords (dict): The master password of every vault to export, by name.
+        path (str): The archive file to write.
+        chunk_size (int, optional): Entries per chunk. Defaults to CHUNK_SIZE.
+        progress (callable, optional): Called with (vname, entries written so far)
+            after every chunk.
+
+    Returns:
+        dict: The number of entries exported, by vault name.
+
+    Raises:
+        PasswordError: If a password is incorrect.
+    """
+    store = get_vault_store(db_file)
+    catalog = {"version": VERSION, "vaults": []}
+    counts = {}
+    tmp_path = path + ".tmp"
+
+    try:
+        with open(tmp_path, "wb") as file:
+            file.write(MAGIC + bytes([VERSION]))
+            for vname, pwd in passwords.items():
+                session = core.unlock(db_file, vname, pwd)
+                # a private temporary database, kept on disk once it outgrows its cache
+                sites = sqlite3.connect("")
+                try:
+                    vault = store.get(session.vid)
+                    sites.execute(
+                        """CREATE TABLE sites
+                                    (site TEXT PRIMARY KEY,
+                                     chunk INTEGER NOT NULL,
+                                     row INTEGER NOT NULL) WITHOUT ROWID;"""
+                    )
+                    first_chunk = file.tell()
+                    chunks = count = 0
+                    after_pid = None
+                    while True:
+                        page = get_entries_page(db_file, session.vid, after_pid, limit=chunk_size)
+                        if not page:
+                            break
+                        page = session.open_entries(page)
+                        pwds = session.decrypt_many([entry[3] for entry in page])
+                        rows = [[entry[2], pwd] for entry, pwd in zip(page, pwds)]
+                        offset = _write_block(file, _seal(session, rows))
+                        sites.executemany(
+                            "INSERT OR REPLACE INTO sites VALUES (?, ?, ?);",
+                            [(entry[2], offset, row) for row, entry in enumerate(page)],
+                        )
+                        chunks += 1
+                        count += len(page)
+                        after_pid = page[-1][0]
+                        if progress:
+                            progress(vname, count)
+
+                    directory = {
+                        "chunks": [first_chunk, chunks],
+                        "blocks": _write_index(file, session, sites),
+                    }
+                    description = {
+                        "vname": vault[1],
+                        "hmp": vault[2],
+                        "salt": vault[3],
+                        "kdf": vault[4],
+                        "wdek": vault[5],
+                        "count": count,
+                        "index": _write_block(file, _seal(session, directory)),
+                    }
+                    kek = derive_kek(pwd, vault[3], vault[4])
+                    description["mac"] = catalog_mac(kek, description)
+                    catalog["vaults"].append(description)
+                    counts[vault[1]] = count
+                finally:
+                    sites.close()
+                    session.close()
+
+            catalog_offset = _write_block(file, json.dumps(catalog).encode())
+            file.write(TRAILER.pack(catalog_offset, MAGIC))
+        os.replace(tmp_path, path)
+    except BaseException:
+        # e.g. a wrong password or a full disk: drop the partial archive
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return counts
+
+
+class ArchiveReader:
+    """Random access to the vaults and entries of an archive.
+
+    Attributes:
+        path (str): The archive file.
+        catalog (dict): The archive's vault descriptions, read from its end.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Opens an archive and reads its catalog.
+
+        Args:
+            path (str): The archive file.
+
+        Raises:
+            ValueError: If the file is not a Cryptical archive of the current VERSION.
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        self._indexes = {}
+        try:
+            header = self._file.read(len(MAGIC) + 1)
+            if header != MAGIC + bytes([VERSION]):
+                raise ValueError(f"{path} is not a Cryptical archive")
+            self._file.seek(-TRAILER.size, os.SEEK_END)
+            catalog_offset, magic = TRAILER.unpack(self._file.read(TRAILER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is truncated")
+            self.catalog = json.loads(self._read_block(catalog_offset))
+        except (OSError, struct.error, json.JSONDecodeError) as e:
+            self._file.close()
+            raise ValueError(f"{path} is not a readable archive: {e}")
+        except ValueError:
+            self._file.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Closes the archive file."""
+        self._file.close()
+
+    def _read_block(self, offset: int) -> bytes:
+        """Reads the block starting at `offset`."""
+        self._file.seek(offset)
+        (length,) = BLOCK_LENGTH.unpack(self._file.read(BLOCK_LENGTH.size))
+        return self._file.read(length)
+
+    def _open_block(self, session: VaultSession, offset: int):
+        """Reads, authenticates and decrypts the block starting at `offset`."""
+        block = self._read_block(offset)
+        text = session.decrypt(block)
+        if not text:
+            raise ValueError(f"Archive block at {offset} failed authentication")
+        return json.loads(text)
+
+    def vaults(self) -> list:
+        """Returns the {"vname", "count"} of every archived vault."""
+        return [{"vname": v["vname"], "count": v["count"]} for v in self.catalog["vaults"]]
+
+    def _description(self, vname: str) -> dict:
+        """Returns the catalog entry of a vault.
+
+        Raises:
+            ValueError: If the archive has no vault with that name.
+        """
+        for v in self.catalog["vaults"]:
+            if v["vname"] == vname:
+                return v
+        raise ValueError(f"No vault named {vname} in {self.path}")
+
+    def vault(self, vname: str) -> tuple:
+        """Returns an archived vault as a (vid, vname, hmp, salt, kdf, wdek) tuple; vid is None.
+
+        Raises:
+            ValueError: If the archive has no vault with that name.
+        """
+        v = self._description(vname)
+        return (None, v["vname"], v["hmp"], v["salt"], v["kdf"], v["wdek"])
+
+    def unlock(self, vname: str, pwd: str) -> VaultSession:
+        """Verifies an archived vault's password and catalog entry, and opens a session on it.
+
+        Args:
+            vname (str): The vault name.
+            pwd (str): The master password the vault had when it was exported.
+
+        Returns:
+            VaultSession: A session for reading the vault's entries.
+
+        Raises:
+            PasswordError: If the password is incorrect.
+            ValueError: If the vault is missing or its catalog entry was altered.
+        """
+        vault = self.vault(vname)
+        kek = derive_kek(pwd, vault[3], vault[4])
+        dek = open_dek(kek, vault[5])
+        if dek is None:
+            raise core.PasswordError()
+        description = self._description(vname)
+        if not hmac.compare_digest(str(description.get("mac", "")), catalog_mac(kek, description)):
+            raise ValueError(f"The catalog entry of vault {vname} failed authentication")
+        return VaultSession(vault, dek)
+
+    def index(self, session: VaultSession) -> dict:
+        """Returns the {"chunks", "blocks"} directory of an unlocked vault's sorted index blocks."""
+        if session.vname not in self._indexes:
+            offset = self._description(session.vname)["index"]
+            self._indexes[session.vname] = self._open_block(session, offset)
+        return self._indexes[session.vname]
+
+    def _locate(self, session: VaultSession, site: str):
+        """Returns the [chunk offset, row] of a site, or None if the vault has no entry for it."""
+        blocks = self.index(session)["blocks"]
+        # the last block whose first site is not after `site`
+        i = bisect.bisect_right([first for first, _ in blocks], site) - 1
+        if i < 0:
+            return None
+        rows = self._open_block(session, blocks[i][1])
+        j = bisect.bisect_left([row[0] for row in rows], site)
+        if j == len(rows) or rows[j][0] != site:
+            return None
+        return rows[j][1:]
+
+    def lookup(self, session: VaultSession, site: str) -> str:
+        """Returns the password of one archived entry, decrypting only its chunk.
+
+        Raises:
+            ValueError: If the vault has no entry for the site.
+        """
+        location = self._locate(session, site)
+        if location is None:
+            raise ValueError(f"No entry found for site {site}")
+        offset, row = location
+        return self._open_block(session, offset)[row][1]
+
+    def _chunk_offsets(self, session: VaultSession):
+        """Yields the offset of every chunk of an unlocked vault, in file order."""
+        offset, chunks = self.index(session)["chunks"]
+        for _ in range(chunks):
+            yield offset
+            self._file.seek(offset)
+            (length,) = BLOCK_LENGTH.unpack(self._file.read(BLOCK_LENGTH.size))
+            offset += BLOCK_LENGTH.size + length
+
+    def iter_entries(self, session: VaultSession):
+        """Yields the {"site", "password"} entries of an unlocked vault, chunk by chunk."""
+        for offset in self._chunk_offsets(session):
+            for site, pwd in self._open_block(session, offset):
+                yield {"site": site, "password": pwd}
+
+
+def restore_archive(db_file: str, path: str, passwords: dict, progress=None) -> dict:
+    """Imports archived vaults back into a database.
+
+    A vault missing from the database is recreated with its archived name and
+    master password hash; entries are then imported with importer.import_entries,
+    so sites the vault already has are skipped.
+
+    Args:
+        db_file (str): The filename of the database to use.
+        path (str): The archive file.
+        passwords (dict): The master password of every vault to restore, by name.
+        progress (callable, optional): Passed on to importer.import_entries.
+
+    Returns:
+        dict: The import stats, by vault name.
+
+    Raises:
+        ValueError: If the archive is unreadable, a vault is missing or a
+        password is incorrect.
+    """
+    store = get_vault_store(db_file)
+    results = {}
+    with ArchiveReader(path) as reader:
+        for vname, pwd in passwords.items():
+            archived = reader.unlock(vname, pwd)
+            if vname not in {vault[1] for vault in store.vaults()}:
+                store.add(vname, pwd, reader.vault(vname)[2:])
+            session = core.unlock(db_file, vname, pwd)
+            try:
+                results[vname] = importer.import_entries(
+                    db_file, session, reader.iter_entries(archived), progress=progress
+                )
+            finally:
+                session.close()
+                archived.close()
+    return results
@@ -0,0 +1,286 @@
+"""
+This is the command line component.
+It drives the core API without a display and prints JSON, e.g. from `src`:
+
+    python -m cryptical vaults
+    python -m cryptical add my_vault example.com --site-password hunter2
+    python -m cryptical batch < operations.jsonl
+    python -m cryptical import my_vault chrome_passwords.csv --dry-run
+    python -m cryptical export backup.crar my_vault
+    python -m cryptical restore backup.crar my_vault
+    python -m cryptical backup
+    python -m cryptical change-password my_vault
+
+Master passwords are read from --password, the CRYPTICAL_PASSWORD environment
+variable, or prompted for.
+"""
+
+import argparse, getpass, json, os, sys
+from cryptical import archive, core, importer
+from utils import backup, metrics, vacuum
+from utils.db import close_all
+
+
+def get_password(args) -> str:
+    """Returns the master password given on the command line, in the environment or typed."""
+    if args.password is not None:
+        return args.password
+    if "CRYPTICAL_PASSWORD" in os.environ:
+        return os.environ["CRYPTICAL_PASSWORD"]
+    return getpass.getpass("Vault password: ")
+
+
+def run_batch(db_file: str, lines, out) -> int:
+    """Runs one JSON operation per input line, reusing unlocked vaults.
+
+    Each line is an object with an "op" (create-vault, delete-vault, entries,
+    add, get, delete), a "vault", a "password" for the vault and, depending on
+    the op, a "site" and "site_password". One JSON result is written per line.
+
+    Args:
+        db_file (str): The filename of the database to use.
+        lines: An iterable of JSON lines.
+        out: The stream results are written to.
+
+    Returns:
+        int: The number of operations that failed.
+    """
+    sessions = {}
+    failures = 0
+
+    def session_for(op):
+        key = (op["vault"], op["password"])
+        if key not in sessions:
+            sessions[key] = core.unlock(db_file, op["vault"], op["password"])
+        return sessions[key]
+
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            op = json.loads(line)
+            kind = op["op"]
+            if kind == "create-vault":
+                result = {"vid": core.create_vault(db_file, op["vault"], op["password"])}
+            elif kind == "delete-vault":
+                core.delete_vault(db_file, op["vault"], op["password"])
+                result = {}
+            elif kind == "entries":
+                result = {"entries": list(core.iter_entries(db_file, session_for(op)))}
+            elif kind == "add":
+                core.add_entry(db_file, session_for(op), op["site"], op["site_password"])
+                result = {}
+            elif kind == "get":
+                result = core.get_entry(db_file, session_for(op), op["site"])
+            elif kind == "delete":
+                core.delete_entry(db_file, session_for(op), op["site"])
+                result = {}
+            else:
+                raise ValueError(f"Unknown op: {kind}")
+            out.write(json.dumps({"ok": True, **result}) + "\n")
+        except (ValueError, KeyError) as e:
+            failures += 1
+            out.write(json.dumps({"ok": False, "error": str(e)}) + "\n")
+    return failures
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Creates the argument parser with one subcommand per operation."""
+    parser = argparse.ArgumentParser(prog="cryptical", description="Cryptical vaults.")
+    parser.add_argument("--db", default=core.DB_FILE, help="database file")
+    parser.add_argument("--password", help="vault master password")
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        default=metrics.enabled(),
+        help="print hot path timings to stderr as JSON",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PREFIX",
+        default=metrics.PROFILE,
+        help="write PREFIX.prof (cProfile) and PREFIX.folded (flamegraph stacks)",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("vaults", help="list vaults")
+    commands.add_parser("create-vault", help="create a vault").add_argument("vault")
+    commands.add_parser("delete-vault", help="delete a vault").add_argument("vault")
+
+    change = commands.add_parser("change-password", help="change a vault's password")
+    change.add_argument("vault")
+    change.add_argument("--new-password", help="prompted for when omitted")
+
+    entries = commands.add_parser("entries", help="list the entries of a vault")
+    entries.add_argument("vault")
+    entries.add_argument("--reveal", action="store_true", help="include passwords")
+    entries.add_argument("--order", choices=("pid", "created"), default="pid")
+    entries.add_argument("--desc", action="store_true", help="newest entries first")
+    entries.add_argument("--since", type=int, help="only entries created since a unix time")
+
+    add = commands.add_parser("add", help="add an entry")
+    add.add_argument("vault")
+    add.add_argument("site")
+    add.add_argument("--site-password", help="prompted for when omitted")
+
+    search = commands.add_parser("search", help="find entries by site")
+    search.add_argument("vault")
+    search.add_argument("query")
+
+    substrings = commands.add_parser(
+        "substring-search",
+        help="let search find text anywhere in site names (reveals more, see README)",
+    )
+    substrings.add_argument("vault")
+    substrings.add_argument("state", choices=("on", "off"))
+
+    for name, help in (("get", "show an entry"), ("delete", "delete an entry")):
+        command = commands.add_parser(name, help=help)
+        command.add_argument("vault")
+        command.add_argument("site")
+
+    imp = commands.add_parser("import", help="import entries from a CSV or JSON export")
+    imp.add_argument("vault")
+    imp.add_argument("file")
+    imp.add_argument("--format", choices=("csv", "json"), help="guessed when omitted")
+    imp.add_argument("--dry-run", action="store_true", help="validate without saving")
+    imp.add_argument("--chunk-size", type=int, default=importer.CHUNK_SIZE)
+
+    export = commands.add_parser("export", help="export vaults to an encrypted archive")
+    export.add_argument("archive")
+    export.add_argument("vaults", nargs="+")
+
+    restore = commands.add_parser("restore", help="restore vaults from an archive")
+    restore.add_argument("archive")
+    restore.add_argument("vaults", nargs="*", help="every archived vault when omitted")
+
+    lookup = commands.add_parser("lookup", help="show one entry of an archive")
+    lookup.add_argument("archive")
+    lookup.add_argument("vault")
+    lookup.add_argument("site")
+
+    commands.add_parser("backup", help="snapshot the database into its backups folder")
+
+    batch = commands.add_parser("batch", help="run JSON operations, one per line")
+    batch.add_argument("file", nargs="?", help="input file; stdin when omitted")
+    return parser
+
+
+def main(argv=None) -> int:
+    """Runs the command line interface.
+
+    Args:
+        argv (list, optional): The arguments; sys.argv[1:] when None.
+
+    Returns:
+        int: The process exit code.
+    """
+    args = build_parser().parse_args(argv)
+    if args.metrics:
+        metrics.enable()
+    profiler = metrics.Profiler() if args.profile else None
+    if profiler:
+        profiler.start()
+    try:
+        return run_command(args)
+    finally:
+        vacuum.wait_for_reclaims()  # let space freed by deletes be given back
+        close_all()  # checkpoints the write-ahead log into the database file
+        if profiler:
+            profiler.stop(args.profile)
+        if args.metrics:
+            print(json.dumps({"metrics": metrics.snapshot()}), file=sys.stderr)
+
+
+def run_command(args) -> int:
+    """Runs the subcommand given on the command line.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        int: The process exit code.
+    """
+    db_file = core.open_db(args.db)
+    out = sys.stdout
+
+    try:
+        if args.command == "vaults":
+            result = core.list_vaults(db_file)
+        elif args.command == "create-vault":
+            result = {"vid": core.create_vault(db_file, args.vault, get_password(args))}
+        elif args.command == "delete-vault":
+            core.delete_vault(db_file, args.vault, get_password(args))
+            result = {}
+        elif args.command == "change-password":
+            pwd = get_password(args)
+            new_pwd = args.new_password or getpass.getpass("New vault password: ")
+            core.change_password(db_file, args.vault, pwd, new_pwd).close()
+            result = {}
+        elif args.command == "export":
+            passwords = {vname: get_password(args) for vname in args.vaults}
+            result = archive.export_archive(db_file, passwords, args.archive)
+        elif args.command == "restore":
+            with archive.ArchiveReader(args.archive) as reader:
+                vnames = args.vaults or [v["vname"] for v in reader.vaults()]
+            passwords = {vname: get_password(args) for vname in vnames}
+            result = archive.restore_archive(db_file, args.archive, passwords)
+        elif args.command == "lookup":
+            with archive.ArchiveReader(args.archive) as reader:
+                session = reader.unlock(args.vault, get_password(args))
+                result = {"site": args.site, "password": reader.lookup(session, args.site)}
+        elif args.command == "backup":
+            path = backup.backup_now(
+                db_file,
+                progress=lambda remaining, total: print(
+                    f"{total - remaining}/{total} pages", file=sys.stderr
+                ),
+            )
+            if path is None:
+                raise ValueError("Backup failed")
+            result = {"path": path, "backups": backup.list_backups(db_file)}
+        elif args.command == "batch":
+            lines = open(args.file) if args.file else sys.stdin
+            with lines:
+                return 1 if run_batch(db_file, lines, out) else 0
+        else:
+            session = core.unlock(db_file, args.vault, get_password(args))
+            if args.command == "entries":
+                # stream one JSON object per entry to keep memory flat
+                for entry in core.iter_entries(
+                    db_file, session, args.reveal, args.order, args.desc, args.since
+                ):
+                    out.write(json.dumps(entry) + "\n")
+                return 0
+            if args.command == "import":
+                result = importer.import_entries(
+                    db_file,
+                    session,
+                    importer.read_records(args.file, args.format),
+                    dry_run=args.dry_run,
+                    chunk_size=args.chunk_size,
+                    progress=lambda stats: print(
+                        f"read {stats['read']}, imported {stats['imported']}",
+                        file=sys.stderr,
+                    ),
+                )
+            elif args.command == "add":
+                site_pwd = args.site_password or getpass.getpass("Site password: ")
+                core.add_entry(db_file, session, args.site, site_pwd)
+                result = {}
+            elif args.command == "search":
+                result = core.search_entries(db_file, session, args.query)
+            elif args.command == "substring-search":
+                core.set_substring_search(db_file, session, args.state == "on")
+                result = {}
+            elif args.command == "get":
+                result = core.get_entry(db_file, session, args.site)
+            else:
+                core.delete_entry(db_file, session, args.site)
+                result = {}
+    except ValueError as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        return 1
+
+    out.write(json.dumps(result) + "\n")
+    return 0
@@ -0,0 +1,435 @@
+"""
+This is the core component.
+It exposes every vault operation without any GUI dependency, so that vaults can
+be created, unlocked and queried from scripts and the command line. The dialogs
+use the same validation and unlock functions.
+"""
+
+from utils.misc import setup_db, get_data, site_exists, derive_key
+from utils.misc import search_sites
+from utils.models import get_vault_store, get_entry_store
+from utils.kdf import check_password, needs_upgrade
+from utils.envelope import new_dek, new_vault_keys, unwrap_dek
+from utils.session import VaultSession
+from utils.entry_query import EntryQuery
+from utils.metrics import timed
+
+DB_FILE = "db.sqlite"
+PROHIBITED_NAME_CHARS = " \"'(),/:;<>?[\\]`{|}~"
+PROHIBITED_PWD_CHARS = " \"'(),/:;<>?[\\]`{|}"
+
+
+class PasswordError(ValueError):
+    """Raised when a master password is incorrect."""
+
+    def __init__(self, message: str = "Incorrect Password!") -> None:
+        super().__init__(message)
+
+
+def open_db(db_file: str = DB_FILE) -> str:
+    """Creates or upgrades the database so it can be used.
+
+    Args:
+        db_file (str, optional): The filename of the database to use. Defaults to DB_FILE.
+
+    Returns:
+        str: The filename of the database.
+    """
+    setup_db(db_file)
+    return db_file
+
+
+def check_new_vault(db_file: str, vname: str, pwd: str, rpwd: str = None) -> set:
+    """Validates the name and password of a vault to be created.
+
+    Args:
+        db_file (str): The filename of the database to use.
+        vname (str): The vault name.
+        pwd (str): The vault master password.
+        rpwd (str, optional): The re-typed password; not compared when None.
+
+    Returns:
+        set: The failed checks, out of "name" (prohibited characters), "noname"
+        (empty), "usedname" (already in use), "pwd", "nopwd" and "diffpwds".
+    """
+    errors = validate(vname, pwd, rpwd)
+    if vname in {vault[1] for vault in get_vault_store(db_file).vaults()}:
+        errors.add("usedname")
+    return errors
+
+
+def check_new_entry(
+    db_file: str, session: VaultSession, site: str, pwd: str, rpwd: str = None
+) -> set:
+    """Validates the site name and password of an entry to be added.
+
+    Args:
+        db_file (str): The filename of the database to use.
+        session (VaultSession): The unlocked vault the entry is added to.
+        site (str): The site name.
+        pwd (str): The site password.
+        rpwd (str, optional): The re-typed password; not compared when None.
+
+    Returns:
+        set: The failed checks, named as in check_new_vault().
+    """
+    errors = validate(site, pwd, rpwd)
+    if site_exists(db_file, session.vid, session.sites.blind_index(site)):
+        errors.add("usedname")
+    return errors
+
+
+def validate(name: str, pwd: str, rpwd: str = None) -> set:
+    """Runs the checks shared by vaults and entries, except for names in use.
+
+    Args:
+        name (str): The vault or site name.
+        pwd (str): The password.
+        rpwd (str, optional): The re-typed password; not compared when None.
+
+    Returns:
+        set: The failed checks, named as in check_new_vault().
+    """
+    errors = validate_password(pwd, rpwd)
+    if any(ch in PROHIBITED_NAME_CHARS for ch in name):
+        errors.add("name")
+    if name == "":
+        errors.add("noname")
+    return errors
+
+
+def validate_password(pwd: str, rpwd: str = None) -> set:
+    """Runs the password checks of validate().
+
+    Args:
+        pwd (str): The password.
+        rpwd (str, optional): The re-typed password; not compared when None.
+
+    Returns:
+        set: The failed checks, named as in check_new_vault().
+    """
+    errors = set()
+    if any(ch in PROHIBITED_PWD_CHARS for ch in pwd):
+        errors.add("pwd")
+    if pwd == "":
+        errors.add("nopwd")
+    if rpwd is not None and pwd != rpwd:
+        errors.add("diffpwds")
+    return errors
+
+
+def list_vaults(db_file: str) -> list:
+    """Lists the vaults of the database.
+
+    Args:
+        db_file (str): The filename of the database to use.
+
+    Returns:
+        list: A {"vid", "vname"} dict per vault.
+    """
+    return [{"vid": v[0], "vname": v[1]} for v in get_vault_store(db_file).vaults()]
+
+
+def find_vault(db_file: str, vname: str) -> tuple:
+    """Looks up a vault by name.
+
+    Args:
+        db_file (str): The filename of the database to use.
+        vname (str): The vault name.
+
+    Returns:
+        tuple: The (vid, vname, hmp, salt, kdf, wdek) vault.
+
+    Raises:
+        ValueError: If no vault has that name.
+    """
+    for vault in get_vault_store(db_file).vaults():
+        if vault[1] == vname:
+            return vault
+    raise ValueError(f"No vault found with name {vname}")
+
+
+def create_vault(db_file: str, vname: str, pwd: str) -> int:
+    """Creates a vault after validating its name and password.
+
+    Args:
+        db_file (str): The filename of the database to use.
+        vname (str): The vault name.
+        pwd (str): The vault master password.
+
+    Returns:
+        int: The id of the new vault.
+
+    Raises:
+        ValueError: If the name or password fails validation.
+    """
+    errors = check_new_vault(db_file, vname, pwd)
+    if errors:
+        raise ValueError(f"Invalid vault: {', '.join(sorted(errors))}")
+    store = get_vault_store(db_file)
+    store.add(vname, pwd, new_vault_keys(pwd))
+    return find_vault(db_file, vname)[0]
+
+
+@timed("core.unlock")
+def unlock(db_file: str, vault, pwd: str) -> VaultSession:
+    """Unwraps a vault's data key with its master password and opens a session on it.
+
+    Vaults hashed with an outdated KDF are re-hashed and their data key
+    re-wrapped on success, site names still stored in plain text are
+    encrypted, and search tokens written before substring search became
+    opt-in are rebuilt.
+
+    Args:
+        db_file (str): The filename of the database to use.
+        vault (tuple | str): The (vid, vname, hmp, salt, kdf, wdek, site_grams) vault,
+            or its name.
+        pwd (str): The master password.
+
+    Returns:
+        VaultSession: The unlocked vault.
+
+    Raises:
+        PasswordError: If the password is incorrect.
+        ValueError: If the vault could not be migrated.
+    """
+    vault, dek = _unlock_key(db_file, vault, pwd)
+    session = _open_session(vault, dek)
+    if not get_entry_store(db_file).encrypt_sites(session):
+        session.close()
+        raise ValueError(f"Could not encrypt the site names of vault {vault[1]}")
+    if vault[6] is None and not get_vault_store(db_file).index_sites(session, False):
+        session.close()
+        raise ValueError(f"Could not index the site names of vault {vault[1]}")
+    return session
+
+
+def _open_session(vault: tuple, dek: bytes) -> VaultSession:
+    """Opens a session on a vault whose data key is unwrapped."""
+    return VaultSession(vault, dek, substrings=bool(vault[6]))
+
+
+def _unlock_key(db_file: str, vault, pwd: str, upgrade: bool = True) -> tuple:
+    """Returns the (vault, data key) of a vault; see unlock().
+
+    With `upgrade` False, an outdated KDF is left for the caller, which
+    re-wraps the data key anyway.
+    """
+    if isinstance(vault, str):
+        vault = find_vault(db_file, vault)
+    store = get_vault_store(db_file)
+    if vault[5] is None:
+        return _wrap_legacy_vault(db_file, vault, pwd)
+    dek = unwrap_dek(pwd, vault)
+    if dek is None:
+        raise PasswordError()
+    if upgrade and needs_upgrade(vault[4]):
+        store.update_hash(vault[0], new_vault_keys(pwd, dek))
+        vault = store.get(vault[0])
+    return vault, dek
+
+
+def _wrap_legacy_vault(db_file: str, vault: tuple, pwd: str) -> tuple:
+    """Moves a vault whose entries are encrypted with its password onto a data key.
+
+    Runs once, the first time such a vault is unlocked: every entry is
+    re-encrypted under a new data key in a single transaction.
+
+    Returns:
+        tuple: The updated vault and its data key.
+
+    Raises:
+        PasswordError: If the password is incorrect.
+        ValueError: If the vault could not be migrated.
+    """
+    if not check_password(pwd, vault):
+        raise PasswordError()
+    store = get_vault_store(db_file)
+    dek = new_dek()
+    legacy, session = VaultSession(vault, derive_key(pwd)), VaultSession(vault, dek)
+    try:
+        if not store.rotate_key(legacy, session, new_vault_keys(pwd, dek)):
+            raise ValueError(f"Could not migrate vault {vault[1]} to a data key")
+    finally:
+        legacy.close()
+        session.close()
+    return store.get(vault[0]), dek
+
+
+def change_password(db_file: str, vname: str, pwd: str, new_pwd: str) -> VaultSession:
+    """Changes a vault's master password.
+
+    Only the vault's data key is re-wrapped, with the calibrated KDF; its
+    entries are untouched, so this takes the same time whatever the size of the
+    vault.
+
+    Args:
+        db_file (str): The filename of the database to use.
+        vname (str): The vault name.
+        pwd (str): The current master password.
+        new_pwd (str): The new master password.
+
+    Returns:
+        VaultSession: The vault unlocked with the new password.
+
+    Raises:
+        ValueError: If the password is incorrect or the new one fails validation.
+    """
+    errors = validate_password(new_pwd)
+    if errors:
+        raise ValueError(f"Invalid password: {', '.join(sorted(errors))}")
+    vault, dek = _unlock_key(db_file, vname, pwd, upgrade=False)
+    store = get_vault_store(db_file)
+    store.update_hash(vault[0], new_vault_keys(new_pwd, dek))
+    return _open_session(store.get(vault[0]), dek)
+
+
+def set_substring_search(db_file: str, session: VaultSession, enabled: bool) -> None:
+    """Switches substring search of a vault on or off.
+
+    With it on, a search also finds sites containing the query anywhere, e.g.
+    "thub" finds "github.com", through a token per trigram of every site. Those
+    tokens reveal which entries share any three consecutive characters and the
+    length of every site name to anyone who can read the database, and take
+    several times the space of word prefix tokens; see utils.blind_index. The
+    vault's tokens are rebuilt, which decrypts every site name.
+
+    Args:
+        db_file (str): The filename of the database to use.
+        session (VaultSession): The unlocked vault.
+        enabled (bool): Whether sites should get trigram tokens.
+
+    Raises:
+        ValueError: If the tokens could not be rebuilt.
+    """
+    if not get_vault_store(db_file).index_sites(session, enabled):
+        raise ValueError(f"Could not index the site names of vault {session.vname}")
+
+
+def delete_vault(db_file: str, vname: str, pwd: str) -> None:
+    """Deletes a vault after verifying its master password.
+
+    Args:
+        db_file (str): The filename of the database to use.
+        vname (str): The vault name.
+        pwd (str): The master password.
+
+    Raises:
+        ValueError: If the vault does not exist or the password is incorrect.
+    """
+    vault = find_vault(db_file, vname)
+    if not check_password(pwd, vault):
+        raise PasswordError()
+    get_vault_store(db_file).delete(vault[0])
+
+
+def iter_entries(
+    db_file: str,
+    session: VaultSession,
+    reveal: bool = False,
+    order: str = "pid",
+    descending: bool = False,
+    since: int = None,
+):
+    """Yields the entries of an unlocked vault, reading them page by page.
+
+    Args:
+        db_file (str): The filename of the database to use.
+        session (VaultSession): The unlocked vault.
+        reveal (bool, optional): Whether to include decrypted passwords. Defaults to False.
+        order (str, optional): "pid" or "created", see EntryQuery. Defaults to "pid".
+        descending (bool, optional): Newest entries first. Defaults to False.
+        since (int, optional): Only entries created at or after this unix time.
+
+    Yields:
+        dict: {"pid", "site", "created"} per entry, plus "password" when revealing.
+    """
+    query = EntryQuery(db_file, session.vid, order, descending, created_after=since)
+    for page in query.pages():
+        page = session.open_entries(page)
+        pwds = session.decrypt_many([e[3] for e in page]) if reveal else None
+        for i, entry in enumerate(page):
+            item = {"pid": entry[0], "site": entry[2], "created": entry[4]}
+            if reveal:
+                item["password"] = pwds[i]
+            yield item
+
+
+def search_entries(db_file: str, session: VaultSession, query: str, limit: int = 100) -> list:
+    """Finds the entries whose site has a word starting with a text.
+
+    Vaults with substring search also find the sites containing the text when
+    no word starts with it; see set_substring_search().
+
+    Args:
+        db_file (str): The filename of the database to use.
+        session (VaultSession): The unlocked vault.
+        query (str): The text to look for.
+        limit (int, optional): Maximum number of results. Defaults to 100.
+
+    Returns:
+        list: {"pid", "site"} per match, in the order the entries were added.
+    """
+    return [{"pid": e[0], "site": e[2]} for e in search_sites(db_file, session, query, limit)]
+
+
+def get_entry(db_file: str, session: VaultSession, site: str) -> dict:
+    """Looks up an entry by site name and decrypts its password.
+
+    Args:
+        db_file (str): The filename of the database to use.
+        session (VaultSession): The unlocked vault.
+        site (str): The site name.
+
+    Returns:
+        dict: {"pid", "site", "password"}.
+
+    Raises:
+        ValueError: If the vault has no entry for the site.
+    """
+    entry = _find_entry(db_file, session, site)
+    return {"pid": entry[0], "site": entry[2], "password": session.decrypt(entry[3])}
+
+
+def add_entry(db_file: str, session: VaultSession, site: str, pwd: str) -> None:
+    """Adds an entry to an unlocked vault after validating it.
+
+    Args:
+        db_file (str): The filename of the database to use.
+        session (VaultSession): The unlocked vault.
+        site (str): The site name.
+        pwd (str): The site password.
+
+    Raises:
+        ValueError: If the site name or password fails validation.
+    """
+    errors = check_new_entry(db_file, session, site, pwd)
+    if errors:
+        raise ValueError(f"Invalid entry {site}: {', '.join(sorted(errors))}")
+    get_entry_store(db_file).add(session, site, pwd)
+
+
+def delete_entry(db_file: str, session: VaultSession, site: str) -> None:
+    """Deletes an entry of an unlocked vault by site name.
+
+    Args:
+        db_file (str): The filename of the database to use.
+        session (VaultSession): The unlocked vault.
+        site (str): The site name.
+
+    Raises:
+        ValueError: If the vault has no entry for the site.
+    """
+    get_entry_store(db_file).delete(_find_entry(db_file, session, site))
+
+
+def _find_entry(db_file: str, session: VaultSession, site: str) -> tuple:
+    """Returns the (pid, vid, site, esp) entry of a site, raising ValueError if absent."""
+    rows = get_data(
+        db_file,
+        "SELECT * FROM entries WHERE vid=? AND sidx=?;",
+        (session.vid, session.sites.blind_index(site)),
+    )
+    if not rows:
+        raise ValueError(f"No entry found for site {site}")
+    return session.open_entries(rows)[0]
@@ -0,0 +1,197 @@
+"""
+This is the import component.
+It streams entries from CSV or JSON files (including the export layouts of
+common password managers) into a vault. Records are validated with the same
+rules as the Add Entry dialog, encrypted a chunk at a time and written with
+their search tokens, one transaction per chunk, so memory stays bounded by the
+chunk size whatever the size of the file and other writers only wait for one
+chunk at a time.
+"""
+
+import csv, json
+from urllib.parse import urlsplit
+from utils.db import connection, transaction
+from utils.misc import existing_sites, insert_entries
+from utils.backup import notify_write
+from cryptical.core import validate
+
+# Number of records encrypted and written per transaction.
+CHUNK_SIZE = 1000
+# Maximum number of rejected records reported individually.
+MAX_REPORTED_ERRORS = 100
+
+# Columns holding the site (in order of preference) and password in the export
+# layouts we know: Cryptical, Chrome, Firefox, Bitwarden, LastPass and KeePass.
+SITE_FIELDS = ("site", "url", "login_uri", "Web Site", "name", "Account")
+PWD_FIELDS = ("password", "login_password", "Password")
+
+
+def site_from(value: str) -> str:
+    """Turns a URL or name into a site name, e.g. "https://github.com/login" -> "github.com"."""
+    value = value.strip()
+    if "://" in value:
+        return urlsplit(value).hostname or ""
+    return value
+
+
+def to_entry(record: dict) -> tuple:
+    """Picks the site and password out of an exported record.
+
+    Args:
+        record (dict): One record as read from the file.
+
+    Returns:
+        tuple: (site, pwd); either is "" when the record has no such field.
+    """
+    # Bitwarden's JSON export nests the login details
+    login = record.get("login")
+    if isinstance(login, dict):
+        uris = login.get("uris") or [{}]
+        record = {"url": uris[0].get("uri") or "", "name": record.get("name", ""), **login}
+
+    site = next((site_from(record[f]) for f in SITE_FIELDS if record.get(f)), "")
+    pwd = next((record[f] for f in PWD_FIELDS if record.get(f)), "")
+    return site, pwd
+
+
+def iter_json(file):
+    """Yields the records of a JSON file without loading all of it where possible.
+
+    Supports JSON lines, a top-level array (decoded one element at a time) and
+    Bitwarden's {"items": [...]} export, which is decoded as a whole.
+    """
+    decoder = json.JSONDecoder()
+    first = file.read(1)
+    while first.isspace():
+        first = file.read(1)
+
+    if first == "{":
+        line = first + file.readline()
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            # a single object spanning lines: a Bitwarden export
+            yield from decoder.decode(line + file.read()).get("items", [])
+            return
+        if isinstance(record.get("items"), list):
+            # a Bitwarden export written on one line
+            yield from record["items"]
+            return
+        # JSON lines, one object per line
+        yield record
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+        return
+
+    if first != "[":
+        return
+
+    # a top-level array: decode one element at a time from a sliding buffer
+    buffer = ""
+    while True:
+        chunk = file.read(65536)
+        buffer += chunk
+        while True:
+            buffer = buffer.lstrip().lstrip(",").lstrip()
+            if not buffer or buffer.startswith("]"):
+                break
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break  # the element continues in the next chunk
+            yield record
+            buffer = buffer[end:]
+        if not chunk:
+            return
+
+
+def read_records(path: str, fmt: str = None):
+    """Yields the records of an export file.
+
+    Args:
+        path (str): The file to read.
+        fmt (str, optional): "csv" or "json"; guessed from the file extension when None.
+
+    Yields:
+        dict: One record per exported entry.
+    """
+    fmt = fmt or ("json" if path.lower().endswith((".json", ".jsonl")) else "csv")
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        if fmt == "json":
+            yield from iter_json(file)
+        else:
+            yield from csv.DictReader(file)
+
+
+def import_entries(
+    db_file: str,
+    session,
+    records,
+    dry_run: bool = False,
+    chunk_size: int = CHUNK_SIZE,
+    progress=None,
+) -> dict:
+    """Validates, encrypts and stores a stream of records in an unlocked vault.
+
+    Records whose site already exists in the vault, or earlier in the stream,
+    are counted as duplicates and skipped. Each chunk is written in its own
+    transaction, so an error keeps the chunks written before it. A dry run
+    writes nothing: it only reads which sites exist, and keeps the blind
+    indexes of the sites it has seen to find duplicates within the stream.
+
+    Args:
+        db_file (str): The filename of the database to use.
+        session (VaultSession): The unlocked vault to import into.
+        records: An iterable of exported records (dicts).
+        dry_run (bool, optional): Count what would be imported without writing.
+        chunk_size (int, optional): Records per transaction. Defaults to CHUNK_SIZE.
+        progress (callable, optional): Called with the stats after every chunk.
+
+    Returns:
+        dict: Counts of "read", "imported", "invalid" and "duplicates" records,
+        and up to MAX_REPORTED_ERRORS "errors" describing rejected records.
+
+    Raises:
+        sqlite3.Error: If a chunk could not be written.
+    """
+    stats = {"read": 0, "imported": 0, "invalid": 0, "duplicates": 0, "errors": []}
+    chunk = []
+    seen = set()  # dry runs: blind indexes of the sites counted as imported
+
+    def flush():
+        if dry_run:
+            sidxs = [session.sites.blind_index(site) for site, _ in chunk]
+            with connection(db_file) as conn:
+                seen.update(existing_sites(conn, session.vid, sidxs))
+            inserted = len(set(sidxs) - seen)
+            seen.update(sidxs)
+        else:
+            with transaction(db_file) as conn:
+                inserted = len(insert_entries(conn, session, chunk, skip_existing=True))
+            notify_write(db_file)
+        stats["imported"] += inserted
+        stats["duplicates"] += len(chunk) - inserted
+        chunk.clear()
+        if progress:
+            progress(stats)
+
+    for record in records:
+        stats["read"] += 1
+        site, pwd = to_entry(record)
+        errors = validate(site, pwd)
+        if errors:
+            stats["invalid"] += 1
+            if len(stats["errors"]) < MAX_REPORTED_ERRORS:
+                stats["errors"].append(
+                    {"record": stats["read"], "site": site, "errors": sorted(errors)}
+                )
+            continue
+        chunk.append((site, pwd))
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return stats
@@ -0,0 +1,16 @@
+import os
+
+# a fast KDF: the tests hash many passwords; set before utils.kdf is imported
+os.environ.setdefault("CRYPTICAL_KDF_TARGET_MS", "1")
+
+import pytest
+from utils import db, vacuum
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    """The filename of a new database, whose pooled connections are closed afterwards."""
+    yield str(tmp_path / "cryptical.db")
+    # a background reclaim may still be using a pooled connection
+    vacuum.wait_for_reclaims()
+    db.close_all()
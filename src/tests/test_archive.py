@@ -0,0 +1,113 @@
+import json
+import pytest
+from cryptical import archive, core
+
+
+@pytest.fixture
+def vaults(db_file):
+    """A database with two vaults: "work", holding 700 entries, and an empty "home"."""
+    core.open_db(db_file)
+    core.create_vault(db_file, "work", "pw1")
+    core.create_vault(db_file, "home", "pw2")
+    session = core.unlock(db_file, "work", "pw1")
+    for i in range(700):
+        core.add_entry(db_file, session, f"site{i}.com", f"secret{i}")
+    session.close()
+    return db_file
+
+
+@pytest.fixture
+def archive_path(vaults, tmp_path, monkeypatch):
+    """An archive of both vaults, with several chunks and index blocks."""
+    monkeypatch.setattr(archive, "INDEX_BLOCK_SIZE", 100)
+    path = str(tmp_path / "vaults.crar")
+    counts = archive.export_archive(
+        vaults, {"work": "pw1", "home": "pw2"}, path, chunk_size=64
+    )
+    assert counts == {"work": 700, "home": 0}
+    return path
+
+
+def test_lookup(archive_path):
+    with archive.ArchiveReader(archive_path) as reader:
+        assert reader.vaults() == [{"vname": "work", "count": 700}, {"vname": "home", "count": 0}]
+        session = reader.unlock("work", "pw1")
+        for i in (0, 99, 100, 123, 699):
+            assert reader.lookup(session, f"site{i}.com") == f"secret{i}"
+        for site in ("", "a", "site7", "site700.com", "zzz"):
+            with pytest.raises(ValueError):
+                reader.lookup(session, site)
+        assert len(list(reader.iter_entries(session))) == 700
+
+        empty = reader.unlock("home", "pw2")
+        assert list(reader.iter_entries(empty)) == []
+        with pytest.raises(ValueError):
+            reader.lookup(empty, "site0.com")
+
+
+def test_restore_round_trip(archive_path, tmp_path):
+    db_file = str(tmp_path / "restored.db")
+    core.open_db(db_file)
+
+    results = archive.restore_archive(db_file, archive_path, {"work": "pw1", "home": "pw2"})
+    assert results["work"]["imported"] == 700
+    assert results["home"]["imported"] == 0
+
+    session = core.unlock(db_file, "work", "pw1")
+    entries = {e["site"]: e["password"] for e in core.iter_entries(db_file, session, True)}
+    session.close()
+    assert entries == {f"site{i}.com": f"secret{i}" for i in range(700)}
+    core.unlock(db_file, "home", "pw2").close()
+
+    # restoring again skips the entries the vaults already have
+    results = archive.restore_archive(db_file, archive_path, {"work": "pw1"})
+    assert (results["work"]["imported"], results["work"]["duplicates"]) == (0, 700)
+
+
+def test_wrong_password(archive_path):
+    with archive.ArchiveReader(archive_path) as reader:
+        with pytest.raises(core.PasswordError):
+            reader.unlock("work", "pw2")
+        with pytest.raises(ValueError):
+            reader.unlock("missing", "pw1")
+
+
+@pytest.mark.parametrize("field, value", [("kdf", "sha256"), ("count", 1), ("index", 9)])
+def test_altered_catalog_is_rejected(archive_path, field, value):
+    with archive.ArchiveReader(archive_path) as reader:
+        catalog = reader.catalog
+    with open(archive_path, "rb") as file:
+        data = file.read()
+    catalog_offset, _ = archive.TRAILER.unpack(data[-archive.TRAILER.size :])
+    catalog["vaults"][0][field] = value
+    payload = json.dumps(catalog).encode()
+    with open(archive_path, "wb") as file:
+        file.write(data[:catalog_offset])
+        file.write(archive.BLOCK_LENGTH.pack(len(payload)) + payload)
+        file.write(archive.TRAILER.pack(catalog_offset, archive.MAGIC))
+
+    with archive.ArchiveReader(archive_path) as reader:
+        with pytest.raises(ValueError):
+            reader.unlock("work", "pw1")
+
+
+def test_not_an_archive(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not an archive at all")
+    with pytest.raises(ValueError):
+        archive.ArchiveReader(str(path))
+
+
+def test_older_versions_are_rejected(archive_path):
+    with open(archive_path, "r+b") as file:
+        file.seek(len(archive.MAGIC))
+        file.write(bytes([archive.VERSION - 1]))
+    with pytest.raises(ValueError):
+        archive.ArchiveReader(archive_path)
+
+
+def test_failed_export_leaves_no_file(vaults, tmp_path):
+    path = tmp_path / "vaults.crar"
+    with pytest.raises(core.PasswordError):
+        archive.export_archive(vaults, {"work": "pw1", "home": "wrong"}, str(path))
+    assert not list(tmp_path.glob("vaults.crar*"))
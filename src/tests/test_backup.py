@@ -0,0 +1,58 @@
+import os, sqlite3
+import pytest
+from utils import backup
+from utils.db import connection, transaction
+
+
+@pytest.fixture
+def db_file(db_file, monkeypatch):
+    """A database holding a table of 1000 rows."""
+    monkeypatch.setattr(backup, "STEP_PAUSE_S", 0)
+    with transaction(db_file) as conn:
+        conn.execute("CREATE TABLE t (x INTEGER, y TEXT);")
+        conn.executemany("INSERT INTO t VALUES (?, ?);", [(i, "x" * 100) for i in range(1000)])
+    return db_file
+
+
+def test_snapshot_copies_the_database(db_file):
+    steps = []
+    path = backup.backup_now(db_file, progress=lambda remaining, total: steps.append(total))
+    assert path and os.path.dirname(path) == backup.backup_dir(db_file)
+    assert steps
+
+    copy = sqlite3.connect(path)
+    assert copy.execute("SELECT COUNT(*), SUM(x) FROM t;").fetchone() == (1000, 499500)
+    copy.close()
+    with open(path + ".sha256") as file:
+        checksum, name = file.read().split()
+    assert (checksum, name) == (backup.file_checksum(path), os.path.basename(path))
+    assert backup.verify_backup(path)
+
+
+def test_damaged_snapshot_fails_verification(db_file):
+    path = backup.backup_now(db_file)
+    with open(path, "r+b") as file:
+        file.seek(4096 + 100)
+        file.write(b"\xff" * 16)
+    assert not backup.verify_backup(path)
+
+    os.remove(path + ".sha256")
+    assert not backup.verify_backup(path)
+
+
+def test_keeps_the_newest_snapshots(db_file):
+    paths = []
+    for i in range(backup.BACKUP_KEEP + 2):
+        with transaction(db_file) as conn:
+            conn.execute("INSERT INTO t VALUES (?, 'new');", (1000 + i,))
+        paths.append(backup.backup_now(db_file))
+
+    assert backup.list_backups(db_file) == paths[-backup.BACKUP_KEEP :]
+    for old in paths[:2]:
+        assert not os.path.exists(old) and not os.path.exists(old + ".sha256")
+    newest = sqlite3.connect(paths[-1])
+    assert newest.execute("SELECT COUNT(*) FROM t;").fetchone() == (1000 + len(paths),)
+    newest.close()
+    # the database itself is left as it was
+    with connection(db_file) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t;").fetchone() == (1000 + len(paths),)
@@ -0,0 +1,79 @@
+from cryptical import core
+from utils.blind_index import SiteIndex, matches, word_starts
+from utils.envelope import new_dek
+
+
+def test_blind_index_is_keyed_and_exact():
+    index, other = SiteIndex(new_dek()), SiteIndex(new_dek())
+    assert index.blind_index("github.com") == index.blind_index("github.com")
+    assert index.blind_index("github.com") != index.blind_index("GitHub.com")
+    assert index.blind_index("github.com") != other.blind_index("github.com")
+    assert index.tokens("github.com").isdisjoint(other.tokens("github.com"))
+
+
+def test_word_starts():
+    assert word_starts("api.github.com") == [0, 4, 11]
+    assert word_starts("my_site-2") == [0, 3, 8]
+    assert word_starts("") == []
+
+
+def test_matches():
+    assert matches("api.github.com", "git")
+    assert matches("api.github.com", "GitHub.c")
+    assert matches("api.github.com", "com")
+    assert not matches("api.github.com", "hub")
+
+
+def test_sites_have_the_tokens_of_their_queries():
+    index = SiteIndex(new_dek())
+    tokens = index.tokens("API.GitHub.com")
+    # prefixes of 1, 2, 3, 5 and 8 characters from each word start, if long enough
+    assert len(tokens) == 13
+    for query in ("a", "ap", "git", "github", "GitHub.co", "com"):
+        assert index.prefix_tokens(query) <= tokens
+    assert not index.prefix_tokens("hub") <= tokens
+    assert not index.prefix_tokens("gitlab") <= tokens
+
+
+def test_trigrams_only_with_substring_search():
+    key = new_dek()
+    index, substrings = SiteIndex(key), SiteIndex(key, substrings=True)
+    assert index.tokens("github.com") < substrings.tokens("github.com")
+    assert index.gram_tokens("thub") <= substrings.tokens("github.com")
+    assert index.gram_tokens("thub").isdisjoint(index.tokens("github.com"))
+    assert substrings.prefix_tokens("github") == (
+        index.prefix_tokens("github") | index.gram_tokens("github")
+    )
+
+
+def test_short_texts_have_no_trigrams():
+    index = SiteIndex(new_dek())
+    assert index.gram_tokens("ab") == set()
+    assert len(index.gram_tokens("abcd")) == 2
+    assert index.gram_tokens("ABC") == index.gram_tokens("abc")
+
+
+def test_substring_search_is_opt_in(db_file):
+    core.open_db(db_file)
+    core.create_vault(db_file, "v", "pw")
+    session = core.unlock(db_file, "v", "pw")
+    try:
+        core.add_entry(db_file, session, "github.com", "p1")
+        assert core.search_entries(db_file, session, "thub") == []
+
+        core.set_substring_search(db_file, session, True)
+        core.add_entry(db_file, session, "gitlab.com", "p2")
+        assert [e["site"] for e in core.search_entries(db_file, session, "thub")] == ["github.com"]
+        assert [e["site"] for e in core.search_entries(db_file, session, "tlab")] == ["gitlab.com"]
+
+        core.set_substring_search(db_file, session, False)
+        assert core.search_entries(db_file, session, "thub") == []
+        assert len(core.search_entries(db_file, session, "git")) == 2
+        core.set_substring_search(db_file, session, True)
+    finally:
+        session.close()
+
+    # the choice is kept with the vault
+    session = core.unlock(db_file, "v", "pw")
+    assert session.sites.substrings
+    session.close()
@@ -0,0 +1,35 @@
+import pytest
+from cryptography.fernet import Fernet, InvalidToken
+from utils.ciphers import CIPHERS, CipherSuite, from_text, to_text
+from utils.envelope import new_dek
+
+
+@pytest.mark.parametrize("name", sorted(CIPHERS))
+def test_ciphertexts_name_their_engine(name):
+    key = new_dek()
+    token = CipherSuite(key, default=name).encrypt(b"secret")
+    assert token[0] == CIPHERS[name].version
+    # any suite of the same key reads every engine's ciphertexts
+    assert CipherSuite(key).decrypt(token) == b"secret"
+
+
+def test_reads_original_fernet_tokens():
+    key = new_dek()
+    token = Fernet(key).encrypt(b"secret").decode()
+    assert CipherSuite(key).decrypt(from_text(token)) == b"secret"
+    assert to_text(from_text(token)) == token
+
+
+def test_rejects_unknown_and_tampered_ciphertexts():
+    suite = CipherSuite(new_dek())
+    token = bytearray(suite.encrypt(b"secret"))
+    for bad in (b"", b"\x7f" + bytes(token[1:]), bytes(token[:-1]) + bytes([token[-1] ^ 1])):
+        with pytest.raises(InvalidToken):
+            suite.decrypt(bad)
+    with pytest.raises(InvalidToken):
+        CipherSuite(new_dek()).decrypt(bytes(token))
+
+
+def test_unknown_default():
+    with pytest.raises(ValueError):
+        CipherSuite(new_dek(), default="rot13")
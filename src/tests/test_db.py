@@ -0,0 +1,95 @@
+import sqlite3, threading
+from utils.db import connection, external_changes, get_pool, transaction
+from utils import misc
+
+
+def test_nested_checkouts_share_a_connection(db_file):
+    with connection(db_file) as outer:
+        with connection(db_file) as inner:
+            assert inner is outer
+        with transaction(db_file) as conn:
+            assert conn is outer
+
+
+def test_threads_get_their_own_connections(db_file):
+    seen = []
+
+    def check_out():
+        with connection(db_file) as conn:
+            seen.append(conn)
+
+    with connection(db_file) as conn:
+        thread = threading.Thread(target=check_out)
+        thread.start()
+        thread.join()
+    assert seen and seen[0] is not conn
+
+
+def test_transaction_rolls_back_on_error(db_file):
+    with transaction(db_file) as conn:
+        conn.execute("CREATE TABLE t (x INTEGER);")
+    try:
+        with transaction(db_file) as conn:
+            conn.execute("INSERT INTO t VALUES (1);")
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    with connection(db_file) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t;").fetchone() == (0,)
+
+
+def test_external_changes(db_file):
+    with transaction(db_file) as conn:
+        conn.execute("CREATE TABLE t (x INTEGER);")
+    external_changes(db_file)  # the first call only records the data version
+    assert not external_changes(db_file)
+
+    # commits of the pool's own transactions are not reported
+    with transaction(db_file) as conn:
+        conn.execute("INSERT INTO t VALUES (1);")
+    assert not external_changes(db_file)
+
+    # commits of another connection, e.g. another process, are reported once
+    other = sqlite3.connect(db_file)
+    with other:
+        other.execute("INSERT INTO t VALUES (2);")
+    assert external_changes(db_file)
+    assert not external_changes(db_file)
+
+    # also when they come before an own transaction
+    with other:
+        other.execute("INSERT INTO t VALUES (3);")
+    with transaction(db_file) as conn:
+        conn.execute("INSERT INTO t VALUES (4);")
+    assert external_changes(db_file)
+    other.close()
+
+
+def test_new_databases_use_wal_and_incremental_vacuum(db_file):
+    with connection(db_file) as conn:
+        assert conn.execute("PRAGMA journal_mode;").fetchone() == ("wal",)
+        assert conn.execute("PRAGMA auto_vacuum;").fetchone() == (2,)
+        assert conn.execute("PRAGMA foreign_keys;").fetchone() == (1,)
+    assert get_pool(db_file) is get_pool(db_file)
+
+
+def test_setup_does_not_hash_under_the_write_lock(db_file, monkeypatch):
+    locked = []
+
+    def new_vault_keys(pwd, dek):
+        # another connection can only start writing if setup_db holds no write lock
+        other = sqlite3.connect(db_file, timeout=0)
+        try:
+            other.execute("BEGIN IMMEDIATE;")
+            other.rollback()
+        except sqlite3.OperationalError:
+            locked.append(True)
+        finally:
+            other.close()
+        return keys(pwd, dek)
+
+    keys = misc.new_vault_keys
+    monkeypatch.setattr(misc, "new_vault_keys", new_vault_keys)
+    misc.setup_db(db_file)
+    assert not locked
+    assert misc.get_data(db_file, "SELECT vname FROM vaults;") == [("example_vault",)]
@@ -0,0 +1,44 @@
+import pytest
+from cryptical import core
+from utils.db import transaction
+from utils.entry_query import EntryQuery
+
+
+@pytest.fixture
+def vault(db_file):
+    """A vault of 250 entries, created at only a few distinct times; returns its vid."""
+    core.open_db(db_file)
+    vid = core.create_vault(db_file, "v", "pw")
+    session = core.unlock(db_file, "v", "pw")
+    for i in range(250):
+        core.add_entry(db_file, session, f"site{i}", "pwd")
+    session.close()
+    with transaction(db_file) as conn:
+        conn.execute("UPDATE entries SET created = (pid * 7) % 5 WHERE vid=?;", (vid,))
+    return vid
+
+
+@pytest.mark.parametrize("order", ["pid", "created"])
+@pytest.mark.parametrize("descending", [False, True])
+def test_pages_follow_the_sort_order(db_file, vault, order, descending):
+    query = EntryQuery(db_file, vault, order, descending, page_size=16)
+    pages = list(query.pages())
+    assert all(len(page) == 16 for page in pages[:-1])
+
+    rows = [row for page in pages for row in page]
+    expected = sorted(rows, key=query.key, reverse=descending)
+    assert rows == expected
+    assert len({row[0] for row in rows}) == query.count() == 250
+
+
+def test_filters(db_file, vault):
+    query = EntryQuery(db_file, vault, "created", created_after=1, created_before=3)
+    rows = list(query)
+    assert rows and all(1 <= row[4] < 3 for row in rows)
+    assert query.count() == len(rows)
+    assert EntryQuery(db_file, vault + 1).count() == 0
+
+
+def test_unknown_order(db_file, vault):
+    with pytest.raises(ValueError):
+        EntryQuery(db_file, vault, "site")
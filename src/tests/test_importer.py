@@ -0,0 +1,82 @@
+import json
+import pytest
+from cryptical import core, importer
+from utils.db import connection
+
+
+@pytest.fixture
+def session(db_file):
+    """An unlocked vault that already has an entry for "github.com"."""
+    core.open_db(db_file)
+    core.create_vault(db_file, "v", "pw")
+    session = core.unlock(db_file, "v", "pw")
+    core.add_entry(db_file, session, "github.com", "old")
+    yield session
+    session.close()
+
+
+RECORDS = [
+    {"url": "https://github.com/login", "password": "new"},  # already in the vault
+    {"name": "example.org", "password": "p1"},
+    {"site": "example.org", "password": "p2"},  # earlier in the stream
+    {"site": "", "password": "p3"},  # no site
+    {"site": "other.net", "password": "p4"},
+    {"site": "other.net", "password": "p5"},  # same chunk as the previous one
+]
+
+
+def entry_count(db_file) -> int:
+    with connection(db_file) as conn:
+        return conn.execute("SELECT COUNT(*) FROM entries;").fetchone()[0]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 100])
+def test_duplicates_are_skipped(db_file, session, chunk_size):
+    stats = importer.import_entries(db_file, session, RECORDS, chunk_size=chunk_size)
+    counts = (stats["read"], stats["imported"], stats["duplicates"], stats["invalid"])
+    assert counts == (6, 2, 3, 1)
+    assert stats["errors"][0]["record"] == 4
+
+    entries = {e["site"]: e["password"] for e in core.iter_entries(db_file, session, True)}
+    assert entries == {"github.com": "old", "example.org": "p1", "other.net": "p4"}
+    # the new entries can be searched
+    assert [e["site"] for e in core.search_entries(db_file, session, "oth")] == ["other.net"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 100])
+def test_dry_run_counts_without_writing(db_file, session, chunk_size):
+    before = entry_count(db_file)
+    stats = importer.import_entries(
+        db_file, session, RECORDS, dry_run=True, chunk_size=chunk_size
+    )
+    assert (stats["imported"], stats["duplicates"], stats["invalid"]) == (2, 3, 1)
+    assert entry_count(db_file) == before
+
+
+EXPORTS = {
+    "chrome.csv": "name,url,username,password\nGitHub,https://github.com/,me,p1\n",
+    "lines.jsonl": '{"site": "github.com", "password": "p1"}\n\n{"site": "b.org", "password": "p2"}\n',
+    "array.json": json.dumps([{"site": "github.com", "password": "p1"}] * 3, indent=2),
+    "bitwarden.json": json.dumps(
+        {
+            "encrypted": False,
+            "items": [{"name": "GitHub", "login": {"uris": [{"uri": "https://github.com"}], "password": "p1"}}],
+        },
+        indent=2,
+    ),
+    "bitwarden_compact.json": json.dumps(
+        {
+            "encrypted": False,
+            "items": [{"name": "GitHub", "login": {"uris": [{"uri": "github.com"}], "password": "p1"}}],
+        },
+        separators=(",", ":"),
+    ),
+}
+
+
+@pytest.mark.parametrize("name", sorted(EXPORTS))
+def test_reads_export_formats(tmp_path, name):
+    path = tmp_path / name
+    path.write_text(EXPORTS[name], encoding="utf-8")
+    entries = [importer.to_entry(record) for record in importer.read_records(str(path))]
+    assert entries and entries[0] == ("github.com", "p1")
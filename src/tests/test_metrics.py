@@ -0,0 +1,49 @@
+import threading
+import pytest
+from utils import metrics
+
+
+@pytest.fixture
+def recording():
+    was_enabled = metrics.enabled()
+    metrics.reset()
+    metrics.enable()
+    yield
+    metrics.enable(was_enabled)
+    metrics.reset()
+
+
+@metrics.timed("test.inner")
+def inner():
+    return 1
+
+
+@metrics.timed("test.outer")
+def outer():
+    return inner() + inner()
+
+
+def test_nested_calls_are_not_recorded(recording):
+    assert outer() == 2
+    inner()
+    stats = metrics.snapshot()
+    assert stats["test.outer"]["calls"] == 1
+    assert stats["test.inner"]["calls"] == 1
+
+
+def test_other_threads_are_recorded(recording):
+    @metrics.timed("test.threaded")
+    def threaded():
+        thread = threading.Thread(target=inner)
+        thread.start()
+        thread.join()
+
+    threaded()
+    stats = metrics.snapshot()
+    assert stats["test.threaded"]["calls"] == stats["test.inner"]["calls"] == 1
+
+
+def test_disabled(recording):
+    metrics.enable(False)
+    outer()
+    assert metrics.snapshot() == {}
@@ -0,0 +1,155 @@
+import base64, hashlib, sqlite3
+from cryptography.fernet import Fernet
+from cryptical import core
+from utils import misc, models
+from utils.db import connection
+from utils.migrations import MIGRATIONS, migrate, schema_version
+
+
+def legacy_encrypt(pwd: str, msg: str) -> str:
+    """Encrypts like the baseline app: with the padded master password as the key."""
+    key = base64.urlsafe_b64encode(pwd.encode().ljust(32)[:32])
+    return Fernet(key).encrypt(msg.encode()).decode()
+
+
+def create_baseline_db(path: str) -> None:
+    """Writes a database the way the baseline app did, before any migration."""
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """CREATE TABLE vaults
+                    (vid INTEGER PRIMARY KEY AUTOINCREMENT,
+                     vname TEXT UNIQUE NOT NULL,
+                     hmp TEXT NOT NULL,
+                     salt TEXT NOT NULL);
+           CREATE TABLE entries
+                    (pid INTEGER PRIMARY KEY AUTOINCREMENT,
+                     vid INTEGER NOT NULL,
+                     site TEXT NOT NULL,
+                     esp TEXT NOT NULL,
+                     FOREIGN KEY(vid) REFERENCES vaults(vid));"""
+    )
+    salt = "ABCDEFGHIJ"
+    conn.execute(
+        "INSERT INTO vaults VALUES (1, 'old', ?, ?);",
+        (hashlib.sha256(("pw" + salt).encode()).hexdigest(), salt),
+    )
+    rows = [
+        (1, 1, "github.com", legacy_encrypt("pw", "p1")),
+        (2, 1, "example.org", legacy_encrypt("pw", "p2")),
+        (3, 1, "github.com", legacy_encrypt("pw", "p3")),  # duplicate site
+        (4, 7, "orphan.net", legacy_encrypt("pw", "p4")),  # vault 7 was deleted
+        (50, 1, "removed.com", legacy_encrypt("pw", "p5")),
+    ]
+    conn.executemany("INSERT INTO entries VALUES (?, ?, ?, ?);", rows)
+    conn.execute("DELETE FROM entries WHERE pid=50;")
+    conn.commit()
+    conn.close()
+
+
+def test_migrates_baseline_db(db_file):
+    create_baseline_db(db_file)
+    with connection(db_file) as conn:
+        assert schema_version(conn) == 0
+        assert migrate(conn) == len(MIGRATIONS)
+        assert schema_version(conn) == len(MIGRATIONS)
+
+        columns = {col[1]: col[2] for col in conn.execute("PRAGMA table_info(entries);")}
+        assert columns == {
+            "pid": "INTEGER",
+            "vid": "INTEGER",
+            "site": "BLOB",
+            "esp": "BLOB",
+            "sidx": "BLOB",
+            "created": "INTEGER",
+        }
+        vault_columns = [col[1] for col in conn.execute("PRAGMA table_info(vaults);")]
+        assert vault_columns == ["vid", "vname", "hmp", "salt", "kdf", "wdek", "site_grams"]
+        vaults = conn.execute("SELECT kdf, wdek, site_grams FROM vaults;").fetchall()
+        assert vaults == [("sha256", None, 0)]
+
+        # entries of deleted vaults are dropped, duplicates renamed, the counter kept
+        sites = conn.execute("SELECT pid, site, typeof(esp) FROM entries ORDER BY pid;").fetchall()
+        assert sites == [
+            (1, "github.com", "blob"),
+            (2, "example.org", "blob"),
+            (3, "github.com~3", "blob"),
+        ]
+        seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='entries';").fetchone()
+        assert seq == (50,)
+
+        foreign_keys = conn.execute("PRAGMA foreign_key_list(entries);").fetchall()
+        assert [(fk[2], fk[6]) for fk in foreign_keys] == [("vaults", "CASCADE")]
+        assert conn.execute("PRAGMA foreign_keys;").fetchone() == (1,)
+        tables = {
+            row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table';")
+        }
+        assert {"site_tokens", "settings"} <= tables
+        assert not any(name.startswith("entry_sites") for name in tables)
+
+
+def test_migrate_is_idempotent(db_file):
+    create_baseline_db(db_file)
+    with connection(db_file) as conn:
+        migrate(conn)
+        schema = conn.execute("SELECT sql FROM sqlite_master ORDER BY name;").fetchall()
+        assert migrate(conn) == len(MIGRATIONS)
+        assert conn.execute("SELECT sql FROM sqlite_master ORDER BY name;").fetchall() == schema
+
+
+def test_baseline_vault_unlocks_after_migration(db_file):
+    create_baseline_db(db_file)
+    core.open_db(db_file)
+
+    session = core.unlock(db_file, "old", "pw")
+    try:
+        entries = list(core.iter_entries(db_file, session, reveal=True))
+        assert [(e["site"], e["password"]) for e in entries] == [
+            ("github.com", "p1"),
+            ("example.org", "p2"),
+            ("github.com~3", "p3"),
+        ]
+        assert core.get_entry(db_file, session, "example.org")["password"] == "p2"
+    finally:
+        session.close()
+    # the vault now has a wrapped data key and its site names are encrypted
+    vault = core.find_vault(db_file, "old")
+    assert vault[4] != "sha256" and vault[5] is not None
+    with connection(db_file) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM entries WHERE sidx IS NULL;").fetchone() == (0,)
+
+
+def test_deleting_vault_deletes_its_entries(db_file):
+    create_baseline_db(db_file)
+    core.open_db(db_file)
+    core.unlock(db_file, "old", "pw").close()
+
+    core.delete_vault(db_file, "old", "pw")
+    with connection(db_file) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM entries;").fetchone() == (0,)
+        assert conn.execute("SELECT COUNT(*) FROM site_tokens;").fetchone() == (0,)
+
+
+def test_trigram_tokens_are_dropped_on_unlock(db_file, monkeypatch):
+    core.open_db(db_file)
+    core.create_vault(db_file, "v", "pw")
+    session = core.unlock(db_file, "v", "pw")
+    core.add_entry(db_file, session, "github.com", "p1")
+    # as written before substring search was opt-in: every site had trigram tokens
+    assert misc.index_vault_sites(db_file, session, True) == 1
+    session.close()
+    with connection(db_file) as conn:
+        conn.execute("UPDATE vaults SET site_grams=NULL;")
+        conn.commit()
+    monkeypatch.setattr(models, "_vault_stores", {})  # as in a new process
+
+    session = core.unlock(db_file, "v", "pw")
+    try:
+        assert not session.sites.substrings
+        assert core.find_vault(db_file, "v")[6] == 0
+        with connection(db_file) as conn:
+            count = "SELECT COUNT(*) FROM site_tokens WHERE vid=?;"
+            tokens = conn.execute(count, (session.vid,)).fetchone()[0]
+        assert tokens == len(session.sites.tokens("github.com"))
+        assert core.search_entries(db_file, session, "git") == [{"pid": 2, "site": "github.com"}]
+    finally:
+        session.close()
@@ -0,0 +1,111 @@
+import pytest
+from cryptical import core
+from utils import kdf
+from utils.db import connection, transaction
+from utils.envelope import kek_from, new_dek, new_vault_keys, unwrap_dek
+from utils.misc import rotate_vault_key
+from utils.session import VaultSession
+
+
+@pytest.fixture
+def vault(db_file):
+    """A vault "v" of 50 entries with the password "old"; returns its vid."""
+    core.open_db(db_file)
+    vid = core.create_vault(db_file, "v", "old")
+    session = core.unlock(db_file, "v", "old")
+    for i in range(50):
+        core.add_entry(db_file, session, f"site{i}", f"secret{i}")
+    session.close()
+    return vid
+
+
+def stored(db_file, vid) -> tuple:
+    """Returns the stored (vault row, ciphertexts by pid) of a vault."""
+    with connection(db_file) as conn:
+        vault = conn.execute("SELECT * FROM vaults WHERE vid=?;", (vid,)).fetchone()
+        esps = dict(conn.execute("SELECT pid, esp FROM entries WHERE vid=?;", (vid,)))
+    return vault, esps
+
+
+def test_rotation_re_encrypts_every_entry(db_file, vault):
+    old_vault, old_esps = stored(db_file, vault)
+    old_session = core.unlock(db_file, "v", "old")
+    dek = new_dek()
+    new_session = VaultSession(old_vault, dek)
+    steps = []
+    done = rotate_vault_key(
+        db_file,
+        vault,
+        old_session,
+        new_session,
+        new_vault_keys("new", dek),
+        batch_size=7,
+        workers=3,
+        progress=lambda done, total: steps.append((done, total)),
+    )
+    assert done == 50
+    assert steps[0] == (7, 50) and steps[-1] == (50, 50)
+
+    new_vault, new_esps = stored(db_file, vault)
+    assert new_vault[2:] != old_vault[2:]
+    assert new_esps.keys() == old_esps.keys()
+    assert all(new_esps[pid] != old_esps[pid] for pid in old_esps)
+    assert sorted(new_session.decrypt_many(list(new_esps.values()))) == sorted(
+        f"secret{i}" for i in range(50)
+    )
+    assert unwrap_dek("new", new_vault) == dek
+
+
+def test_failed_rotation_changes_nothing(db_file, vault):
+    with transaction(db_file) as conn:
+        conn.execute("UPDATE entries SET esp='damaged' WHERE pid=?;", (40,))
+    before = stored(db_file, vault)
+
+    session = core.unlock(db_file, "v", "old")
+    dek = new_dek()
+    done = rotate_vault_key(
+        db_file, vault, session, VaultSession(before[0], dek), new_vault_keys("new", dek)
+    )
+    assert done is None
+    assert stored(db_file, vault) == before
+    core.unlock(db_file, "v", "old").close()
+
+
+def test_change_password_only_rewraps_the_data_key(db_file, vault):
+    old_vault, old_esps = stored(db_file, vault)
+    core.change_password(db_file, "v", "old", "new").close()
+    with pytest.raises(ValueError):
+        core.unlock(db_file, "v", "old")
+
+    new_vault, new_esps = stored(db_file, vault)
+    assert new_vault[5] != old_vault[5] and new_esps == old_esps
+    session = core.unlock(db_file, "v", "new")
+    entries = {e["site"]: e["password"] for e in core.iter_entries(db_file, session, True)}
+    session.close()
+    assert entries == {f"site{i}": f"secret{i}" for i in range(50)}
+
+
+@pytest.mark.parametrize("new_pwd", ["", "with space", "quote'"])
+def test_change_password_validates_the_new_password(db_file, vault, new_pwd):
+    with pytest.raises(ValueError, match="Invalid password"):
+        core.change_password(db_file, "v", "old", new_pwd)
+    core.unlock(db_file, "v", "old").close()
+
+
+def test_unlock_runs_the_kdf_once(db_file, vault, monkeypatch):
+    runs = []
+    derive = kdf.ScryptKdf.derive
+
+    def counted(self, pwd, salt):
+        runs.append(salt)
+        return derive(self, pwd, salt)
+
+    monkeypatch.setattr(kdf.ScryptKdf, "derive", counted)
+    core.unlock(db_file, "v", "old").close()
+    assert len(runs) == 1
+
+    # the stored verifier checks the password but is not the key wrapping the data key
+    row, _ = stored(db_file, vault)
+    assert kdf.check_password("old", row) and not kdf.check_password("new", row)
+    output = derive(kdf.from_spec(row[4]), "old", row[3])
+    assert row[2] == kdf.verifier(output) != kek_from(output).decode()
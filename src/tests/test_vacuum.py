@@ -0,0 +1,98 @@
+import os, sqlite3
+import pytest
+from cryptical import core, importer
+from utils import misc, vacuum
+from utils.db import connection
+
+
+@pytest.fixture
+def db_file(db_file, monkeypatch):
+    """A database with a vault "big" of 3000 entries next to the example vault."""
+    monkeypatch.setattr(vacuum, "STEP_PAUSE_S", 0)
+    core.open_db(db_file)
+    core.create_vault(db_file, "big", "pw")
+    session = core.unlock(db_file, "big", "pw")
+    records = ({"site": f"site{i}.com", "password": "x" * 200} for i in range(3000))
+    assert importer.import_entries(db_file, session, records)["imported"] == 3000
+    session.close()
+    return db_file
+
+
+def file_size(db_file) -> int:
+    """Returns the size of the database file, with the log copied into it."""
+    with connection(db_file) as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE);").fetchall()
+    return os.path.getsize(db_file)
+
+
+def test_deleted_vault_space_is_given_back(db_file):
+    size = file_size(db_file)
+    core.delete_vault(db_file, "big", "pw")
+    vacuum.wait_for_reclaims()
+
+    with connection(db_file) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM entries;").fetchone() == (1,)
+        assert conn.execute("SELECT COUNT(*) FROM site_tokens WHERE vid<>1;").fetchone() == (0,)
+        assert vacuum.free_pages(conn) < vacuum.MIN_FREE_PAGES
+    assert file_size(db_file) < size / 4
+
+
+def test_reclaims_in_steps(db_file, monkeypatch):
+    monkeypatch.setattr(vacuum, "PAGES_PER_STEP", 50)
+    monkeypatch.setattr(misc, "reclaim_in_background", lambda db_file: None)  # not in the background
+    core.delete_vault(db_file, "big", "pw")
+    with connection(db_file) as conn:
+        free = vacuum.free_pages(conn)
+    assert free > 100
+
+    steps = []
+    assert vacuum.reclaim_space(db_file, progress=steps.append) == free
+    assert steps[0] == free - 50 and steps[-1] == 0
+    # nothing left to reclaim
+    assert vacuum.reclaim_space(db_file, min_free=0) == 0
+
+
+def test_small_leftovers_are_kept(db_file, monkeypatch):
+    monkeypatch.setattr(misc, "reclaim_in_background", lambda db_file: None)  # not in the background
+    core.delete_vault(db_file, "big", "pw")
+    with connection(db_file) as conn:
+        free = vacuum.free_pages(conn)
+    assert vacuum.reclaim_space(db_file, min_free=free + 1) == 0
+    with connection(db_file) as conn:
+        assert vacuum.free_pages(conn) == free
+
+
+def test_converts_older_databases(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "old.db")
+    conn = sqlite3.connect(db_file)  # created without auto-vacuum
+    conn.execute("CREATE TABLE t (x TEXT);")
+    conn.executemany("INSERT INTO t VALUES (?);", [("x" * 500,) for _ in range(5000)])
+    conn.commit()
+    conn.execute("DELETE FROM t;")
+    conn.commit()
+    conn.close()
+    size = os.path.getsize(db_file)
+
+    assert vacuum.reclaim_space(db_file) > 0
+    with connection(db_file) as conn:
+        assert conn.execute("PRAGMA auto_vacuum;").fetchone() == (2,)
+        assert vacuum.free_pages(conn) == 0
+    assert file_size(db_file) < size / 4
+
+
+def test_conversion_does_not_wait_for_other_writers(tmp_path):
+    db_file = str(tmp_path / "old.db")
+    other = sqlite3.connect(db_file)
+    other.execute("PRAGMA journal_mode=WAL;")
+    other.execute("CREATE TABLE t (x TEXT);")
+    other.executemany("INSERT INTO t VALUES (?);", [("x" * 500,) for _ in range(5000)])
+    other.commit()
+    other.execute("DELETE FROM t;")
+    other.commit()
+
+    other.execute("BEGIN IMMEDIATE;")  # e.g. another process writing
+    assert vacuum.reclaim_space(db_file) == 0
+    other.rollback()
+    with connection(db_file) as conn:
+        assert conn.execute("PRAGMA auto_vacuum;").fetchone() == (0,)
+    other.close()
@@ -1,5 +1,6 @@
 import customtkinter as ctk
-from utils.misc import add_entry_to_db, get_data
+from cryptical import core
+from utils.models import get_entry_store
 
 
 class AddEntryDialog(ctk.CTkToplevel):
@@ -11,10 +12,10 @@ class AddEntryDialog(ctk.CTkToplevel):
     diffpwds_error = False
     win_height = 200
     win_width = 400
-    PROHIBITED_NAME_CHARS = " \"'(),/:;<>?[\]`{|}~"
-    PROHIBITED_PWD_CHARS = " \"'(),/:;<>?[\]`{|}"
+    PROHIBITED_NAME_CHARS = core.PROHIBITED_NAME_CHARS
+    PROHIBITED_PWD_CHARS = core.PROHIBITED_PWD_CHARS
 
-    def __init__(self, db_file, vmp, vname, vid, parent, *args, **kwargs):
+    def __init__(self, db_file, session, parent, *args, **kwargs):
         """Initialize the Add Entry Dialog."""
 
         super().__init__(*args, **kwargs)  # call base constructor
@@ -24,16 +25,14 @@ class AddEntryDialog(ctk.CTkToplevel):
         self.geometry(f"{self.win_width}x{self.win_height}")  # dimensions
 
         # Setup dialog UI
-        self.build_ui(db_file, vmp, vname, vid, parent)
+        self.build_ui(db_file, session, parent)
 
-    def build_ui(self, db_file, vmp, vname, vid, parent) -> None:
+    def build_ui(self, db_file, session, parent) -> None:
         """Initialize the widgets necessary for functioning of the add entry dialog.
 
         Args:
             db_file (str): The database file name.
-            vmp (str): The vault master password.
-            vname (str): The vault name.
-            vid (int): The vault id.
+            session (VaultSession): The unlocked vault to add the entry to.
             parent (ctk.CTk): The parent widget for the add vault dialog.
 
         Returns:
@@ -85,9 +84,7 @@ class AddEntryDialog(ctk.CTkToplevel):
         self.ebtn_create_entry = ctk.CTkButton(
             self.ebtn_frame,
             text="Create Entry",
-            command=lambda: self.on_click_create_entry(
-                db_file, vmp, vid, vname, parent
-            ),
+            command=lambda: self.on_click_create_entry(db_file, session, parent),
         )
         self.ebtn_create_entry.grid(row=0, column=0, padx=10)
 
@@ -99,16 +96,14 @@ class AddEntryDialog(ctk.CTkToplevel):
         self.ebtn_frame.columnconfigure((0, 1), weight=1)
         self.ebtn_frame.pack(expand=True, fill="x")
 
-    def on_click_create_entry(self, db_file, vmp, vid, vname, parent) -> None:
+    def on_click_create_entry(self, db_file, session, parent) -> None:
         """
         Handles the creation of a new entry.
 
         Args:
             self: The instance of the class that this method is bound to.
             db_file (str): The path to the database file where the vault information will be stored.
-            vmp (str): The vault master password.
-            vname (str): The vault name.
-            vid (int): The vault id.
+            session (VaultSession): The unlocked vault to add the entry to.
             parent (ctk.CTk): The parent widget for the GUI-based application.
 
         Returns: None
@@ -117,6 +112,7 @@ class AddEntryDialog(ctk.CTkToplevel):
         sname = self.sname_entry.get()
         pwd = self.spwd_entry.get()
         rpwd = self.srpwd_entry.get()
+        errors = core.check_new_entry(db_file, session, sname, pwd, rpwd)
 
         # Define a helper function to show an error message
         def show_error(parent: ctk.CTkToplevel, text: str):
@@ -139,7 +135,7 @@ class AddEntryDialog(ctk.CTkToplevel):
             return frame, label
 
         # Check if the vault name contains prohibited characters
-        if any(ch in self.PROHIBITED_NAME_CHARS for ch in sname):
+        if "name" in errors:
             # Show an error message if the name contains prohibited characters
             if not self.name_error:
                 self.win_height += 50
@@ -156,7 +152,7 @@ class AddEntryDialog(ctk.CTkToplevel):
                 self.name_error = False
 
         # Check if the site name is empty
-        if sname == "":
+        if "noname" in errors:
             # Show an error message if the name is empty
             if not self.noname_error:
                 self.win_height += 50
@@ -171,11 +167,10 @@ class AddEntryDialog(ctk.CTkToplevel):
                 self.noname_err_frame.destroy()
                 self.noname_error = False
 
-        # Check if the site name is already in use
-        used_names = get_data(db_file, "SELECT site FROM entries;")
-        if (sname,) in used_names:
+        # Check if the site name is already in use in this vault
+        if "usedname" in errors:
             # Show an error message if the name is already in use
-            if not self.usedname_err:
+            if not self.usedname_error:
                 self.win_height += 50
                 self.usedname_error = True
                 self.usedname_err_frame, self.usedname_err_label = show_error(
@@ -190,7 +185,7 @@ class AddEntryDialog(ctk.CTkToplevel):
                 self.usedname_error = False
 
         # Check if the password contains prohibited characters
-        if any(ch in self.PROHIBITED_PWD_CHARS for ch in pwd):
+        if "pwd" in errors:
             # Show an error message if the password contains prohibited characters
             if not self.pwd_error:
                 self.win_height += 50
@@ -207,7 +202,7 @@ class AddEntryDialog(ctk.CTkToplevel):
                 self.pwd_error = False
 
         # Check if the password is empty
-        if pwd == "":
+        if "nopwd" in errors:
             # Show an error message if the password is empty
             if not self.nopwd_error:
                 self.win_height += 50
@@ -224,7 +219,7 @@ class AddEntryDialog(ctk.CTkToplevel):
                 self.nopwd_error = False
 
         # check if password and retyped password are not equivalent
-        if pwd != rpwd:
+        if "diffpwds" in errors:
             # Show an error message if they are different
             if not self.diffpwds_error:
                 self.win_height += 50
@@ -241,7 +236,7 @@ class AddEntryDialog(ctk.CTkToplevel):
 
         self.geometry(f"{self.win_width}x{self.win_height}")
 
-        # If no errors exist, save the info to the database and rebuild the ui of the parent window
+        # If no errors exist, save the info to the database; the parent window is notified by the store
         if not any(
             [
                 self.name_error,
@@ -252,6 +247,5 @@ class AddEntryDialog(ctk.CTkToplevel):
                 self.diffpwds_error,
             ]
         ):
-            add_entry_to_db(db_file, vmp, vid, sname, pwd)
+            get_entry_store(db_file).add(session, sname, pwd)
             self.destroy()
-            parent.build_ui(db_file, vmp, vname, vid)
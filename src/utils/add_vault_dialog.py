@@ -1,5 +1,8 @@
 import customtkinter as ctk
-from utils.misc import add_vault_to_db, get_data
+from cryptical import core
+from utils.envelope import new_vault_keys
+from utils.models import get_vault_store
+from utils.tasks import get_scheduler
 
 
 class AddVaultDialog(ctk.CTkToplevel):
@@ -11,8 +14,8 @@ class AddVaultDialog(ctk.CTkToplevel):
     diffpwds_error = False
     win_height = 200
     win_width = 400
-    PROHIBITED_NAME_CHARS = " \"'(),/:;<>?[\]`{|}~"
-    PROHIBITED_PWD_CHARS = " \"'(),/:;<>?[\]`{|}"
+    PROHIBITED_NAME_CHARS = core.PROHIBITED_NAME_CHARS
+    PROHIBITED_PWD_CHARS = core.PROHIBITED_PWD_CHARS
 
     def __init__(self, db_file: str, parent: ctk.CTk, *args, **kwargs):
         """Initialize the Add Vault Dialog."""
@@ -109,6 +112,7 @@ class AddVaultDialog(ctk.CTkToplevel):
         vname = self.vname_entry.get()
         pwd = self.vpwd_entry.get()
         rpwd = self.vrpwd_entry.get()
+        errors = core.check_new_vault(db_file, vname, pwd, rpwd)
 
         # Define a helper function to show an error message
         def show_error(parent: ctk.CTkToplevel, text: str):
@@ -131,7 +135,7 @@ class AddVaultDialog(ctk.CTkToplevel):
             return frame, label
 
         # Check if the vault name contains prohibited characters
-        if any(ch in self.PROHIBITED_NAME_CHARS for ch in vname):
+        if "name" in errors:
             # Show an error message if the name contains prohibited characters
             if not self.name_error:
                 self.win_height += 50
@@ -148,7 +152,7 @@ class AddVaultDialog(ctk.CTkToplevel):
                 self.name_error = False
 
         # Check if the vault name is empty
-        if vname == "":
+        if "noname" in errors:
             # Show an error message if the name is empty
             if not self.noname_error:
                 self.win_height += 50
@@ -164,8 +168,7 @@ class AddVaultDialog(ctk.CTkToplevel):
                 self.noname_error = False
 
         # Check if the vault name is already in use
-        used_names = get_data(db_file, "SELECT vname FROM vaults;")
-        if (vname,) in used_names:
+        if "usedname" in errors:
             # Show an error message if the name is already in use
             if not self.usedname_error:
                 self.win_height += 50
@@ -182,7 +185,7 @@ class AddVaultDialog(ctk.CTkToplevel):
                 self.usedname_error = False
 
         # Check if the password contains prohibited characters
-        if any(ch in self.PROHIBITED_PWD_CHARS for ch in pwd):
+        if "pwd" in errors:
             # Show an error message if the password contains prohibited characters
             if not self.pwd_error:
                 self.win_height += 50
@@ -199,7 +202,7 @@ class AddVaultDialog(ctk.CTkToplevel):
                 self.pwd_error = False
 
         # Check if the password is empty
-        if pwd == "":
+        if "nopwd" in errors:
             # Show an error message if the password is empty
             if not self.nopwd_error:
                 self.win_height += 50
@@ -216,7 +219,7 @@ class AddVaultDialog(ctk.CTkToplevel):
                 self.nopwd_error = False
 
         # check if password and retyped password are not equivalent
-        if pwd != rpwd:
+        if "diffpwds" in errors:
             # Show an error message if they are different
             if not self.diffpwds_error:
                 self.win_height += 50
@@ -233,7 +236,7 @@ class AddVaultDialog(ctk.CTkToplevel):
 
         self.geometry(f"{self.win_width}x{self.win_height}")
 
-        # If no errors exist, save the info to the database and rebuild the ui of the parent window
+        # If no errors exist, save the info to the database; the parent window is notified by the store
         if not any(
             [
                 self.name_error,
@@ -244,6 +247,26 @@ class AddVaultDialog(ctk.CTkToplevel):
                 self.diffpwds_error,
             ]
         ):
-            add_vault_to_db(db_file, vname, pwd)
-            self.destroy()
-            parent.build_ui(db_file)
+            # Hash the password and wrap a new data key on a background worker
+            self.vbtn_create_vault.configure(state="disabled", text="Creating…")
+            get_scheduler().submit(
+                new_vault_keys,
+                pwd,
+                on_done=lambda hashed: self.on_pwd_hashed(db_file, vname, pwd, hashed),
+                owner=self,
+            )
+
+    def on_pwd_hashed(self, db_file: str, vname: str, pwd: str, hashed: tuple) -> None:
+        """
+        Saves the new vault once its master password has been hashed.
+
+        Args:
+            db_file (str): The path to the database file.
+            vname (str): The vault name.
+            pwd (str): The vault master password.
+            hashed (tuple): The (hmp, salt, kdf, wdek) computed for the password.
+
+        Returns: None
+        """
+        get_vault_store(db_file).add(vname, pwd, hashed)
+        self.destroy()
@@ -0,0 +1,24 @@
+"""
+This is the assets component.
+It decodes the app's images once and shares them between widgets: every tile
+showing the same image at the same size uses one CTkImage, which CustomTkinter
+scales once per UI scaling factor and caches.
+"""
+
+from functools import lru_cache
+from PIL import Image
+import customtkinter as ctk
+
+
+@lru_cache(maxsize=None)
+def load_image(path: str) -> Image.Image:
+    """Returns the decoded image at `path`, reading the file only on first use."""
+    with Image.open(path) as image:
+        return image.copy()  # copying decodes the pixels and lets the file close
+
+
+@lru_cache(maxsize=None)
+def ctk_image(path: str, size: tuple) -> ctk.CTkImage:
+    """Returns the shared CTkImage showing the image at `path` in `size` (width, height)."""
+    image = load_image(path)
+    return ctk.CTkImage(light_image=image, dark_image=image, size=size)
@@ -0,0 +1,212 @@
+"""
+This is the backup component.
+It snapshots a live database with SQLite's online backup API, a few pages at a
+time on a background thread, so the app keeps reading and writing while a
+backup runs and never sees a torn copy. Every snapshot is checked with
+`PRAGMA integrity_check`, gets a sha256 sidecar file and only the newest
+BACKUP_KEEP snapshots are kept.
+"""
+
+import hashlib, os, sqlite3, threading, time
+
+# Folder snapshots are written to, relative to the database file.
+BACKUP_DIR = "backups"
+# Number of snapshots kept per database.
+BACKUP_KEEP = 5
+# Pages copied per backup step; the source is only locked during a step.
+PAGES_PER_STEP = 256
+# Pause between steps, leaving the database to the app's own queries.
+STEP_PAUSE_S = 0.005
+# Quiet period after a write before a backup starts, so bursts of edits
+# produce a single snapshot.
+DEBOUNCE_S = 30
+# Time between scheduled backups when nothing triggered one.
+INTERVAL_S = 60 * 60
+
+
+def backup_dir(db_file: str) -> str:
+    """Returns the folder holding the snapshots of a database."""
+    return os.path.join(os.path.dirname(os.path.abspath(db_file)), BACKUP_DIR)
+
+
+def list_backups(db_file: str) -> list:
+    """Returns the snapshot files of a database, oldest first."""
+    directory = backup_dir(db_file)
+    if not os.path.isdir(directory):
+        return []
+    prefix = os.path.basename(db_file) + "."
+    names = [n for n in os.listdir(directory) if n.startswith(prefix) and n.endswith(".bak")]
+    return [os.path.join(directory, n) for n in sorted(names)]
+
+
+def file_checksum(path: str) -> str:
+    """Returns the sha256 of a file, read in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def verify_backup(path: str) -> bool:
+    """Checks a snapshot against its sha256 sidecar and SQLite's integrity check.
+
+    Args:
+        path (str): The snapshot file.
+
+    Returns:
+        bool: Whether the snapshot is intact.
+    """
+    try:
+        with open(path + ".sha256") as file:
+            if file.read().split()[0] != file_checksum(path):
+                return False
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            return conn.execute("PRAGMA integrity_check;").fetchone()[0] == "ok"
+        finally:
+            conn.close()
+    except (OSError, IndexError, sqlite3.Error) as e:
+        print(f"Error verifying backup {path}: {e}")
+        return False
+
+
+def backup_now(db_file: str, keep: int = BACKUP_KEEP, progress=None) -> str:
+    """Snapshots a database, verifies the snapshot and rotates old ones.
+
+    The copy runs on its own connection in steps of PAGES_PER_STEP pages, so it
+    may be called on any thread while the database is in use. It restarts by
+    itself if another connection writes to the database in the middle of it.
+
+    Args:
+        db_file (str): The filename of the database to back up.
+        keep (int, optional): Number of snapshots to keep. Defaults to BACKUP_KEEP.
+        progress (callable, optional): Called with (remaining, total) pages
+            after every step.
+
+    Returns:
+        str: The path of the new snapshot, or None if the backup failed.
+    """
+    directory = backup_dir(db_file)
+    os.makedirs(directory, exist_ok=True)
+    now_ns = time.time_ns()
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now_ns // 10**9))
+    stamp += f"-{now_ns % 10**9:09d}"  # sub-second part keeps names unique and sorted
+    path = os.path.join(directory, f"{os.path.basename(db_file)}.{stamp}.bak")
+    tmp_path = path + ".tmp"
+
+    def on_step(status, remaining, total):
+        if progress:
+            progress(remaining, total)
+        time.sleep(STEP_PAUSE_S)
+
+    try:
+        source = sqlite3.connect(db_file)
+        target = sqlite3.connect(tmp_path)
+        try:
+            source.backup(target, pages=PAGES_PER_STEP, progress=on_step)
+            # snapshots of a WAL database are WAL databases too; make the
+            # snapshot a single self-contained file
+            target.execute("PRAGMA journal_mode=DELETE;")
+        finally:
+            target.close()
+            source.close()
+
+        with open(tmp_path + ".sha256", "w") as file:
+            file.write(f"{file_checksum(tmp_path)}  {os.path.basename(path)}\n")
+        os.replace(tmp_path + ".sha256", path + ".sha256")
+        os.replace(tmp_path, path)
+        if not verify_backup(path):
+            raise sqlite3.DatabaseError("snapshot failed verification")
+    except (OSError, sqlite3.Error) as e:
+        print(f"Error backing up database: {e}")
+        for leftover in (tmp_path, tmp_path + ".sha256", path, path + ".sha256"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        return None
+
+    # rotate: drop the oldest snapshots beyond `keep`
+    for old in list_backups(db_file)[:-keep]:
+        for leftover in (old, old + ".sha256"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    return path
+
+
+class BackupWorker:
+    """A daemon thread backing up one database on a schedule and after writes.
+
+    Attributes:
+        db_file (str): The filename of the database to back up.
+        keep (int): Number of snapshots kept.
+        progress (callable): Passed on to backup_now(); runs on the worker thread.
+        last_backup (str): Path of the latest snapshot taken by this worker.
+    """
+
+    def __init__(self, db_file: str, keep: int = BACKUP_KEEP, progress=None) -> None:
+        """Starts the worker; it takes a first snapshot if there is none yet."""
+        self.db_file = db_file
+        self.keep = keep
+        self.progress = progress
+        self.last_backup = None
+        self._dirty = not list_backups(db_file)
+        self._last_write = 0.0
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="backup", daemon=True)
+        self._thread.start()
+
+    def notify_write(self) -> None:
+        """Marks the database as changed; a backup follows after DEBOUNCE_S of quiet."""
+        self._dirty = True
+        self._last_write = time.monotonic()
+        self._wake.set()
+
+    def _run(self) -> None:
+        """Waits for writes or the next scheduled backup and takes snapshots."""
+        next_scheduled = time.monotonic() + INTERVAL_S
+        while not self._stopped:
+            now = time.monotonic()
+            quiet_until = self._last_write + DEBOUNCE_S
+            if self._dirty and (now >= quiet_until or now >= next_scheduled):
+                self._dirty = False
+                path = backup_now(self.db_file, self.keep, self.progress)
+                self.last_backup = path or self.last_backup
+                next_scheduled = time.monotonic() + INTERVAL_S
+                continue
+            if now >= next_scheduled:
+                next_scheduled = now + INTERVAL_S
+            # sleep until the next deadline or the next write
+            deadline = quiet_until if self._dirty else next_scheduled
+            self._wake.wait(max(deadline - now, 0.1))
+            self._wake.clear()
+
+    def stop(self) -> None:
+        """Stops the worker, waiting for a backup in progress to finish."""
+        self._stopped = True
+        self._wake.set()
+        self._thread.join()
+
+
+# Backup workers by database file.
+_workers = {}
+
+
+def start_backups(db_file: str, keep: int = BACKUP_KEEP, progress=None) -> BackupWorker:
+    """Starts (or returns) the backup worker of a database."""
+    if db_file not in _workers:
+        _workers[db_file] = BackupWorker(db_file, keep, progress)
+    return _workers[db_file]
+
+
+def notify_write(db_file: str) -> None:
+    """Tells the backup worker of a database, if one runs, that it was written to."""
+    worker = _workers.get(db_file)
+    if worker is not None:
+        worker.notify_write()
+
+
+def stop_backups() -> None:
+    """Stops every backup worker."""
+    while _workers:
+        _workers.popitem()[1].stop()
@@ -0,0 +1,126 @@
+"""
+This is the blind index component.
+Site names are stored encrypted, so the database cannot compare them. Instead
+every entry also stores keyed HMACs of its site, computed with subkeys of the
+vault's data key:
+
+- a blind index of the whole site name, which makes exact lookups and the
+  unique-site check indexed equality queries on an opaque column;
+- search tokens: one per prefix of PREFIX_LENGTHS characters (lowercased) of
+  every word of the site, so "git" finds "github.com" and "api.github.com".
+
+A search looks up the entries holding the token of its longest such prefix;
+only those candidates are decrypted and checked with matches(), and a query no
+word starts with is answered by the index alone.
+
+Without the data key the columns reveal which entries of a vault share a site
+or a word prefix, but not the sites themselves.
+
+Vaults can opt in to substring search (see core.set_substring_search()): their
+sites then also get a token per GRAM_LENGTH-character substring (trigram), so
+"thub" finds "github.com". This reveals much more: which entries share any
+three consecutive characters, and about as many tokens per entry as the site
+has characters, which gives away the length of every site name. It also takes
+several times the space, so it is off by default.
+"""
+
+import hmac, re
+from utils.ciphers import subkey
+
+# Lengths of the prefixes with a token. Every length up to 3 lets short queries
+# use the index; the longer ones narrow down the candidates of longer queries
+# in vaults with many sites sharing their first characters.
+PREFIX_LENGTHS = (1, 2, 3, 5, 8)
+# Length of the substrings with a token in vaults with substring search.
+GRAM_LENGTH = 3
+# Bytes of HMAC kept: enough for the blind index to be unique in practice, and
+# for prefix tokens to fit in a 64-bit INTEGER column.
+BLIND_INDEX_BYTES = 16
+TOKEN_BYTES = 8
+
+# Where words start: the beginning of the name and after any non-word character.
+WORD_START = re.compile(r"(?<![^\W_])[^\W_]")
+
+
+class SiteIndex:
+    """Computes the blind index and search tokens of site names for one vault.
+
+    Attributes:
+        substrings (bool): Whether sites get trigram tokens for substring search.
+    """
+
+    def __init__(self, key: bytes, substrings: bool = False) -> None:
+        """Derives the HMAC keys from the vault's data key.
+
+        Args:
+            key (bytes): The vault's data key, a Fernet key.
+            substrings (bool, optional): Add trigram tokens. Defaults to False.
+        """
+        self.substrings = substrings
+        self._index_key = subkey(key, "cryptical/site-index")
+        self._token_key = subkey(key, "cryptical/site-token")
+        self._gram_key = subkey(key, "cryptical/site-gram")
+
+    def blind_index(self, site: str) -> bytes:
+        """Returns the blind index of a site name; equal names give equal indexes."""
+        return hmac.digest(self._index_key, site.encode(), "sha256")[:BLIND_INDEX_BYTES]
+
+    def token(self, prefix: str) -> int:
+        """Returns the search token of a (lowercased) prefix."""
+        return _token(self._token_key, prefix)
+
+    def gram_token(self, gram: str) -> int:
+        """Returns the search token of a (lowercased) trigram."""
+        return _token(self._gram_key, gram)
+
+    def tokens(self, site: str) -> set:
+        """Returns the tokens of a site's word prefixes, and of its trigrams if enabled."""
+        site = site.lower()
+        tokens = {
+            self.token(site[start : start + length])
+            for start in word_starts(site)
+            for length in PREFIX_LENGTHS
+            if length <= len(site) - start
+        }
+        return tokens | self.gram_tokens(site) if self.substrings else tokens
+
+    def gram_tokens(self, text: str) -> set:
+        """Returns the tokens of the trigrams of a text; empty if it is shorter than GRAM_LENGTH."""
+        text = text.lower()
+        return {
+            self.gram_token(text[start : start + GRAM_LENGTH])
+            for start in range(len(text) - GRAM_LENGTH + 1)
+        }
+
+    def prefix_tokens(self, query: str) -> set:
+        """Returns the tokens every site with a word starting with `query` has; see matches()."""
+        length = max((n for n in PREFIX_LENGTHS if n <= len(query)), default=1)
+        tokens = {self.token(query.lower()[:length])}
+        return tokens | self.gram_tokens(query) if self.substrings else tokens
+
+
+def _token(key: bytes, text: str) -> int:
+    """Returns the keyed HMAC of a text as a signed 64-bit integer."""
+    digest = hmac.digest(key, text.encode(), "sha256")
+    return int.from_bytes(digest[:TOKEN_BYTES], "big", signed=True)
+
+
+def word_starts(site: str) -> list:
+    """Returns the positions where the words of a site name start."""
+    return [match.start() for match in WORD_START.finditer(site)]
+
+
+def matches(site: str, query: str) -> bool:
+    """Checks whether the site name, read from the start of one of its words, starts with a query.
+
+    E.g. "api.github.com" matches "git", "GitHub.c" and "com" but not "hub".
+
+    Args:
+        site (str): The decrypted site name.
+        query (str): The search text.
+
+    Returns:
+        bool: Whether the site matches, ignoring case.
+    """
+    site, query = site.lower(), query.lower()
+    return any(site.startswith(query, start) for start in word_starts(site))
@@ -0,0 +1,157 @@
+"""
+This is the cipher component.
+Entries are encrypted by one of several cipher engines. Every ciphertext starts
+with the version byte of the engine that produced it, so engines can be added
+or made the default without touching existing entries: new entries use
+DEFAULT_CIPHER and every stored ciphertext is decrypted by the engine its first
+byte names. Fernet tokens already start with 0x80, so entries written before
+engines existed keep decrypting unchanged.
+"""
+
+import base64, os
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+# Engine used for new ciphertexts.
+DEFAULT_CIPHER = os.environ.get("CRYPTICAL_CIPHER", "aes-gcm")
+
+
+def subkey(key: bytes, name: str) -> bytes:
+    """Derives the 32 byte key of one engine from a vault's (Fernet encoded) data key."""
+    hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=name.encode())
+    return hkdf.derive(base64.urlsafe_b64decode(key))
+
+
+class FernetCipher:
+    """AES-128-CBC with HMAC-SHA256, the original format, kept to read old entries."""
+
+    name = "fernet"
+    version = 0x80
+
+    def __init__(self, key: bytes) -> None:
+        self._fernet = Fernet(key)
+
+    def encrypt(self, data: bytes) -> bytes:
+        """Returns the raw (not base64 encoded) Fernet token of `data`."""
+        return base64.urlsafe_b64decode(self._fernet.encrypt(data))
+
+    def decrypt(self, token: bytes) -> bytes:
+        """Authenticates and decrypts a raw Fernet token."""
+        return self._fernet.decrypt(base64.urlsafe_b64encode(token))
+
+
+class AeadCipher:
+    """An AEAD engine: version byte, 12 byte nonce, then ciphertext and tag.
+
+    The version byte is authenticated as associated data.
+    """
+
+    name = None
+    version = None
+    aead = None
+
+    def __init__(self, key: bytes) -> None:
+        self._aead = self.aead(subkey(key, "cryptical/" + self.name))
+        self._header = bytes([self.version])
+
+    def encrypt(self, data: bytes) -> bytes:
+        """Encrypts `data` under a random nonce."""
+        nonce = os.urandom(12)
+        return self._header + nonce + self._aead.encrypt(nonce, data, self._header)
+
+    def decrypt(self, token: bytes) -> bytes:
+        """Authenticates and decrypts a ciphertext, raising InvalidToken if tampered with."""
+        # slice through a memoryview so the nonce and ciphertext are not copied
+        view = memoryview(token)
+        try:
+            return self._aead.decrypt(view[1:13], view[13:], view[:1])
+        except InvalidTag:
+            raise InvalidToken
+
+
+class AesGcmCipher(AeadCipher):
+    """AES-256-GCM, the default; hardware accelerated on most CPUs."""
+
+    name = "aes-gcm"
+    version = 0x01
+    aead = AESGCM
+
+
+class ChaChaCipher(AeadCipher):
+    """ChaCha20-Poly1305, for CPUs without AES instructions."""
+
+    name = "chacha20"
+    version = 0x02
+    aead = ChaCha20Poly1305
+
+
+# Available engines by name and by version byte.
+CIPHERS = {cipher.name: cipher for cipher in (FernetCipher, AesGcmCipher, ChaChaCipher)}
+CIPHER_VERSIONS = {cipher.version: cipher for cipher in CIPHERS.values()}
+
+
+class CipherSuite:
+    """Every engine keyed with one vault's data key.
+
+    Engines are created on first use, so a vault whose entries all use the
+    default engine never sets up the others.
+
+    Attributes:
+        default: The engine new ciphertexts are written with.
+    """
+
+    def __init__(self, key: bytes, default: str = DEFAULT_CIPHER) -> None:
+        """Initializes the suite.
+
+        Args:
+            key (bytes): The vault's data key, a Fernet key.
+            default (str, optional): Name of the engine to encrypt with. Defaults
+                to DEFAULT_CIPHER.
+
+        Raises:
+            ValueError: If `default` names an unknown engine.
+        """
+        if default not in CIPHERS:
+            raise ValueError(f"Unknown cipher: {default}")
+        self._key = key
+        self._engines = {}
+        self.default = self.engine(CIPHERS[default].version)
+
+    def engine(self, version: int):
+        """Returns the engine for a version byte, creating it on first use."""
+        if version not in self._engines:
+            if version not in CIPHER_VERSIONS:
+                raise InvalidToken
+            self._engines[version] = CIPHER_VERSIONS[version](self._key)
+        return self._engines[version]
+
+    def encrypt(self, data: bytes) -> bytes:
+        """Encrypts `data` with the default engine."""
+        return self.default.encrypt(data)
+
+    def decrypt(self, token: bytes) -> bytes:
+        """Decrypts a ciphertext with the engine named by its first byte.
+
+        Raises:
+            InvalidToken: If the ciphertext is empty, names no known engine or
+            fails authentication.
+        """
+        if not token:
+            raise InvalidToken
+        return self.engine(token[0]).decrypt(token)
+
+
+def to_text(token: bytes) -> str:
+    """Encodes a raw ciphertext as urlsafe base64 text, as Fernet does."""
+    return base64.urlsafe_b64encode(token).decode()
+
+
+def from_text(text: str) -> bytes:
+    """Decodes a ciphertext encoded by to_text(), or an original Fernet token.
+
+    Entries were stored this way before ciphertexts became BLOBs.
+    """
+    return base64.urlsafe_b64decode(text)
@@ -0,0 +1,302 @@
+"""
+This is the database access component.
+It owns a small pool of long-lived SQLite connections per database file, so that
+queries reuse already opened (and already configured) connections instead of
+paying the connect/parse/teardown cost on every call.
+
+Databases are used in WAL mode, so readers never wait for a writer and the app
+can share its database with other processes (a second window, a script using
+the command line). Writers wait for each other through a busy timeout, and the
+pool tells commits made by other processes apart from its own (see
+ConnectionPool.external_changes()) so that open windows can refresh.
+"""
+
+import sqlite3, threading, time, queue
+from contextlib import contextmanager
+
+# Number of connections kept open per database file.
+POOL_SIZE = 4
+# Number of prepared statements sqlite3 keeps cached per connection.
+CACHED_STATEMENTS = 256
+# Seconds a connection waits for another one to release its lock before failing.
+BUSY_TIMEOUT_S = 10
+# Extra attempts at starting a write transaction when the busy timeout runs out.
+BEGIN_RETRIES = 3
+# Pragmas applied to every connection when it is opened.
+PRAGMAS = (
+    # readers see the last commit while a writer appends to the log
+    "PRAGMA journal_mode=WAL;",
+    # commits only fsync at checkpoints; a crash cannot corrupt the database,
+    # though a power loss may undo the last commits
+    "PRAGMA synchronous=NORMAL;",
+    # the log is truncated back to this size after a checkpoint, e.g. after a
+    # large delete made it grow
+    "PRAGMA journal_size_limit=8388608;",
+    # deleting a vault deletes its entries
+    "PRAGMA foreign_keys=ON;",
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA cache_size=-8000;",
+)
+
+
+class ConnectionPool:
+    """A bounded pool of long-lived SQLite connections for one database file.
+
+    Connections are handed out per thread: a thread that already holds a
+    connection gets the same one back on nested checkouts, so helpers can call
+    each other without deadlocking the pool or splitting a transaction.
+
+    Attributes:
+        db_file (str): Path to the SQLite database file.
+        size (int): Maximum number of connections the pool opens.
+    """
+
+    def __init__(self, db_file: str, size: int = POOL_SIZE) -> None:
+        """Initializes an empty pool; connections are opened lazily.
+
+        Args:
+            db_file (str): Path to the SQLite database file.
+            size (int, optional): Maximum number of open connections. Defaults to POOL_SIZE.
+        """
+        self.db_file = db_file
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._all = []
+        # a connection of its own for PRAGMA data_version, see external_changes()
+        self._watch = None
+        self._watch_lock = threading.Lock()
+        self._data_version = None
+        self._writes = 0  # write transactions of this pool in progress
+        self._external = False  # whether another process committed meanwhile
+
+    def _open(self) -> sqlite3.Connection:
+        """Opens and configures a new connection.
+
+        Returns:
+            sqlite3.Connection: The new connection.
+        """
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=BUSY_TIMEOUT_S,
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS,
+        )
+        if conn.execute("PRAGMA page_count;").fetchone()[0] == 0:
+            # a new database: auto_vacuum only takes effect if set before the
+            # file is first written (see utils.vacuum)
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Checks out a connection for the current thread.
+
+        Yields:
+            sqlite3.Connection: A connection owned by the calling thread until the
+            outermost checkout returns.
+        """
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            # nested checkout on the same thread: reuse the held connection
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._acquire()
+        self._local.conn, self._local.depth = conn, 1
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            self._idle.put(conn)
+
+    def _acquire(self) -> sqlite3.Connection:
+        """Takes an idle connection, opening a new one if the pool is not full.
+
+        Returns:
+            sqlite3.Connection: A connection not used by any other thread.
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                conn = self._open()
+                self._all.append(conn)
+                return conn
+        # pool exhausted: wait for another thread to give a connection back
+        return self._idle.get()
+
+    def _read_data_version(self) -> int:
+        """Returns the data version seen by the watch connection; call with _watch_lock held.
+
+        It changes whenever another connection, of this pool or another
+        process, commits.
+        """
+        if self._watch is None:
+            self._watch = self._open()
+        return self._watch.execute("PRAGMA data_version;").fetchone()[0]
+
+    @contextmanager
+    def write(self):
+        """Runs a write transaction on the connection held by the current thread.
+
+        The transaction starts with BEGIN IMMEDIATE, taking the write lock up
+        front: a transaction that reads before it writes cannot fail halfway
+        with "database is locked" when another connection wrote meanwhile.
+        While the lock is held no one else can commit, which lets the pool
+        record the data version before and after its own commit.
+
+        Yields:
+            sqlite3.Connection: The connection the transaction runs on.
+        """
+        with self.connection() as conn:
+            if conn.in_transaction:
+                # nested in another transaction of this thread: join it
+                yield conn
+                return
+
+            with self._watch_lock:
+                if self._watch is None:
+                    # open it now: opening may wait for the write lock taken below
+                    self._watch = self._open()
+            begin(conn)
+            with self._watch_lock:
+                self._writes += 1
+                version = self._read_data_version()
+                if self._data_version is not None and version != self._data_version:
+                    self._external = True  # committed by another process before us
+            try:
+                with conn:  # commits, or rolls back on error
+                    yield conn
+            finally:
+                with self._watch_lock:
+                    self._writes -= 1
+                    self._data_version = self._read_data_version()
+
+    def external_changes(self) -> bool:
+        """Tells whether another process committed since the previous call.
+
+        Cheap enough to poll: it reads one pragma, without touching the tables.
+
+        Returns:
+            bool: True if the database was changed other than by write() of
+            this pool (e.g. by another process or by a migration).
+        """
+        with self._watch_lock:
+            if self._writes:
+                return False  # own commits in flight; look again next time
+            version = self._read_data_version()
+            changed = self._external or (
+                self._data_version is not None and version != self._data_version
+            )
+            self._data_version, self._external = version, False
+            return changed
+
+    def close(self) -> None:
+        """Closes every connection opened by the pool."""
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+            self._opened = 0
+            self._idle = queue.LifoQueue()
+        with self._watch_lock:
+            if self._watch is not None:
+                self._watch.close()
+                self._watch = None
+            self._data_version = None
+
+
+def begin(conn: sqlite3.Connection) -> None:
+    """Starts a write transaction, retrying if another writer holds the lock too long.
+
+    Each attempt already waits up to BUSY_TIMEOUT_S in SQLite's busy handler;
+    then up to BEGIN_RETRIES more attempts are made after a growing pause.
+
+    Args:
+        conn (sqlite3.Connection): A connection outside of any transaction.
+
+    Raises:
+        sqlite3.OperationalError: If the lock could not be taken.
+    """
+    for attempt in range(BEGIN_RETRIES + 1):
+        try:
+            conn.execute("BEGIN IMMEDIATE;")
+            return
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) or attempt == BEGIN_RETRIES:
+                raise
+            time.sleep(0.1 * 2**attempt)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_file: str) -> ConnectionPool:
+    """Returns the shared connection pool for a database file, creating it on first use.
+
+    Args:
+        db_file (str): Path to the SQLite database file.
+
+    Returns:
+        ConnectionPool: The pool for `db_file`.
+    """
+    with _pools_lock:
+        pool = _pools.get(db_file)
+        if pool is None:
+            pool = _pools[db_file] = ConnectionPool(db_file)
+        return pool
+
+
+def connection(db_file: str):
+    """Shorthand for `get_pool(db_file).connection()`.
+
+    Args:
+        db_file (str): Path to the SQLite database file.
+
+    Returns:
+        A context manager yielding a pooled sqlite3.Connection.
+    """
+    return get_pool(db_file).connection()
+
+
+def transaction(db_file: str):
+    """Runs the enclosed statements in one write transaction on a pooled connection.
+
+    Commits when the block exits normally and rolls back if it raises; see
+    ConnectionPool.write().
+
+    Args:
+        db_file (str): Path to the SQLite database file.
+
+    Returns:
+        A context manager yielding the pooled sqlite3.Connection the
+        transaction runs on.
+    """
+    return get_pool(db_file).write()
+
+
+def external_changes(db_file: str) -> bool:
+    """Shorthand for `get_pool(db_file).external_changes()`."""
+    return get_pool(db_file).external_changes()
+
+
+def close_all() -> None:
+    """Closes every pool, e.g. before the application exits."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
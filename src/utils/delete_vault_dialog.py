@@ -1,6 +1,7 @@
-import sqlite3, hashlib
 import customtkinter as ctk
-from utils.misc import get_data
+from utils.kdf import check_password
+from utils.models import get_vault_store
+from utils.tasks import get_scheduler
 
 
 class DeleteVaultDialog(ctk.CTkToplevel):
@@ -29,8 +30,8 @@ class DeleteVaultDialog(ctk.CTkToplevel):
             parent (tk.Tk): The parent window of the dialog.
         """
 
-        # Connect to the database and retrieve available vaults
-        available_vaults = get_data(db_file, "SELECT * FROM vaults;")
+        # Retrieve available vaults
+        available_vaults = get_vault_store(db_file).vaults()
 
         # Helper function for creating a frame with a label and either an entry or option menu
         def create_frame(master, label_text, entry_show=None):
@@ -88,6 +89,9 @@ class DeleteVaultDialog(ctk.CTkToplevel):
         )
         self.cancel_button.grid(row=0, column=1, padx=10)
 
+        # Progress bar shown while the password is being checked
+        self.progress = ctk.CTkProgressBar(self, mode="indeterminate")
+
     def on_click_delete_vault(self, db_file: str, parent: ctk.CTk) -> None:
         """
         Handles the "Delete Vault" button click event.
@@ -98,8 +102,8 @@ class DeleteVaultDialog(ctk.CTkToplevel):
 
         Returns: None
         """
-        # Get the available vaults from the database.
-        available_vaults = get_data(db_file, "SELECT * FROM vaults;")
+        # Get the available vaults.
+        available_vaults = get_vault_store(db_file).vaults()
 
         # Get the name of the selected vault.
         name = self.select_vault_optionmenu.get()
@@ -107,28 +111,40 @@ class DeleteVaultDialog(ctk.CTkToplevel):
         # Find the selected vault in the list of available vaults.
         vault = [_ for _ in available_vaults if name == _[1]][0]
 
-        # Get the password entered by the user and hash it with the vault's salt.
+        # Get the password entered by the user and verify it with the vault's KDF
+        # on a background worker, showing progress meanwhile.
         pwd = self.enter_mp_entry.get()
-        hpwd = hashlib.sha256((pwd + vault[3]).encode()).hexdigest()
+        self.delete_button.configure(state="disabled")
+        self.progress.pack(fill="x", padx=20, pady=(0, 10))
+        self.progress.start()
+        get_scheduler().submit(
+            check_password,
+            pwd,
+            vault,
+            on_done=lambda ok: self.on_pwd_checked(db_file, vault, ok),
+            on_error=self.on_check_failed,
+            owner=self,
+        )
+
+    def on_pwd_checked(self, db_file: str, vault: tuple, ok: bool) -> None:
+        """
+        Deletes the vault if the entered password is correct, else shows an error.
+
+        Args:
+            db_file (str): The path to the database file.
+            vault (tuple): The selected (vid, vname, hmp, salt, kdf) vault.
+            ok (bool): Whether the entered password is correct.
+
+        Returns: None
+        """
+        self.progress.stop()
+        self.progress.pack_forget()
+        self.delete_button.configure(state="normal")
 
         # Check if the entered password matches the password for the selected vault.
-        if hpwd != vault[2]:
+        if not ok:
             # If the password is incorrect, display an error message.
-            if not self.pwd_error:
-                self.win_height += 50
-                self.pwd_error = True
-                self.pwd_err_frame = ctk.CTkFrame(
-                    self, fg_color="#141212", corner_radius=10
-                )
-                self.pwd_err_frame.pack(expand=True, fill="x", padx=10)
-                self.pwd_err_label = ctk.CTkLabel(
-                    self.pwd_err_frame,
-                    text="Incorrect Password!",
-                    text_color="#ff5050",
-                    wraplength=350,
-                    justify="left",
-                )
-                self.pwd_err_label.pack(expand=True, ipadx=10, ipady=10)
+            self.show_error("Incorrect Password!")
         else:
             # If the password is correct, remove the error message (if it exists).
             if self.pwd_error:
@@ -141,12 +157,55 @@ class DeleteVaultDialog(ctk.CTkToplevel):
 
         # If there are no password errors, delete the selected vault from the database.
         if not self.pwd_error:
-            with sqlite3.connect(db_file) as conn:
-                conn.cursor().execute(f"DELETE FROM vaults WHERE vid={vault[0]};")
-                conn.commit()
-
-            # Rebuild the parent UI to update the list of vaults.
-            parent.build_ui(db_file)
+            # The parent window removes the vault's tile when the store notifies it,
+            # once the vault and its entries are deleted in the background.
+            get_vault_store(db_file).delete_in_background(vault[0], get_scheduler())
 
             # Close the current window.
             self.destroy()
+
+    def on_check_failed(self, error: Exception) -> None:
+        """
+        Shows why the password could not be checked, e.g. a locked database,
+        and lets the user try again.
+
+        Args:
+            error (Exception): The error raised by the check.
+
+        Returns: None
+        """
+        self.progress.stop()
+        self.progress.pack_forget()
+        self.delete_button.configure(state="normal")
+        self.show_error(f"Could not check the password: {error}")
+        self.geometry(f"{self.win_width}x{self.win_height}")
+
+    def show_error(self, text: str) -> None:
+        """
+        Displays an error message below the buttons, replacing the one shown before.
+
+        Args:
+            text (str): The message.
+
+        Returns: None
+        """
+        if self.pwd_error:
+            self.pwd_err_label.configure(text=text)
+            return
+        self.win_height += 50
+        self.pwd_error = True
+        self.pwd_err_frame = ctk.CTkFrame(self, fg_color="#141212", corner_radius=10)
+        self.pwd_err_frame.pack(expand=True, fill="x", padx=10)
+        self.pwd_err_label = ctk.CTkLabel(
+            self.pwd_err_frame,
+            text=text,
+            text_color="#ff5050",
+            wraplength=350,
+            justify="left",
+        )
+        self.pwd_err_label.pack(expand=True, ipadx=10, ipady=10)
+
+    def destroy(self) -> None:
+        """Cancels a pending password check before closing the dialog."""
+        get_scheduler().cancel_owned(self)
+        super().destroy()
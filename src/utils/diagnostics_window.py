@@ -0,0 +1,90 @@
+from tkinter import filedialog
+import customtkinter as ctk
+from utils import metrics, startup
+
+
+class DiagnosticsWindow(ctk.CTkToplevel):
+    """Shows the startup phases and the recorded timings of the app's hot paths."""
+
+    win_height = 500
+    win_width = 760
+    refresh_ms = 1000  # how often the figures are re-read while the window is open
+
+    def __init__(self, *args, **kwargs):
+        """Initializes the Diagnostics window."""
+
+        super().__init__(*args, **kwargs)  # call base constructor
+
+        # Set default window props
+        self.title("Diagnostics")
+        self.geometry(f"{self.win_width}x{self.win_height}")
+        self.rowconfigure(1, weight=1)
+        self.columnconfigure(0, weight=1)
+
+        # setup interface
+        self.build_ui()
+        self.poll_after = None
+        self.poll()
+
+    def build_ui(self) -> None:
+        """Creates the recording switch, the action buttons and the figures box."""
+        self.buttons_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.buttons_frame.grid(row=0, column=0, sticky="ew", padx=10, pady=10)
+
+        # recording switch, off unless CRYPTICAL_METRICS=1 was set
+        self.record_switch = ctk.CTkSwitch(
+            self.buttons_frame,
+            text="Record timings",
+            command=lambda: metrics.enable(bool(self.record_switch.get())),
+        )
+        if metrics.enabled():
+            self.record_switch.select()
+        self.record_switch.pack(side="left")
+
+        self.save_button = ctk.CTkButton(self.buttons_frame, text="Save JSON", command=self.save)
+        self.save_button.pack(side="right")
+        self.reset_button = ctk.CTkButton(
+            self.buttons_frame, text="Reset", command=lambda: (metrics.reset(), self.render())
+        )
+        self.reset_button.pack(side="right", padx=10)
+
+        # the figures, as a fixed-width table
+        self.textbox = ctk.CTkTextbox(self, font=("Courier", 13), wrap="none")
+        self.textbox.grid(row=1, column=0, sticky="nsew", padx=10, pady=(0, 10))
+
+    def poll(self) -> None:
+        """Shows the figures, then again every refresh_ms while the window is open."""
+        self.render()
+        self.poll_after = self.after(self.refresh_ms, self.poll)
+
+    def render(self) -> None:
+        """Shows the current figures."""
+        lines = ["Startup (ms since launch)"]
+        lines += [f"  {phase:<44}{ms:>10.1f}" for phase, ms in startup.timings().items()]
+        lines += ["", f"  {'Timer':<42}{'calls':>8}{'total ms':>12}{'mean ms':>10}{'max ms':>10}"]
+        for name, stat in metrics.snapshot().items():
+            lines.append(
+                f"  {name:<42}{stat['calls']:>8}{stat['total_ms']:>12.1f}"
+                f"{stat['mean_ms']:>10.3f}{stat['max_ms']:>10.1f}"
+            )
+        if not metrics.enabled():
+            lines += ["", "  Recording is off; switch it on to collect timings."]
+
+        self.textbox.configure(state="normal")
+        self.textbox.delete("1.0", "end")
+        self.textbox.insert("1.0", "\n".join(lines))
+        self.textbox.configure(state="disabled")
+
+    def save(self) -> None:
+        """Writes the startup phases and the timings to a JSON file of the user's choice."""
+        path = filedialog.asksaveasfilename(
+            parent=self, defaultextension=".json", initialfile="cryptical-diagnostics.json"
+        )
+        if path:
+            metrics.dump(path)
+
+    def destroy(self) -> None:
+        """Stops refreshing the figures and destroys the window."""
+        if self.poll_after is not None:
+            self.after_cancel(self.poll_after)
+        super().destroy()
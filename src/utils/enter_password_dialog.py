@@ -1,5 +1,6 @@
-import hashlib
 import customtkinter as ctk
+from cryptical import core
+from utils.tasks import get_scheduler
 from utils.vault_window import VaultWindow
 
 
@@ -51,37 +52,80 @@ class EnterPasswordDialog(ctk.CTkToplevel):
         )
         self.cancel_button.grid(row=0, column=1, padx=10)
 
+        # Progress bar shown while the password is being checked
+        self.progress = ctk.CTkProgressBar(self, mode="indeterminate")
+
     def check_pwd(self, db_file: str, vault: tuple) -> None:
         """
         Check if the entered password matches the hash stored in the database.
-        If the password is incorrect, display an error message. Otherwise,
-        create a new VaultWindow instance and open the vault.
+        The password is hashed on a background worker while a progress bar is
+        shown; the result is handled by on_pwd_checked().
         """
         emp = self.enter_pwd_entry.get()
-        hmp = hashlib.sha256((emp + vault[3]).encode()).hexdigest()
-
-        if hmp != vault[2]:
-            # Display error message if the password is incorrect
-            if not self.pwd_error:
-                self.win_height += 50
-                self.pwd_error = True
-                self.pwd_err_frame = ctk.CTkFrame(
-                    self, fg_color="#141212", corner_radius=10
-                )
-                self.pwd_err_frame.pack(expand=True, fill="x", padx=10)
-                self.pwd_err_label = ctk.CTkLabel(
-                    self.pwd_err_frame,
-                    text="Incorrect Password!",
-                    text_color="#ff5050",
-                    wraplength=350,
-                    justify="left",
-                )
-                self.pwd_err_label.pack(expand=True, ipadx=10, ipady=10)
+
+        # Show progress and block repeated clicks while the password is checked
+        self.open_vault_button.configure(state="disabled")
+        self.progress.pack(fill="x", padx=20, pady=(0, 10))
+        self.progress.start()
+
+        get_scheduler().submit(
+            core.unlock,
+            db_file,
+            vault,
+            emp,
+            on_done=lambda session: self.on_pwd_checked(db_file, session),
+            on_error=self.on_unlock_failed,
+            owner=self,
+        )
+
+    def on_pwd_checked(self, db_file: str, session) -> None:
+        """
+        Create a new VaultWindow instance and open the unlocked vault.
+        """
+        self.progress.stop()
+        self.progress.pack_forget()
+        self.open_vault_button.configure(state="normal")
+
+        # Open the vault, as the password is correct
+        self.pwd_error = False
+        self.destroy()
+        if self.vault_window is None or not self.vault_window.winfo_exists():
+            # The vault was unlocked once; the window reuses the session cipher
+            self.vault_window = VaultWindow(db_file, session)
         else:
-            # Open the vault if the password is correct
-            self.pwd_error = False
-            self.destroy()
-            if self.vault_window is None or not self.vault_window.winfo_exists():
-                self.vault_window = VaultWindow(db_file, vault, emp)
-            else:
-                self.vault_window.focus()
+            self.vault_window.focus()
+
+    def on_unlock_failed(self, error: Exception) -> None:
+        """
+        Display why the vault could not be unlocked: an incorrect password, or
+        any other error as it is.
+        """
+        self.progress.stop()
+        self.progress.pack_forget()
+        self.open_vault_button.configure(state="normal")
+
+        if isinstance(error, core.PasswordError):
+            text = "Incorrect Password!"
+        else:
+            text = f"Could not open the vault: {error}"
+        if self.pwd_error:
+            self.pwd_err_label.configure(text=text)
+            return
+        self.win_height += 50
+        self.pwd_error = True
+        self.geometry(f"{self.win_width}x{self.win_height}")
+        self.pwd_err_frame = ctk.CTkFrame(self, fg_color="#141212", corner_radius=10)
+        self.pwd_err_frame.pack(expand=True, fill="x", padx=10)
+        self.pwd_err_label = ctk.CTkLabel(
+            self.pwd_err_frame,
+            text=text,
+            text_color="#ff5050",
+            wraplength=350,
+            justify="left",
+        )
+        self.pwd_err_label.pack(expand=True, ipadx=10, ipady=10)
+
+    def destroy(self) -> None:
+        """Cancels a pending password check before closing the dialog."""
+        get_scheduler().cancel_owned(self)
+        super().destroy()
@@ -0,0 +1,157 @@
+"""
+This is the entry query component.
+An EntryQuery describes which entries of a vault to list and in what order;
+the filtering and sorting happen in SQL and rows are read with keyset
+pagination, a page at a time, so listing a vault holds one page in memory
+whatever the size of the vault.
+"""
+
+from utils.misc import get_data
+
+# Sort orders: the columns making up the keyset of each, from the most significant.
+# Site names are encrypted, so they cannot be sorted by the database.
+ORDERS = {"pid": ("pid",), "created": ("created", "pid")}
+# Columns of the rows returned.
+COLUMNS = "pid, vid, site, esp, created"
+
+
+class EntryQuery:
+    """The filtered and sorted entries of a vault, read page by page.
+
+    Rows are (pid, vid, site, esp, created) tuples; sites are still encrypted
+    (see VaultSession.open_entries()). Iterating over a query streams all of
+    its rows.
+
+    Attributes:
+        db_file (str): Path to the SQLite database file.
+        vid (int): Vault id whose entries to read.
+        order (str): A key of ORDERS.
+        descending (bool): Whether rows come in descending order.
+        page_size (int): Rows read per query when iterating.
+    """
+
+    def __init__(
+        self,
+        db_file: str,
+        vid: int,
+        order: str = "pid",
+        descending: bool = False,
+        sidx: bytes = None,
+        token: int = None,
+        created_after: int = None,
+        created_before: int = None,
+        page_size: int = 100,
+    ) -> None:
+        """Initializes the query; nothing is read until rows are asked for.
+
+        Args:
+            db_file (str): Path to the SQLite database file.
+            vid (int): Vault id whose entries to read.
+            order (str, optional): "pid" (the order entries were added in) or
+                "created" (their creation time). Defaults to "pid".
+            descending (bool, optional): Newest entries first. Defaults to False.
+            sidx (bytes, optional): Only the entry with this site blind index.
+            token (int, optional): Only entries with a word starting with this
+                prefix, see SiteIndex.token().
+            created_after (int, optional): Only entries created at or after this
+                unix time.
+            created_before (int, optional): Only entries created before this unix time.
+            page_size (int, optional): Rows read per query when iterating. Defaults to 100.
+
+        Raises:
+            ValueError: If `order` is unknown.
+        """
+        if order not in ORDERS:
+            raise ValueError(f"Unknown order: {order}")
+        self.db_file = db_file
+        self.vid = vid
+        self.order = order
+        self.descending = descending
+        self.page_size = page_size
+
+        conditions, params = ["vid=?"], [vid]
+        if sidx is not None:
+            conditions.append("sidx=?")
+            params.append(sidx)
+        if token is not None:
+            conditions.append("pid IN (SELECT pid FROM site_tokens WHERE vid=? AND token=?)")
+            params += [vid, token]
+        if created_after is not None:
+            conditions.append("created>=?")
+            params.append(created_after)
+        if created_before is not None:
+            conditions.append("created<?")
+            params.append(created_before)
+        self._where = " AND ".join(conditions)
+        self._params = tuple(params)
+
+        direction = " DESC" if descending else ""
+        self._order_by = ", ".join(column + direction for column in ORDERS[order])
+        self._operator = "<" if descending else ">"
+
+    def key(self, row: tuple) -> tuple:
+        """Returns the keyset of a row read by this query."""
+        return (row[4], row[0]) if self.order == "created" else (row[0],)
+
+    def page(self, after: tuple = None, offset: int = 0, limit: int = None) -> list:
+        """Reads one page of rows.
+
+        Args:
+            after (tuple, optional): key() of the last row of the previous page;
+                rows continue after it. Defaults to None.
+            offset (int, optional): Rows to skip when `after` is None. Defaults to 0.
+            limit (int, optional): Maximum number of rows. Defaults to page_size.
+
+        Returns:
+            list: (pid, vid, site, esp, created) tuples, or None if the read failed.
+        """
+        limit = self.page_size if limit is None else limit
+        select = f"SELECT {COLUMNS} FROM entries WHERE {self._where}"
+        op = self._operator
+        if after is None:
+            return get_data(
+                self.db_file,
+                f"{select} ORDER BY {self._order_by} LIMIT ? OFFSET ?;",
+                (*self._params, limit, offset),
+            )
+        if self.order == "pid":
+            return get_data(
+                self.db_file,
+                f"{select} AND pid{op}? ORDER BY {self._order_by} LIMIT ?;",
+                (*self._params, *after, limit),
+            )
+        # SQLite seeks an index on (created, pid) > (?, ?) by created alone, which
+        # rescans every earlier row with the same creation time; read the rest of
+        # that creation time and the later ones as two seeks instead
+        return get_data(
+            self.db_file,
+            f"""SELECT * FROM ({select} AND created=? AND pid{op}? ORDER BY {self._order_by} LIMIT ?)
+                UNION ALL
+                SELECT * FROM ({select} AND created{op}? ORDER BY {self._order_by} LIMIT ?)
+                LIMIT ?;""",
+            (*self._params, *after, limit, *self._params, after[0], limit, limit),
+        )
+
+    def count(self) -> int:
+        """Counts the rows of the query."""
+        data = get_data(
+            self.db_file, f"SELECT COUNT(*) FROM entries WHERE {self._where};", self._params
+        )
+        return data[0][0] if data else 0
+
+    def pages(self):
+        """Yields every row of the query a page of page_size rows at a time."""
+        after = None
+        while True:
+            page = self.page(after)
+            if not page:
+                return
+            yield page
+            if len(page) < self.page_size:
+                return
+            after = self.key(page[-1])
+
+    def __iter__(self):
+        """Yields every row of the query, reading page_size rows at a time."""
+        for page in self.pages():
+            yield from page
@@ -0,0 +1,95 @@
+"""
+This is the envelope component.
+Every vault has a random data key (DEK) that its entries are encrypted with.
+The DEK is stored wrapped, i.e. encrypted with a key-encryption key (KEK)
+derived from the master password by the vault's KDF, so changing the password
+or upgrading the KDF only re-wraps the DEK instead of re-encrypting every entry.
+
+The KDF runs once per password: the KEK and the stored password verifier are
+both derived from its output with HMAC under different labels.
+"""
+
+import base64, hmac
+from cryptography.fernet import Fernet, InvalidToken
+from utils.kdf import from_spec, new_password_hash, verifier
+from utils.metrics import timed
+
+# Label of the KEK derived from a vault's KDF output; see kdf.VERIFIER_LABEL.
+KEK_LABEL = b"cryptical/kek"
+
+
+def new_dek() -> bytes:
+    """Returns a new random data key."""
+    return Fernet.generate_key()
+
+
+@timed("kdf.derive_kek")
+def derive_kek(pwd: str, salt: str, spec: str) -> bytes:
+    """Derives the key-encryption key of a vault from its master password.
+
+    This is slow by design; call it off the UI thread.
+
+    Args:
+        pwd (str): The master password.
+        salt (str): The vault's salt.
+        spec (str): The vault's KDF spec.
+
+    Returns:
+        bytes: A Fernet key.
+    """
+    return kek_from(from_spec(spec).derive(pwd, salt))
+
+
+def kek_from(output: str) -> bytes:
+    """Returns the key-encryption key derived from a vault's hex KDF output, as a Fernet key."""
+    return base64.urlsafe_b64encode(hmac.digest(bytes.fromhex(output), KEK_LABEL, "sha256"))
+
+
+@timed("kdf.new_vault_keys")
+def new_vault_keys(pwd: str, dek: bytes = None) -> tuple:
+    """Derives a master password's verifier and KEK, and wraps a data key with the KEK.
+
+    This is slow by design; call it off the UI thread.
+
+    Args:
+        pwd (str): The master password.
+        dek (bytes, optional): The data key to wrap; a new one when None.
+
+    Returns:
+        tuple: (hmp, salt, kdf, wdek) to store with the vault.
+    """
+    output, salt, spec = new_password_hash(pwd)
+    wdek = Fernet(kek_from(output)).encrypt(dek or new_dek()).decode()
+    return verifier(output), salt, spec, wdek
+
+
+@timed("kdf.unwrap_dek")
+def unwrap_dek(pwd: str, vault: tuple) -> bytes:
+    """Unwraps the data key of a vault, which also verifies the master password.
+
+    This is slow by design; call it off the UI thread.
+
+    Args:
+        pwd (str): The entered master password.
+        vault (tuple): The (vid, vname, hmp, salt, kdf, wdek) vault.
+
+    Returns:
+        bytes: The data key, or None if the password is incorrect.
+    """
+    return open_dek(derive_kek(pwd, vault[3], vault[4]), vault[5])
+
+
+def open_dek(kek: bytes, wdek: str) -> bytes:
+    """Unwraps a data key with an already derived key-encryption key.
+
+    Args:
+        kek (bytes): The key-encryption key (see derive_kek()).
+        wdek (str): The wrapped data key.
+
+    Returns:
+        bytes: The data key, or None if the KEK does not match.
+    """
+    try:
+        return Fernet(kek).decrypt(wdek.encode())
+    except InvalidToken:
+        return None
@@ -0,0 +1,277 @@
+"""
+This is the key derivation component.
+It hashes vault master passwords with a memory-hard KDF whose cost parameters
+are calibrated to a latency target on the current machine, once per database
+(see use_calibration()). The parameters are stored with each vault as a spec
+string (e.g. "scrypt:n=32768,r=8,p=1"), so vaults created with older or weaker
+parameters keep verifying and can be upgraded when they are next unlocked.
+"""
+
+import os, time, hashlib, hmac, secrets, threading
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+from utils.metrics import timed
+
+# Latency the calibrated KDF should take to verify a password, in milliseconds.
+TARGET_MS = int(os.environ.get("CRYPTICAL_KDF_TARGET_MS", 250))
+# KDF used for new and upgraded vaults.
+DEFAULT_KDF = "scrypt"
+# Spec of vaults created before KDFs were configurable.
+LEGACY_SPEC = "sha256"
+# Most memory calibrate() lets a derivation use, in bytes (scrypt n=2**17, r=8).
+MAX_MEMORY = 128 * 2**20
+# Label of the password verifier derived from a vault's KDF output. The vault's
+# key-encryption key comes from the same output with another label (see
+# envelope.kek_from()), so one KDF run gives both and neither reveals the other.
+VERIFIER_LABEL = b"cryptical/verifier"
+
+
+class Sha256Kdf:
+    """The legacy single round of salted SHA-256, kept to verify old vaults."""
+
+    name = "sha256"
+
+    def __init__(self) -> None:
+        self.params = {}
+
+    def derive(self, pwd: str, salt: str) -> str:
+        """Returns the hex digest of the salted password."""
+        return hashlib.sha256((pwd + salt).encode()).hexdigest()
+
+    def scaled(self, factor: int):
+        """SHA-256 has no cost parameter to scale."""
+        return self
+
+    def memory(self) -> int:
+        """SHA-256 needs no working memory to speak of."""
+        return 0
+
+
+class Pbkdf2Kdf:
+    """PBKDF2-HMAC-SHA256.
+
+    Attributes:
+        params (dict): {"i": number of iterations}.
+    """
+
+    name = "pbkdf2"
+
+    def __init__(self, i: int = 100_000) -> None:
+        self.params = {"i": int(i)}
+
+    def derive(self, pwd: str, salt: str) -> str:
+        """Returns the hex encoded 32 byte key derived from the salted password."""
+        kdf = PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=salt.encode(),
+            iterations=self.params["i"],
+        )
+        return kdf.derive(pwd.encode()).hex()
+
+    def scaled(self, factor: int):
+        """Returns the same KDF with its cost multiplied by `factor`."""
+        return Pbkdf2Kdf(self.params["i"] * factor)
+
+    def memory(self) -> int:
+        """PBKDF2 needs no working memory to speak of."""
+        return 0
+
+
+class ScryptKdf:
+    """scrypt, the memory-hard default.
+
+    Attributes:
+        params (dict): {"n": CPU/memory cost, "r": block size, "p": parallelism}.
+    """
+
+    name = "scrypt"
+
+    def __init__(self, n: int = 2**14, r: int = 8, p: int = 1) -> None:
+        self.params = {"n": int(n), "r": int(r), "p": int(p)}
+
+    def derive(self, pwd: str, salt: str) -> str:
+        """Returns the hex encoded 32 byte key derived from the salted password."""
+        kdf = Scrypt(salt=salt.encode(), length=32, **self.params)
+        return kdf.derive(pwd.encode()).hex()
+
+    def scaled(self, factor: int):
+        """Returns the same KDF with its cost multiplied by `factor` (a power of two)."""
+        return ScryptKdf(self.params["n"] * factor, self.params["r"], self.params["p"])
+
+    def memory(self) -> int:
+        """Returns the bytes of memory one derivation uses."""
+        return 128 * self.params["n"] * self.params["r"] * self.params["p"]
+
+
+# Available KDFs by name.
+KDFS = {kdf.name: kdf for kdf in (Sha256Kdf, Pbkdf2Kdf, ScryptKdf)}
+
+# Cheapest parameters calibration starts from, per KDF.
+CALIBRATION_START = {"pbkdf2": Pbkdf2Kdf(10_000), "scrypt": ScryptKdf(2**12)}
+
+
+def to_spec(kdf) -> str:
+    """Encodes a KDF and its parameters as a spec string.
+
+    Args:
+        kdf: The KDF.
+
+    Returns:
+        str: e.g. "scrypt:n=32768,r=8,p=1", or "sha256" for the legacy hash.
+    """
+    if not kdf.params:
+        return kdf.name
+    return kdf.name + ":" + ",".join(f"{k}={v}" for k, v in kdf.params.items())
+
+
+def from_spec(spec: str):
+    """Decodes a spec string created by to_spec().
+
+    Args:
+        spec (str): The spec string. None or "" means the legacy hash.
+
+    Returns:
+        The KDF described by the spec.
+
+    Raises:
+        ValueError: If the spec names an unknown KDF.
+    """
+    name, _, params = (spec or LEGACY_SPEC).partition(":")
+    if name not in KDFS:
+        raise ValueError(f"Unknown KDF: {name}")
+    kwargs = dict(param.split("=") for param in params.split(",") if param)
+    return KDFS[name](**kwargs)
+
+
+def time_kdf(kdf, rounds: int = 1) -> float:
+    """Measures how long one derivation takes.
+
+    Args:
+        kdf: The KDF to measure.
+        rounds (int, optional): Number of derivations to average over. Defaults to 1.
+
+    Returns:
+        float: The average time per derivation in milliseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(rounds):
+        kdf.derive("calibration", "calibration-salt")
+    return (time.perf_counter() - start) * 1000 / rounds
+
+
+@timed("kdf.calibrate")
+def calibrate(
+    name: str = DEFAULT_KDF, target_ms: int = TARGET_MS, max_memory: int = MAX_MEMORY
+):
+    """Picks the cost parameters of a KDF that best meet a latency target.
+
+    The cost is doubled from a cheap starting point until a derivation takes at
+    least `target_ms` on this machine, or until doubling it again would use
+    more than `max_memory`.
+
+    Args:
+        name (str, optional): The KDF to calibrate. Defaults to DEFAULT_KDF.
+        target_ms (int, optional): The latency target. Defaults to TARGET_MS.
+        max_memory (int, optional): The memory cap in bytes. Defaults to MAX_MEMORY.
+
+    Returns:
+        The calibrated KDF.
+    """
+    kdf = CALIBRATION_START[name]
+    while time_kdf(kdf) < target_ms:
+        scaled = kdf.scaled(2)
+        if scaled.memory() > max_memory:
+            break
+        kdf = scaled
+    return kdf
+
+
+_calibrated = None
+_save_calibration = None  # called with the spec of a new calibration
+_calibrate_lock = threading.Lock()
+
+
+def use_calibration(spec: str = None, save=None) -> None:
+    """Sets the default KDF from a stored calibration, or how to store a new one.
+
+    setup_db() calls this with the calibration stored in the database, so that
+    processes using it do not calibrate again.
+
+    Args:
+        spec (str, optional): A spec stored by an earlier calibration at
+            TARGET_MS, or None to calibrate when the default KDF is first needed.
+        save (callable, optional): Called with the spec of that calibration.
+    """
+    global _calibrated, _save_calibration
+    with _calibrate_lock:
+        try:
+            _calibrated = from_spec(spec) if spec else None
+        except ValueError:
+            _calibrated = None
+        _save_calibration = save
+
+
+def default_kdf():
+    """Returns the KDF for new vaults, calibrating it once unless a calibration is stored."""
+    global _calibrated
+    with _calibrate_lock:
+        if _calibrated is None:
+            _calibrated = calibrate()
+            if _save_calibration:
+                _save_calibration(to_spec(_calibrated))
+        return _calibrated
+
+
+@timed("kdf.new_password_hash")
+def new_password_hash(pwd: str) -> tuple:
+    """Runs the calibrated KDF on a new master password with a fresh salt.
+
+    This is slow by design; call it off the UI thread.
+
+    Args:
+        pwd (str): The master password.
+
+    Returns:
+        tuple: (output, salt, spec): the hex KDF output, which is never stored
+        itself (see verifier()), and the salt and spec to store with the vault.
+    """
+    kdf = default_kdf()
+    salt = secrets.token_hex(16)
+    return kdf.derive(pwd, salt), salt, to_spec(kdf)
+
+
+def verifier(output: str) -> str:
+    """Returns the password verifier stored as a vault's hmp, derived from its KDF output."""
+    return hmac.digest(bytes.fromhex(output), VERIFIER_LABEL, "sha256").hex()
+
+
+def needs_upgrade(spec: str) -> bool:
+    """Returns whether a vault's KDF is weaker than the calibrated default."""
+    kdf, default = from_spec(spec), default_kdf()
+    if kdf.name != default.name:
+        return True
+    return any(kdf.params[k] < v for k, v in default.params.items())
+
+
+@timed("kdf.check_password")
+def check_password(pwd: str, vault: tuple) -> bool:
+    """Verifies a master password against a vault's hash.
+
+    This is slow by design; call it off the UI thread. Outdated hashes are not
+    upgraded here, as the data key is wrapped with a key derived from the same
+    salt: core.unlock() re-hashes the password and re-wraps the data key
+    together.
+
+    Args:
+        pwd (str): The entered master password.
+        vault (tuple): The (vid, vname, hmp, salt, kdf, wdek) vault.
+
+    Returns:
+        bool: Whether the password is correct.
+    """
+    output = from_spec(vault[4]).derive(pwd, vault[3])
+    # vaults without a data key (wdek) still store the KDF output itself
+    hmp = output if vault[5] is None else verifier(output)
+    return hmac.compare_digest(hmp, vault[2])
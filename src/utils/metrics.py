@@ -0,0 +1,169 @@
+"""
+This is the metrics component.
+It keeps call counts and timings of the app's hot paths (database queries and
+writes, encryption, password hashing and UI building), named like
+"db.get_data" or "ui.vault_window.build_ui". Recording is off unless
+CRYPTICAL_METRICS=1 is set or enable() is called, and a disabled timer costs
+one flag check per call, so only calls doing real work (a query, a batch of
+ciphertexts, a KDF run) are timed, not per-entry helpers. Only the outermost
+timed call on a thread is recorded: timed functions called from another one
+(e.g. the queries of a search) count towards the caller alone, so every call
+is counted once and the totals add up. snapshot() returns the figures for the
+diagnostics window and dump() writes them as JSON.
+
+It also has a Profiler, started by CRYPTICAL_PROFILE=<path prefix> in the app
+or --profile in the command line, which writes cProfile stats of the main
+thread and sampled stacks of every thread in the collapsed format read by
+flamegraph tools.
+"""
+
+import cProfile, json, os, sys, threading, time
+from functools import wraps
+from utils import startup
+
+# Whether timings are recorded.
+_enabled = os.environ.get("CRYPTICAL_METRICS") == "1"
+# Path prefix of the profile to write, or None.
+PROFILE = os.environ.get("CRYPTICAL_PROFILE") or None
+
+_lock = threading.Lock()
+_stats = {}  # name -> [calls, total seconds, max seconds]
+_local = threading.local()  # .timing: whether a timed call is running on the thread
+
+
+def enabled() -> bool:
+    """Tells whether timings are being recorded."""
+    return _enabled
+
+
+def enable(on: bool = True) -> None:
+    """Starts (or stops) recording timings."""
+    global _enabled
+    _enabled = on
+
+
+def record(name: str, seconds: float) -> None:
+    """Adds one call taking `seconds` to the timings of `name`."""
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            _stats[name] = [1, seconds, seconds]
+        else:
+            stat[0] += 1
+            stat[1] += seconds
+            if seconds > stat[2]:
+                stat[2] = seconds
+
+
+def timed(name: str):
+    """Decorates a function so that its calls are recorded under `name`.
+
+    Calls made while another timed call runs on the same thread are not recorded.
+    """
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled or getattr(_local, "timing", False):
+                return fn(*args, **kwargs)
+            _local.timing = True
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _local.timing = False
+                record(name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def snapshot() -> dict:
+    """Returns the timings recorded so far.
+
+    Returns:
+        dict: {"calls", "total_ms", "mean_ms", "max_ms"} by name, slowest in
+        total first.
+    """
+    with _lock:
+        stats = sorted(_stats.items(), key=lambda item: item[1][1], reverse=True)
+    return {
+        name: {
+            "calls": calls,
+            "total_ms": round(total * 1000, 3),
+            "mean_ms": round(total * 1000 / calls, 3),
+            "max_ms": round(peak * 1000, 3),
+        }
+        for name, (calls, total, peak) in stats
+    }
+
+
+def reset() -> None:
+    """Forgets the timings recorded so far."""
+    with _lock:
+        _stats.clear()
+
+
+def dump(path: str) -> None:
+    """Writes the startup phases and the timings to a JSON file."""
+    with open(path, "w") as f:
+        json.dump({"startup_ms": startup.timings(), "metrics": snapshot()}, f, indent=2)
+
+
+class Profiler:
+    """Profiles the app between start() and stop().
+
+    Attributes:
+        interval (float): Seconds between two stack samples.
+    """
+
+    interval = 0.005
+
+    def __init__(self) -> None:
+        """Initializes the profiler; nothing is profiled until start()."""
+        self._profile = cProfile.Profile()
+        self._samples = {}  # collapsed stack -> number of samples
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """Starts profiling the calling thread and sampling every thread."""
+        self._profile.enable()
+        self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._thread.start()
+
+    def _sample(self) -> None:
+        """Counts the stacks of every other thread until stopped."""
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    if code.co_filename != __file__:  # leave out the timers' wrappers
+                        stack.append(
+                            f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                        )
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                key = ";".join(reversed(stack))
+                self._samples[key] = self._samples.get(key, 0) + 1
+
+    def stop(self, prefix: str) -> None:
+        """Stops profiling and writes <prefix>.prof and <prefix>.folded.
+
+        <prefix>.prof holds the cProfile stats of the thread that called start(),
+        for pstats or snakeviz; <prefix>.folded holds one "frame;frame;... count"
+        line per sampled stack, for flamegraph.pl or speedscope.
+        """
+        self._profile.disable()
+        self._stop.set()
+        self._thread.join()
+        self._profile.dump_stats(prefix + ".prof")
+        with open(prefix + ".folded", "w") as f:
+            for stack, count in sorted(self._samples.items()):
+                f.write(f"{stack} {count}\n")
@@ -0,0 +1,294 @@
+"""
+This is the migrations component.
+It upgrades the schema of existing databases in place. Every migration has a
+version number; the version a database is at is kept in `PRAGMA user_version`,
+and setup_db() runs all migrations above it, each in its own transaction.
+"""
+
+import base64
+from utils.db import begin
+
+
+def create_tables(conn) -> None:
+    """Creates the original "vaults" and "entries" tables."""
+    # vid: vault id; vname: vault name
+    # hmp: hashed master password of the vault; salt: salt used in hashing
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS vaults
+                    (vid INTEGER PRIMARY KEY AUTOINCREMENT,
+                     vname TEXT UNIQUE NOT NULL,
+                     hmp TEXT NOT NULL,
+                     salt TEXT NOT NULL);"""
+    )
+    # pid: password id; vid: vault id
+    # site: site name; esp: encrypted site password
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS entries
+                    (pid INTEGER PRIMARY KEY AUTOINCREMENT,
+                     vid INTEGER NOT NULL,
+                     site TEXT NOT NULL,
+                     esp TEXT NOT NULL,
+                     FOREIGN KEY(vid) REFERENCES vaults(vid));"""
+    )
+
+
+def add_vault_kdf(conn) -> None:
+    """Adds the KDF spec column to "vaults"; existing vaults used salted sha256."""
+    columns = [col[1] for col in conn.execute("PRAGMA table_info(vaults);")]
+    if "kdf" not in columns:
+        conn.execute("ALTER TABLE vaults ADD COLUMN kdf TEXT NOT NULL DEFAULT 'sha256';")
+
+
+def index_entries(conn) -> None:
+    """Indexes entries by vault and makes site names unique within a vault.
+
+    Sites that already occur more than once in a vault are renamed to
+    `site~pid` (keeping the oldest entry's name) so the unique index can be built
+    without losing any entry.
+    """
+    conn.execute(
+        """UPDATE entries SET site = site || '~' || pid
+           WHERE pid NOT IN (SELECT MIN(pid) FROM entries GROUP BY vid, site);"""
+    )
+    create_entry_indexes(conn)
+
+
+def create_entry_indexes(conn) -> None:
+    """Creates the indexes of "entries"."""
+    # vault loads: WHERE vid=? ORDER BY pid (pid is the rowid, so it is implied)
+    conn.execute("CREATE INDEX IF NOT EXISTS entries_vid ON entries(vid);")
+    # duplicate checks: WHERE vid=? AND site=?
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS entries_vid_site ON entries(vid, site);"
+    )
+
+
+def add_vault_wdek(conn) -> None:
+    """Adds the wrapped data key column to "vaults".
+
+    Existing vaults keep NULL until they are next unlocked, when their entries
+    are re-encrypted under a new data key (see core.unlock()).
+    """
+    columns = [col[1] for col in conn.execute("PRAGMA table_info(vaults);")]
+    if "wdek" not in columns:
+        conn.execute("ALTER TABLE vaults ADD COLUMN wdek TEXT;")
+
+
+def store_esp_as_blob(conn) -> None:
+    """Rebuilds "entries" with esp as a BLOB and decodes the base64 text tokens into it.
+
+    Raw ciphertexts are a quarter smaller than their base64 text and need no
+    decoding when read. The table is copied rather than updated in place so the
+    column is declared BLOB; pids and the AUTOINCREMENT counter are kept.
+    """
+    conn.create_function(
+        "b64decode",
+        1,
+        lambda esp: base64.urlsafe_b64decode(esp) if isinstance(esp, str) else esp,
+        deterministic=True,
+    )
+    seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='entries';").fetchone()
+    conn.execute(
+        """CREATE TABLE entries_blob
+                    (pid INTEGER PRIMARY KEY AUTOINCREMENT,
+                     vid INTEGER NOT NULL,
+                     site TEXT NOT NULL,
+                     esp BLOB NOT NULL,
+                     FOREIGN KEY(vid) REFERENCES vaults(vid));"""
+    )
+    conn.execute(
+        """INSERT INTO entries_blob(pid, vid, site, esp)
+           SELECT pid, vid, site, b64decode(esp) FROM entries;"""
+    )
+    conn.execute("DROP TABLE entries;")
+    conn.execute("ALTER TABLE entries_blob RENAME TO entries;")
+    if seq:
+        conn.execute("UPDATE sqlite_sequence SET seq=? WHERE name='entries';", seq)
+    create_entry_indexes(conn)
+
+
+def add_site_blind_index(conn) -> None:
+    """Prepares "entries" for encrypted site names (see utils.blind_index).
+
+    Adds the sidx blind index column, unique within a vault in place of the
+    site name, and the "site_tokens" search table. Site names can only be
+    encrypted with their vault's data key, so existing entries keep a plain
+    text site and a NULL sidx until their vault is next unlocked (see
+    misc.encrypt_vault_sites()).
+    """
+    # sidx: blind index of the site name; NULL while the site is plain text
+    columns = [col[1] for col in conn.execute("PRAGMA table_info(entries);")]
+    if "sidx" not in columns:
+        conn.execute("ALTER TABLE entries ADD COLUMN sidx BLOB;")
+    create_site_indexes(conn)
+
+    # token: search token of a site name prefix or trigram; pid: the entry it belongs to
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS site_tokens
+                    (vid INTEGER NOT NULL,
+                     token INTEGER NOT NULL,
+                     pid INTEGER NOT NULL,
+                     PRIMARY KEY(vid, token, pid)) WITHOUT ROWID;"""
+    )
+    # tokens are deleted with their entry: WHERE pid=?
+    conn.execute("CREATE INDEX IF NOT EXISTS site_tokens_pid ON site_tokens(pid);")
+    conn.execute(
+        """CREATE TRIGGER IF NOT EXISTS site_tokens_delete AFTER DELETE ON entries BEGIN
+               DELETE FROM site_tokens WHERE pid = old.pid;
+           END;"""
+    )
+
+
+def create_site_indexes(conn) -> None:
+    """Creates the indexes of "entries" on encrypted site names."""
+    # encrypted sites never compare equal; uniqueness is enforced on sidx
+    conn.execute("DROP INDEX IF EXISTS entries_vid_site;")
+    # duplicate checks and lookups: WHERE vid=? AND sidx=?
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS entries_vid_sidx ON entries(vid, sidx);"
+    )
+    # sites still to encrypt: WHERE vid=? AND sidx IS NULL
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS entries_plain_site ON entries(vid) WHERE sidx IS NULL;"
+    )
+
+
+def add_entry_created(conn) -> None:
+    """Adds the creation time of entries, used to list them by age.
+
+    Entries that already exist get 0, i.e. unknown, and sort before newer ones.
+    """
+    # created: unix time the entry was added at
+    columns = [col[1] for col in conn.execute("PRAGMA table_info(entries);")]
+    if "created" not in columns:
+        conn.execute("ALTER TABLE entries ADD COLUMN created INTEGER NOT NULL DEFAULT 0;")
+    # listings by age: WHERE vid=? ORDER BY created, pid (pid is the rowid)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS entries_vid_created ON entries(vid, created);"
+    )
+
+
+def cascade_vault_deletes(conn) -> None:
+    """Rebuilds "entries" so that deleting a vault deletes its entries.
+
+    SQLite cannot change the foreign key of an existing table, so the table is
+    copied into one declaring ON DELETE CASCADE; pids and the AUTOINCREMENT
+    counter are kept, and site is declared BLOB as it holds ciphertexts. Entries
+    (and search tokens) left behind by vaults deleted before are not copied.
+    """
+    conn.execute("DELETE FROM site_tokens WHERE vid NOT IN (SELECT vid FROM vaults);")
+    seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='entries';").fetchone()
+    conn.execute(
+        """CREATE TABLE entries_cascade
+                    (pid INTEGER PRIMARY KEY AUTOINCREMENT,
+                     vid INTEGER NOT NULL,
+                     site BLOB NOT NULL,
+                     esp BLOB NOT NULL,
+                     sidx BLOB,
+                     created INTEGER NOT NULL DEFAULT 0,
+                     FOREIGN KEY(vid) REFERENCES vaults(vid) ON DELETE CASCADE);"""
+    )
+    conn.execute(
+        """INSERT INTO entries_cascade(pid, vid, site, esp, sidx, created)
+           SELECT pid, vid, site, esp, sidx, created FROM entries
+           WHERE vid IN (SELECT vid FROM vaults);"""
+    )
+    conn.execute("DROP TABLE entries;")  # also drops its indexes and triggers
+    conn.execute("ALTER TABLE entries_cascade RENAME TO entries;")
+    if seq:
+        conn.execute("UPDATE sqlite_sequence SET seq=? WHERE name='entries';", seq)
+
+    conn.execute("CREATE INDEX entries_vid ON entries(vid);")
+    create_site_indexes(conn)
+    conn.execute("CREATE INDEX entries_vid_created ON entries(vid, created);")
+    conn.execute(
+        """CREATE TRIGGER site_tokens_delete AFTER DELETE ON entries BEGIN
+               DELETE FROM site_tokens WHERE pid = old.pid;
+           END;"""
+    )
+
+
+def create_settings(conn) -> None:
+    """Creates the "settings" table of values kept per database, e.g. the KDF calibration."""
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS settings
+                    (key TEXT PRIMARY KEY,
+                     value TEXT NOT NULL);"""
+    )
+
+
+def add_vault_site_grams(conn) -> None:
+    """Adds the substring search column to "vaults" (see utils.blind_index).
+
+    site_grams is 1 in vaults whose sites have trigram tokens and 0 in vaults
+    with word prefix tokens only. Databases written before it was added gave
+    every site trigram tokens; their vaults get NULL, and their tokens are
+    rebuilt without trigrams when they are next unlocked (see core.unlock()).
+    """
+    columns = [col[1] for col in conn.execute("PRAGMA table_info(vaults);")]
+    if "site_grams" not in columns:
+        conn.execute("ALTER TABLE vaults ADD COLUMN site_grams INTEGER DEFAULT 0;")
+        conn.execute(
+            "UPDATE vaults SET site_grams=NULL WHERE vid IN (SELECT vid FROM site_tokens);"
+        )
+
+
+# Migrations in the order they are applied; a database at version N has run the
+# first N of them.
+MIGRATIONS = [
+    create_tables,
+    add_vault_kdf,
+    index_entries,
+    add_vault_wdek,
+    store_esp_as_blob,
+    add_site_blind_index,
+    add_entry_created,
+    cascade_vault_deletes,
+    create_settings,
+    add_vault_site_grams,
+]
+
+
+def schema_version(conn) -> int:
+    """Returns the number of migrations a database has run."""
+    return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def migrate(conn) -> int:
+    """Runs every migration the database has not run yet.
+
+    Each migration runs in its own transaction together with the version bump,
+    so an interrupted upgrade resumes at the failed migration.
+
+    Args:
+        conn (sqlite3.Connection): A connection outside of any transaction.
+
+    Returns:
+        int: The schema version after migrating.
+    """
+    # older migrations copy tables that may still hold entries of deleted
+    # vaults, which foreign keys would reject; they can only be switched off
+    # outside of a transaction
+    conn.execute("PRAGMA foreign_keys=OFF;")
+    try:
+        _run_migrations(conn)
+    finally:
+        conn.execute("PRAGMA foreign_keys=ON;")
+    return len(MIGRATIONS)
+
+
+def _run_migrations(conn) -> None:
+    """Runs the pending migrations one transaction at a time; see migrate()."""
+    while schema_version(conn) < len(MIGRATIONS):
+        # another process may be migrating too: take the write lock, then check
+        # which migration is next
+        begin(conn)
+        try:
+            number = schema_version(conn) + 1
+            if number <= len(MIGRATIONS):
+                MIGRATIONS[number - 1](conn)
+                conn.execute(f"PRAGMA user_version={number};")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
@@ -3,19 +3,32 @@ This is the miscellaneous component.
 It contains the functions necessary for the working of the app database, encryption and hashing.
 """
 
-import sqlite3, os, random, string, hashlib
-from cryptography.fernet import Fernet
+import copy, sqlite3, random, string, time
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.fernet import Fernet, InvalidToken
 import base64
-
-
-def get_data(db_file, query):
+from utils.db import connection, transaction
+from utils.backup import notify_write
+from utils.envelope import new_dek, new_vault_keys
+from utils.ciphers import CipherSuite
+from utils.blind_index import SiteIndex, matches
+from utils.migrations import migrate
+from utils.kdf import TARGET_MS, use_calibration
+from utils.metrics import timed
+from utils.vacuum import reclaim_in_background
+
+
+@timed("db.get_data")
+def get_data(db_file, query, params=()):
     """
-    Connects to a SQLite database specified by `db_file` and executes the SQL query
-    specified by `query`. Returns the data resulting from the query as a list of tuples.
+    Executes the SQL query specified by `query` on a pooled connection to the SQLite
+    database specified by `db_file`. Returns the data resulting from the query as a
+    list of tuples.
 
     Args:
         db_file (str): Path to the SQLite database file.
         query (str): SQL query to execute.
+        params (tuple, optional): Values bound to the query placeholders. Defaults to ().
 
     Returns:
         list: A list of tuples representing the data resulting from the query.
@@ -24,15 +37,170 @@ def get_data(db_file, query):
         sqlite3.Error: An error occurred while connecting to or querying the database.
     """
     try:
-        with sqlite3.connect(db_file) as conn:
-            cursor = conn.cursor()
-            cursor.execute(query)
-            data = cursor.fetchall()
-            return data
+        with connection(db_file) as conn:
+            return conn.execute(query, params).fetchall()
     except sqlite3.Error as e:
         print(f"Error fetching data from db: {e}")
 
 
+@timed("db.get_entries_page")
+def get_entries_page(db_file: str, vid: int, after_pid=None, offset=0, limit=100):
+    """Reads one page of a vault's entries ordered by pid.
+
+    Uses keyset pagination (`pid > after_pid`) when the previous page's last pid
+    is known, and falls back to `offset` otherwise.
+
+    Args:
+        db_file (str): Path to the SQLite database file.
+        vid (int): Vault id whose entries to read.
+        after_pid (int, optional): Last pid of the previous page. Defaults to None.
+        offset (int, optional): Number of rows to skip when after_pid is None. Defaults to 0.
+        limit (int, optional): Maximum number of rows to return. Defaults to 100.
+
+    Returns:
+        list: A list of (pid, vid, site, esp) tuples.
+    """
+    if after_pid is not None:
+        return get_data(
+            db_file,
+            "SELECT * FROM entries WHERE vid=? AND pid>? ORDER BY pid LIMIT ?;",
+            (vid, after_pid, limit),
+        )
+    return get_data(
+        db_file,
+        "SELECT * FROM entries WHERE vid=? ORDER BY pid LIMIT ? OFFSET ?;",
+        (vid, limit, offset),
+    )
+
+
+# Most results returned by a site search.
+SEARCH_LIMIT = 500
+# Entries read (and decrypted) per query while searching.
+SEARCH_BATCH = 1000
+# Postings counted per token when choosing the one to read candidates by.
+SEARCH_COUNT_CAP = 1000
+
+
+@timed("db.search_sites")
+def search_sites(db_file: str, session, query: str, limit: int = SEARCH_LIMIT) -> list:
+    """Finds the entries of a vault whose site matches a search, in pid order.
+
+    Site names are encrypted, so the candidates are the entries holding every
+    search token of the query (see utils.blind_index), and they are checked
+    once decrypted: a site matches when one of its words, read on to the end of
+    the name, starts with the query. In vaults with substring search, when no
+    site matches that way, the sites containing every trigram of the query are
+    checked for the query anywhere in them; queries shorter than a trigram only
+    match word prefixes. A query without candidates decrypts nothing.
+    Decrypting is done here, so call this off the UI thread.
+
+    Args:
+        db_file (str): Path to the SQLite database file.
+        session (VaultSession): The unlocked vault to search.
+        query (str): The text typed in the search box.
+        limit (int, optional): Maximum number of results. Defaults to SEARCH_LIMIT.
+
+    Returns:
+        list: (pid, vid, site, esp) entries with decrypted site names.
+    """
+    prefix_tokens = session.sites.prefix_tokens(query)
+    found = _search_tokens(db_file, session, prefix_tokens, lambda site: matches(site, query), limit)
+    grams = session.sites.gram_tokens(query) if session.sites.substrings else None
+    if found or not grams:
+        return found
+    lowered = query.lower()
+    return _search_tokens(db_file, session, grams, lambda site: lowered in site.lower(), limit)
+
+
+def _search_tokens(db_file: str, session, tokens: set, match, limit: int) -> list:
+    """Decrypts the entries holding every token, page by page, and keeps the ones matching.
+
+    The candidates are read by the token with the fewest postings; the others
+    are checked with primary key lookups.
+    """
+    count = (
+        "SELECT COUNT(*) FROM (SELECT 1 FROM site_tokens WHERE vid=? AND token=? LIMIT ?);"
+    )
+    counts = {}
+    for token in tokens:
+        data = get_data(db_file, count, (session.vid, token, SEARCH_COUNT_CAP))
+        if not data or not data[0][0]:
+            return []  # no site holds this token
+        counts[token] = data[0][0]
+    first, *others = sorted(tokens, key=counts.get)
+
+    # the token table is joined to "entries" with CROSS JOIN, which makes SQLite
+    # read the postings of the first token and look up their entries by pid
+    query = "SELECT entries.* FROM site_tokens AS t CROSS JOIN entries ON entries.pid = t.pid"
+    query += " WHERE t.vid=? AND t.token=? AND t.pid>?"
+    has_token = " AND EXISTS (SELECT 1 FROM site_tokens WHERE vid=t.vid AND token=? AND pid=t.pid)"
+    query += has_token * len(others)
+    query += " ORDER BY t.pid LIMIT ?;"
+
+    found = []
+    after_pid = -1
+    while len(found) < limit:
+        page = get_data(db_file, query, (session.vid, first, after_pid, *others, SEARCH_BATCH))
+        if not page:
+            break
+        found += [e for e in session.open_entries(page) if match(e[2])]
+        after_pid = page[-1][0]
+    return found[:limit]
+
+
+@timed("db.site_exists")
+def site_exists(db_file: str, vid: int, sidx: bytes) -> bool:
+    """Checks whether a vault already has an entry for a site.
+
+    Args:
+        db_file (str): Path to the SQLite database file.
+        vid (int): Vault id to look in.
+        sidx (bytes): Blind index of the site name, see VaultSession.sites.
+
+    Returns:
+        bool: True if the vault has an entry with that site name.
+    """
+    return bool(
+        get_data(
+            db_file,
+            "SELECT 1 FROM entries WHERE vid=? AND sidx=? LIMIT 1;",
+            (vid, sidx),
+        )
+    )
+
+
+@timed("db.count_entries")
+def count_entries(db_file: str, vid: int) -> int:
+    """Counts the entries of a vault.
+
+    Args:
+        db_file (str): Path to the SQLite database file.
+        vid (int): Vault id whose entries to count.
+
+    Returns:
+        int: The number of entries in the vault.
+    """
+    data = get_data(db_file, "SELECT COUNT(*) FROM entries WHERE vid=?;", (vid,))
+    return data[0][0] if data else 0
+
+
+@timed("legacy.derive_key")
+def derive_key(key: str) -> bytes:
+    """Turns a master password into the Fernet key legacy vaults encrypt entries with.
+
+    This only pads the password, it is no KDF; vaults with a data key do not use it.
+
+    Args:
+        key (str): The master password.
+
+    Returns:
+        bytes: The urlsafe base64-encoded 32 byte key.
+    """
+    # Use padding to ensure key is 32 bytes long
+    return base64.urlsafe_b64encode(key.encode().ljust(32)[:32])
+
+
+@timed("crypto.encrypt")
 def encrypt(key: str, msg: str) -> str:
     """Encrypts the given message using the given key.
 
@@ -44,10 +212,8 @@ def encrypt(key: str, msg: str) -> str:
         str: The ciphertext as a string.
     """
     try:
-        # Use padding to ensure key is 32 bytes long
-        key = key.encode().ljust(32)[:32]
         # Initialize a Fernet object with the key
-        fernet_obj = Fernet(base64.urlsafe_b64encode(key))
+        fernet_obj = Fernet(derive_key(key))
         # Use the Fernet object to encrypt the message
         ciphertext = fernet_obj.encrypt(msg.encode())
         # Return the ciphertext as a string
@@ -57,6 +223,7 @@ def encrypt(key: str, msg: str) -> str:
         return ""
 
 
+@timed("crypto.decrypt")
 def decrypt(key: str, ciphertext: str) -> str:
     """Decrypts the given ciphertext using the given key.
 
@@ -68,10 +235,8 @@ def decrypt(key: str, ciphertext: str) -> str:
         str: The decrypted plaintext.
     """
     try:
-        # Use padding to ensure key is 32 bytes long
-        key = key.encode().ljust(32)[:32]
         # Initialize a Fernet object with the key
-        fernet_obj = Fernet(base64.urlsafe_b64encode(key))
+        fernet_obj = Fernet(derive_key(key))
         # Use the Fernet object to decrypt the ciphertext
         original_msg = fernet_obj.decrypt(ciphertext.encode())
         # Return the original message as a string
@@ -95,6 +260,7 @@ def generate_salt(length: int = 10) -> str:
     )
 
 
+@timed("db.setup_db")
 def setup_db(db_file: str) -> None:
     """Sets up the application database.
 
@@ -104,113 +270,476 @@ def setup_db(db_file: str) -> None:
     Returns: None
     """
 
-    conn = sqlite3.connect(db_file)
-    cursor = conn.cursor()
-
     try:
-        # Create the "vaults" table if it does not already exist
-        # vid: vault id; vname: vault name
-        # hmp: hashed master password of the vault; salt: salt used in hashing
-        cursor.execute(
-            """CREATE TABLE IF NOT EXISTS vaults
-                        (vid INTEGER PRIMARY KEY AUTOINCREMENT,
-                         vname TEXT UNIQUE NOT NULL,
-                         hmp TEXT NOT NULL,
-                         salt TEXT NOT NULL);"""
-        )
-
-        # Create the "entries" table if it does not already exist
-        # pid: password id; vid: vault id
-        # site: site name; esp: encrypted site password
-        cursor.execute(
-            """CREATE TABLE IF NOT EXISTS entries
-                        (pid INTEGER PRIMARY KEY AUTOINCREMENT,
-                         vid INTEGER NOT NULL,
-                         site TEXT NOT NULL,
-                         esp TEXT NOT NULL,
-                         FOREIGN KEY(vid) REFERENCES vaults(vid));"""
+        # Create or upgrade the tables
+        with connection(db_file) as conn:
+            migrate(conn)
+
+        # Reuse the KDF parameters calibrated for this database, or store them
+        # once they are calibrated
+        settings = dict(get_data(db_file, "SELECT key, value FROM settings;") or ())
+        calibrated = settings.get("kdf_target_ms") == str(TARGET_MS)
+        use_calibration(
+            settings.get("kdf") if calibrated else None,
+            lambda spec: save_settings(db_file, {"kdf": spec, "kdf_target_ms": str(TARGET_MS)}),
         )
 
         # check if vaults exist in the database
         # if not, insert an example vault "example_vault" using a random salt with password "pwd"
-        no_of_vaults = cursor.execute("SELECT COUNT(*) FROM vaults;").fetchone()[0]
-        if no_of_vaults == 0:
-            salt = generate_salt()
-            mp = "pwd"
-            hmp = hashlib.sha256((mp + salt).encode()).hexdigest()
-            cursor.execute(
-                f"INSERT INTO vaults(vid, vname, hmp, salt) VALUES(1,'example_vault', '{hmp}', '{salt}');"
-            )
-
-        # check if passwords exist in the database
-        # if not, insert an example password "pwd" for site "site"
-        no_of_pwds = cursor.execute("SELECT COUNT(*) FROM entries;").fetchone()[0]
-        if no_of_pwds == 0:
-            esp = encrypt(key="pwd", msg="pwd")
-            cursor.execute(
-                f"INSERT INTO entries(pid, vid, site, esp) VALUES(1, 1, 'site', '{esp}')"
-            )
-        conn.commit()
+        if not get_data(db_file, "SELECT 1 FROM vaults LIMIT 1;"):
+            # the KDF runs before the write transaction, which would otherwise
+            # keep every other writer waiting for it
+            dek = new_dek()
+            keys = new_vault_keys("pwd", dek)
+            cipher, sites = CipherSuite(dek), SiteIndex(dek)
+            with transaction(db_file) as cursor:
+                # another process may have set the database up meanwhile
+                no_of_vaults = cursor.execute("SELECT COUNT(*) FROM vaults;").fetchone()[0]
+                if no_of_vaults == 0:
+                    cursor.execute(
+                        "INSERT INTO vaults(vid, vname, hmp, salt, kdf, wdek) VALUES(1, 'example_vault', ?, ?, ?, ?);",
+                        keys,
+                    )
+
+                    # with an example password "pwd" for site "site", encrypted with the vault's data key
+                    cursor.execute(
+                        "INSERT INTO entries(pid, vid, site, esp, sidx, created) VALUES(1, 1, ?, ?, ?, ?);",
+                        (
+                            cipher.encrypt(b"site"),
+                            cipher.encrypt(b"pwd"),
+                            sites.blind_index("site"),
+                            int(time.time()),
+                        ),
+                    )
+                    cursor.executemany(
+                        "INSERT INTO site_tokens(vid, token, pid) VALUES(1, ?, 1);",
+                        [(token,) for token in sites.tokens("site")],
+                    )
 
     except sqlite3.Error as e:
         print(f"Error setting up databases: {e}")
 
-    # Close the cursor and connection
-    cursor.close()
-    conn.close()
+
+@timed("db.save_settings")
+def save_settings(db_file: str, settings: dict) -> None:
+    """Stores values in the "settings" table of the database, replacing older ones.
+
+    Args:
+        db_file (str): The filename of the database to use.
+        settings (dict): The values to store, by key.
+    """
+    try:
+        with transaction(db_file) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO settings(key, value) VALUES(?, ?);", settings.items()
+            )
+    except sqlite3.Error as e:
+        print(f"Error saving settings: {e}")
 
 
-def add_vault_to_db(db_file: str, vault_name: str, vault_pwd: str) -> None:
+@timed("db.add_vault_to_db")
+def add_vault_to_db(
+    db_file: str, vault_name: str, vault_pwd: str, hashed: tuple = None
+) -> int:
     """Add a new vault to the database with the given name and password.
 
     Args:
     - db_file (str): The filename of the database to use.
     - vault_name (str): The name of the new vault to add.
     - vault_pwd (str): The password to use for the new vault.
+    - hashed (tuple, optional): (hmp, salt, kdf, wdek) already computed for
+      vault_pwd by envelope.new_vault_keys(), e.g. on a background worker.
 
-    Returns: None
+    Returns: the vault id of the new vault, or None if it could not be added.
 
     Raises:
     - sqlite3.Error: If an error occurs while adding the vault to the database.
     """
-    # Generate a random salt and hash the master password
-    salt = generate_salt()
-    hmp = hashlib.sha256((vault_pwd + salt).encode()).hexdigest()
+    # Generate a random salt and hash the master password with the calibrated KDF,
+    # and a random data key wrapped by the master password
+    hmp, salt, kdf, wdek = hashed or new_vault_keys(vault_pwd)
 
     try:
-        with sqlite3.connect(db_file) as conn:
+        with transaction(db_file) as conn:
             # Use placeholders in the SQL query to avoid SQL injection attacks
-            query = "INSERT INTO vaults(vname, hmp, salt) VALUES(?,?,?)"
-            values = (vault_name, hmp, salt)
-            conn.cursor().execute(query, values)
-            conn.commit()
+            query = "INSERT INTO vaults(vname, hmp, salt, kdf, wdek) VALUES(?,?,?,?,?)"
+            values = (vault_name, hmp, salt, kdf, wdek)
+            vid = conn.execute(query, values).lastrowid
+        notify_write(db_file)
+        return vid
     except sqlite3.Error as error:
         print(f"Error adding vault to database: {error}")
 
 
-def add_entry_to_db(db_file: str, vmp: str, vid: int, site: str, pwd: str) -> None:
+@timed("db.update_vault_hash")
+def update_vault_hash(db_file: str, vid: int, hashed: tuple) -> None:
+    """Replaces the master password hash and wrapped data key of a vault.
+
+    Used after a password change or a KDF upgrade; the entries are untouched.
+
+    Args:
+    - db_file (str): The filename of the database to use.
+    - vid (int): The vault id.
+    - hashed (tuple): The new (hmp, salt, kdf, wdek).
+
+    Returns: None
+    """
+    try:
+        with transaction(db_file) as conn:
+            conn.execute(
+                "UPDATE vaults SET hmp=?, salt=?, kdf=?, wdek=? WHERE vid=?;",
+                (*hashed, vid),
+            )
+        notify_write(db_file)
+    except sqlite3.Error as error:
+        print(f"Error updating vault in database: {error}")
+
+
+# Blind indexes looked up per query by existing_sites(), within SQLite's
+# default limit of 999 bound parameters.
+LOOKUP_BATCH = 500
+
+
+def existing_sites(conn, vid: int, sidxs: list) -> set:
+    """Returns which of a list of site blind indexes a vault already has.
+
+    Args:
+        conn (sqlite3.Connection): The connection to query on.
+        vid (int): Vault id to look in.
+        sidxs (list): Blind indexes of site names, see VaultSession.sites.
+
+    Returns:
+        set: The blind indexes that belong to an entry of the vault.
+    """
+    found = set()
+    for start in range(0, len(sidxs), LOOKUP_BATCH):
+        batch = sidxs[start : start + LOOKUP_BATCH]
+        marks = ", ".join("?" * len(batch))
+        rows = conn.execute(
+            f"SELECT sidx FROM entries WHERE vid=? AND sidx IN ({marks});", (vid, *batch)
+        )
+        found.update(sidx for sidx, in rows)
+    return found
+
+
+def insert_entries(conn, session, entries: list, skip_existing: bool = False) -> list:
+    """Encrypts entries and inserts them, with their search tokens, on a connection.
+
+    Must run in a write transaction (see db.transaction()), which the caller
+    commits: the new pids are read back from the AUTOINCREMENT counter.
+
+    Args:
+        conn (sqlite3.Connection): The connection to insert on.
+        session (VaultSession): The unlocked vault the entries belong to.
+        entries (list): (site, pwd) pairs to encrypt and store.
+        skip_existing (bool, optional): Skip sites the vault already has, or
+            that occur earlier in `entries`, instead of raising
+            sqlite3.IntegrityError. Defaults to False.
+
+    Returns:
+        list: The password ids of the inserted entries.
+    """
+    sidxs = [session.sites.blind_index(site) for site, _ in entries]
+    if skip_existing:
+        seen = existing_sites(conn, session.vid, sidxs)
+        new = []
+        for entry, sidx in zip(entries, sidxs):
+            if sidx not in seen:
+                seen.add(sidx)
+                new.append((entry, sidx))
+        entries, sidxs = [entry for entry, _ in new], [sidx for _, sidx in new]
+    if not entries:
+        return []
+
+    # encrypt the site names and pwds with the vault's session cipher
+    esites = session.encrypt_many([site for site, _ in entries])
+    esps = session.encrypt_many([pwd for _, pwd in entries])
+
+    # Use placeholders in the SQL query to avoid SQL injection attacks
+    created = int(time.time())
+    conn.executemany(
+        "INSERT INTO entries(vid, site, esp, sidx, created) VALUES(?, ?, ?, ?, ?);",
+        [(session.vid, *values, created) for values in zip(esites, esps, sidxs)],
+    )
+    # the transaction holds the write lock, so the new pids are consecutive and
+    # end at the counter
+    last = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='entries';").fetchone()[0]
+    pids = list(range(last - len(entries) + 1, last + 1))
+    conn.executemany(
+        "INSERT INTO site_tokens(vid, token, pid) VALUES(?, ?, ?);",
+        [
+            (session.vid, token, pid)
+            for (site, _), pid in zip(entries, pids)
+            for token in session.sites.tokens(site)
+        ],
+    )
+    return pids
+
+
+@timed("db.add_entry_to_db")
+def add_entry_to_db(db_file: str, session, site: str, pwd: str) -> int:
     """Adds an entry to the "entries" table of the database.
 
     Args:
         db_file (str): Filename of the database to use.
-        vmp (str): Vault master password needed for encryption of pwd.
-        vid (int): Vault id of used vault.
+        session (VaultSession): The unlocked vault the entry belongs to.
+        site (str): Site name to encrypt and store.
         pwd (str): Site password to encrypt and store.
-        site (str): Site name to store.
+
+    Returns:
+        int: The password id of the new entry, or None if it could not be added.
 
     Raises:
         sqlite3.Error: If entry addition fails.
     """
-    # encrypt the pwd using vmp
-    esp = encrypt(key=vmp, msg=pwd)
+    try:
+        with transaction(db_file) as conn:
+            pid = insert_entries(conn, session, [(site, pwd)])[0]
+        notify_write(db_file)
+        return pid
+    except sqlite3.Error as e:
+        print(f"Error adding entry to database: {e}")
 
-    # Use placeholders in the SQL query to avoid SQL injection attacks
-    query = "INSERT INTO entries(vid, site, esp) VALUES(?, ?, ?)"
-    values = (vid, site, esp)
 
+@timed("db.add_entries_to_db")
+def add_entries_to_db(db_file: str, session, entries: list) -> None:
+    """Adds a batch of entries to the "entries" table in one transaction.
+
+    Args:
+        db_file (str): Filename of the database to use.
+        session (VaultSession): The unlocked vault the entries belong to.
+        entries (list): (site, pwd) pairs to encrypt and store.
+
+    Raises:
+        sqlite3.Error: If entry addition fails.
+    """
     try:
-        with sqlite3.connect(db_file) as conn:
-            conn.execute(query, values)
-            conn.commit()
+        with transaction(db_file) as conn:
+            insert_entries(conn, session, entries)
+        notify_write(db_file)
     except sqlite3.Error as e:
-        print(f"Error adding entry to database: {e}")
+        print(f"Error adding entries to database: {e}")
+
+
+@timed("db.encrypt_vault_sites")
+def encrypt_vault_sites(db_file: str, session, batch_size: int = 1000) -> int:
+    """Encrypts the site names a vault still stores in plain text.
+
+    Sites of entries created before site names were encrypted can only be
+    encrypted with the vault's data key, so this runs when the vault is
+    unlocked; it returns at once when there is nothing to do. All sites are
+    encrypted, indexed and tokenized in one write transaction.
+
+    Args:
+        db_file (str): Filename of the database to use.
+        session (VaultSession): The unlocked vault.
+        batch_size (int, optional): Entries read and written per batch. Defaults to 1000.
+
+    Returns:
+        int: The number of encrypted site names, or None if it failed.
+    """
+    pending = "SELECT pid, site FROM entries WHERE vid=? AND sidx IS NULL LIMIT ?;"
+    if not get_data(db_file, pending, (session.vid, 1)):
+        return 0
+    done = 0
+    try:
+        with transaction(db_file) as conn:
+            while True:
+                # encrypted rows leave the (partial) index, so re-read from the start
+                rows = conn.execute(pending, (session.vid, batch_size)).fetchall()
+                if not rows:
+                    break
+                esites = session.encrypt_many([site for _, site in rows])
+                conn.executemany(
+                    "UPDATE entries SET site=?, sidx=? WHERE pid=?;",
+                    [
+                        (esite, session.sites.blind_index(site), pid)
+                        for (pid, site), esite in zip(rows, esites)
+                    ],
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO site_tokens(vid, token, pid) VALUES(?, ?, ?);",
+                    [
+                        (session.vid, token, pid)
+                        for pid, site in rows
+                        for token in session.sites.tokens(site)
+                    ],
+                )
+                done += len(rows)
+        notify_write(db_file)
+        return done
+    except sqlite3.Error as e:
+        print(f"Error encrypting site names: {e}")
+
+
+@timed("db.index_vault_sites")
+def index_vault_sites(db_file: str, session, substrings: bool, batch_size: int = 1000) -> int:
+    """Rebuilds the search tokens of a vault, with or without substring search.
+
+    The vault's sites are decrypted a batch at a time and their tokens replaced
+    in one write transaction, together with the vault's site_grams flag; the
+    session then computes tokens the same way.
+
+    Args:
+        db_file (str): Filename of the database to use.
+        session (VaultSession): The unlocked vault.
+        substrings (bool): Give sites trigram tokens too (see utils.blind_index).
+        batch_size (int, optional): Entries read and written per batch. Defaults to 1000.
+
+    Returns:
+        int: The number of indexed entries, or None if it failed.
+    """
+    sites = copy.copy(session.sites)
+    sites.substrings = substrings
+    done = 0
+    try:
+        with transaction(db_file) as conn:
+            conn.execute("DELETE FROM site_tokens WHERE vid=?;", (session.vid,))
+            after_pid = -1
+            while True:
+                # sites still in plain text get their tokens when they are encrypted
+                rows = conn.execute(
+                    """SELECT pid, vid, site FROM entries
+                       WHERE vid=? AND pid>? AND sidx IS NOT NULL ORDER BY pid LIMIT ?;""",
+                    (session.vid, after_pid, batch_size),
+                ).fetchall()
+                if not rows:
+                    break
+                conn.executemany(
+                    "INSERT INTO site_tokens(vid, token, pid) VALUES(?, ?, ?);",
+                    [
+                        (session.vid, token, pid)
+                        for pid, _, site in session.open_entries(rows)
+                        for token in sites.tokens(site)
+                    ],
+                )
+                done += len(rows)
+                after_pid = rows[-1][0]
+            conn.execute(
+                "UPDATE vaults SET site_grams=? WHERE vid=?;", (int(substrings), session.vid)
+            )
+        notify_write(db_file)
+        session.sites = sites
+        return done
+    except sqlite3.Error as e:
+        print(f"Error indexing site names: {e}")
+
+
+@timed("db.rotate_vault_key")
+def rotate_vault_key(
+    db_file: str,
+    vid: int,
+    old_session,
+    new_session,
+    hashed: tuple,
+    batch_size: int = 1000,
+    workers: int = 4,
+    progress=None,
+) -> int:
+    """Re-encrypts every entry of a vault under a new key and stores the new keys.
+
+    Used to move vaults whose entries were encrypted with the master password
+    itself onto a data key.
+
+    Everything happens in one write transaction: either all entries and the
+    vault hash are replaced, or (on any error or crash) none of them are.
+    Entries are read a batch at a time and re-encrypted on a thread pool.
+
+    Args:
+        db_file (str): Filename of the database to use.
+        vid (int): Vault id of the vault to rotate.
+        old_session (VaultSession): The vault unlocked with its current key.
+        new_session (VaultSession): The vault unlocked with its new key.
+        hashed (tuple): The new (hmp, salt, kdf, wdek).
+        batch_size (int, optional): Entries read and written per batch. Defaults to 1000.
+        workers (int, optional): Re-encryption threads. Defaults to 4.
+        progress (callable, optional): Called with (done, total) after every batch.
+
+    Returns:
+        int: The number of re-encrypted entries, or None if the rotation failed.
+    """
+
+    def reencrypt(rows):
+        pwds = old_session.decrypt_many([esp for _, esp in rows], strict=True)
+        return zip(new_session.encrypt_many(pwds), [pid for pid, _ in rows])
+
+    done = 0
+    try:
+        # transactions take the write lock up front, so no entry is added mid-rotation
+        with transaction(db_file) as conn, ThreadPoolExecutor(workers) as executor:
+            total = conn.execute(
+                "SELECT COUNT(*) FROM entries WHERE vid=?;", (vid,)
+            ).fetchone()[0]
+            after_pid = -1
+            while True:
+                rows = conn.execute(
+                    "SELECT pid, esp FROM entries WHERE vid=? AND pid>? ORDER BY pid LIMIT ?;",
+                    (vid, after_pid, batch_size),
+                ).fetchall()
+                if not rows:
+                    break
+                # split the batch between the workers
+                step = -(-len(rows) // workers)
+                slices = [rows[i : i + step] for i in range(0, len(rows), step)]
+                for values in executor.map(reencrypt, slices):
+                    conn.executemany("UPDATE entries SET esp=? WHERE pid=?;", values)
+                done += len(rows)
+                after_pid = rows[-1][0]
+                if progress:
+                    progress(done, total)
+            conn.execute(
+                "UPDATE vaults SET hmp=?, salt=?, kdf=?, wdek=? WHERE vid=?;",
+                (*hashed, vid),
+            )
+        notify_write(db_file)
+        return done
+    except (sqlite3.Error, InvalidToken) as e:
+        print(f"Error rotating vault key: {e}")
+
+
+@timed("db.delete_entry_from_db")
+def delete_entry_from_db(db_file: str, pid: int) -> None:
+    """Deletes an entry from the "entries" table of the database.
+
+    Args:
+        db_file (str): Filename of the database to use.
+        pid (int): Password id of the entry to delete.
+
+    Raises:
+        sqlite3.Error: If entry deletion fails.
+    """
+    try:
+        with transaction(db_file) as conn:
+            conn.execute("DELETE FROM entries WHERE pid=?;", (pid,))
+        notify_write(db_file)
+    except sqlite3.Error as e:
+        print(f"Error deleting entry from database: {e}")
+
+
+@timed("db.delete_vault_from_db")
+def delete_vault_from_db(db_file: str, vid: int) -> bool:
+    """Deletes a vault, with its entries, from the database.
+
+    The entries go with the vault through their ON DELETE CASCADE foreign key;
+    the space they took is then given back in the background (see
+    utils.vacuum). Deleting a large vault takes a while; call it off the UI
+    thread.
+
+    Args:
+        db_file (str): Filename of the database to use.
+        vid (int): Vault id of the vault to delete.
+
+    Returns:
+        bool: Whether the vault was deleted.
+    """
+    try:
+        with transaction(db_file) as conn:
+            # one range delete instead of a lookup per entry in the token trigger
+            conn.execute("DELETE FROM site_tokens WHERE vid=?;", (vid,))
+            conn.execute("DELETE FROM vaults WHERE vid=?;", (vid,))
+        notify_write(db_file)
+        reclaim_in_background(db_file)
+        return True
+    except sqlite3.Error as e:
+        print(f"Error deleting vault from database: {e}")
+        return False
@@ -0,0 +1,297 @@
+"""
+This is the models component.
+The stores here wrap the database helpers and emit a change event for every
+vault or entry that is added or removed, so that windows can update exactly the
+affected tile or row instead of rebuilding their whole UI. When another process
+changes the database, they emit a "reload" event instead.
+"""
+
+from utils.db import external_changes
+
+from utils.misc import (
+    get_data,
+    add_vault_to_db,
+    update_vault_hash,
+    rotate_vault_key,
+    add_entry_to_db,
+    encrypt_vault_sites,
+    index_vault_sites,
+    delete_vault_from_db,
+    delete_entry_from_db,
+)
+
+
+class Observable:
+    """Something that other objects can subscribe to for change events."""
+
+    def __init__(self) -> None:
+        """Initializes the observable without any subscribers."""
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """Registers a callback for change events.
+
+        Args:
+            callback (callable): Called as callback(event, item) where event is
+                "insert", "delete" or "reload" (item is then None).
+
+        Returns:
+            callable: A function that removes the subscription again.
+        """
+        self._subscribers.append(callback)
+        return lambda: self._subscribers.remove(callback)
+
+    def emit(self, event: str, item) -> None:
+        """Notifies every subscriber of a change.
+
+        Args:
+            event (str): "insert", "delete", or "reload" when anything may have
+                changed.
+            item: The inserted row, the deleted row, or None.
+        """
+        for callback in list(self._subscribers):
+            callback(event, item)
+
+
+class VaultStore(Observable):
+    """The vaults of a database, cached in memory and kept in sync with it.
+
+    Attributes:
+        db_file (str): The filename of the database to use.
+    """
+
+    def __init__(self, db_file: str) -> None:
+        """Initializes the store; the vaults are read on first access.
+
+        Args:
+            db_file (str): The filename of the database to use.
+        """
+        super().__init__()
+        self.db_file = db_file
+        self._vaults = None
+
+    def vaults(self) -> list:
+        """Returns every vault row (vid, vname, hmp, salt, kdf, wdek, site_grams), in vid order."""
+        if self._vaults is None:
+            rows = get_data(self.db_file, "SELECT * FROM vaults ORDER BY vid;") or []
+            self._vaults = {vault[0]: vault for vault in rows}
+        return list(self._vaults.values())
+
+    def get(self, vid: int) -> tuple:
+        """Returns the vault with the given id.
+
+        Args:
+            vid (int): The vault id.
+
+        Returns:
+            tuple: The (vid, vname, hmp, salt, kdf, wdek, site_grams) vault.
+
+        Raises:
+            ValueError: If no vault has the given id.
+        """
+        self.vaults()
+        if vid not in self._vaults:
+            raise ValueError(f"No vault found with ID {vid}")
+        return self._vaults[vid]
+
+    def add(self, vname: str, pwd: str, hashed: tuple = None) -> None:
+        """Creates a vault and emits an "insert" event for it.
+
+        Args:
+            vname (str): The name of the new vault.
+            pwd (str): The master password of the new vault.
+            hashed (tuple, optional): (hmp, salt, kdf, wdek) already computed for pwd.
+        """
+        self.vaults()
+        vid = add_vault_to_db(self.db_file, vname, pwd, hashed)
+        if vid is None:
+            return
+        vault = get_data(self.db_file, "SELECT * FROM vaults WHERE vid=?;", (vid,))[0]
+        self._vaults[vid] = vault
+        self.emit("insert", vault)
+
+    def update_hash(self, vid: int, hashed: tuple) -> None:
+        """Stores a vault's new password hash and wrapped data key.
+
+        Used after a password change or a KDF upgrade; the entries are untouched.
+
+        Args:
+            vid (int): The vault id.
+            hashed (tuple): The new (hmp, salt, kdf, wdek).
+        """
+        vault = self.get(vid)
+        update_vault_hash(self.db_file, vid, hashed)
+        self._vaults[vid] = (*vault[:2], *hashed, *vault[6:])
+
+    def rotate_key(self, session, new_session, hashed: tuple, progress=None) -> bool:
+        """Re-encrypts a vault's entries under a new data key.
+
+        Args:
+            session (VaultSession): The vault unlocked with its current key.
+            new_session (VaultSession): The vault unlocked with its new key.
+            hashed (tuple): The new (hmp, salt, kdf, wdek).
+            progress (callable, optional): Called with (done, total) entries.
+
+        Returns:
+            bool: Whether the vault was rotated; it is left untouched otherwise.
+        """
+        vault = self.get(session.vid)
+        done = rotate_vault_key(
+            self.db_file, session.vid, session, new_session, hashed, progress=progress
+        )
+        if done is None:
+            return False
+        self._vaults[session.vid] = (*vault[:2], *hashed, *vault[6:])
+        return True
+
+    def index_sites(self, session, substrings: bool) -> bool:
+        """Rebuilds a vault's search tokens, with or without substring search.
+
+        Args:
+            session (VaultSession): The unlocked vault.
+            substrings (bool): Give sites trigram tokens too.
+
+        Returns:
+            bool: Whether the tokens were rebuilt; they are left untouched otherwise.
+        """
+        vault = self.get(session.vid)
+        if index_vault_sites(self.db_file, session, substrings) is None:
+            return False
+        self._vaults[session.vid] = (*vault[:6], int(substrings), *vault[7:])
+        return True
+
+    def delete(self, vid: int) -> None:
+        """Deletes a vault and emits a "delete" event for it.
+
+        Args:
+            vid (int): The id of the vault to delete.
+        """
+        vault = self.get(vid)
+        if delete_vault_from_db(self.db_file, vid):
+            self._deleted(vault)
+
+    def delete_in_background(self, vid: int, scheduler) -> None:
+        """Deletes a vault on a worker thread, then emits a "delete" event for it.
+
+        Deleting a vault deletes all of its entries, which takes a while for
+        large vaults; the UI stays responsive meanwhile.
+
+        Args:
+            vid (int): The id of the vault to delete.
+            scheduler (TaskScheduler): Runs the deletion.
+        """
+        vault = self.get(vid)
+        scheduler.submit(
+            delete_vault_from_db,
+            self.db_file,
+            vid,
+            on_done=lambda deleted: deleted and self._deleted(vault),
+        )
+
+    def _deleted(self, vault: tuple) -> None:
+        """Drops a deleted vault from the cache and emits a "delete" event for it."""
+        if self._vaults is not None:
+            self._vaults.pop(vault[0], None)
+        self.emit("delete", vault)
+
+    def reload(self) -> None:
+        """Drops the cached vaults and emits a "reload" event."""
+        self._vaults = None
+        self.emit("reload", None)
+
+
+class EntryStore(Observable):
+    """Emits change events for the entries of a database.
+
+    Entries themselves are not cached here; views read them page by page.
+
+    Attributes:
+        db_file (str): The filename of the database to use.
+    """
+
+    def __init__(self, db_file: str) -> None:
+        """Initializes the store.
+
+        Args:
+            db_file (str): The filename of the database to use.
+        """
+        super().__init__()
+        self.db_file = db_file
+
+    def add(self, session, site: str, pwd: str) -> None:
+        """Adds an entry to an unlocked vault and emits an "insert" event for it.
+
+        Args:
+            session (VaultSession): The unlocked vault to add the entry to.
+            site (str): The site name.
+            pwd (str): The site password.
+        """
+        pid = add_entry_to_db(self.db_file, session, site, pwd)
+        if pid is None:
+            return
+        entry = get_data(
+            self.db_file, "SELECT pid, vid, site, esp, created FROM entries WHERE pid=?;", (pid,)
+        )
+        self.emit("insert", session.open_entries(entry)[0])
+
+    def encrypt_sites(self, session) -> bool:
+        """Encrypts the site names a vault still stores in plain text.
+
+        Entries only change representation, so no event is emitted.
+
+        Args:
+            session (VaultSession): The unlocked vault.
+
+        Returns:
+            bool: Whether the vault's sites are all encrypted now.
+        """
+        return encrypt_vault_sites(self.db_file, session) is not None
+
+    def delete(self, entry: tuple) -> None:
+        """Deletes an entry and emits a "delete" event for it.
+
+        Args:
+            entry (tuple): The (pid, vid, site, esp) entry to delete.
+        """
+        delete_entry_from_db(self.db_file, entry[0])
+        self.emit("delete", entry)
+
+    def reload(self) -> None:
+        """Emits a "reload" event, for entries changed by another process."""
+        self.emit("reload", None)
+
+
+_vault_stores = {}
+_entry_stores = {}
+
+
+def get_vault_store(db_file: str) -> VaultStore:
+    """Returns the shared vault store for a database file."""
+    if db_file not in _vault_stores:
+        _vault_stores[db_file] = VaultStore(db_file)
+    return _vault_stores[db_file]
+
+
+def get_entry_store(db_file: str) -> EntryStore:
+    """Returns the shared entry store for a database file."""
+    if db_file not in _entry_stores:
+        _entry_stores[db_file] = EntryStore(db_file)
+    return _entry_stores[db_file]
+
+
+def reload_external_changes(db_file: str) -> bool:
+    """Reloads the stores of a database if another process changed it.
+
+    Cheap enough to call every second from the UI thread.
+
+    Args:
+        db_file (str): The filename of the database to check.
+
+    Returns:
+        bool: Whether the database had changed.
+    """
+    if not external_changes(db_file):
+        return False
+    get_vault_store(db_file).reload()
+    get_entry_store(db_file).reload()
+    return True
@@ -0,0 +1,181 @@
+"""
+This is the session component.
+A VaultSession represents one unlocked vault: its data key is unwrapped once
+when the vault is unlocked and the resulting cipher is reused for every entry.
+"""
+
+from collections import OrderedDict
+from cryptography.fernet import InvalidToken
+from utils.ciphers import CipherSuite, from_text
+from utils.blind_index import SiteIndex
+from utils.metrics import timed
+
+
+class LRUCache:
+    """A bounded mapping that evicts its least recently used item when full.
+
+    Attributes:
+        maxsize (int): Maximum number of items kept.
+    """
+
+    def __init__(self, maxsize: int = 128) -> None:
+        """Initializes an empty cache holding at most `maxsize` items."""
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        """Returns the cached value for `key` and marks it as recently used."""
+        if key not in self._data:
+            return default
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def put(self, key, value) -> None:
+        """Caches `value` under `key`, evicting the oldest item if needed."""
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def discard(self, key) -> None:
+        """Removes `key` from the cache if present."""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Removes every item from the cache."""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class VaultSession:
+    """An unlocked vault holding a reusable cipher for its entries.
+
+    Attributes:
+        vid (int): The vault id.
+        vname (str): The vault name.
+        sites (SiteIndex): Computes the blind index and search tokens of site names.
+        plaintexts (LRUCache): Recently decrypted passwords, keyed by entry pid.
+    """
+
+    # Maximum number of decrypted passwords kept in memory per session.
+    plaintext_cache_size = 64
+
+    def __init__(self, vault: tuple, key: bytes, substrings: bool = False) -> None:
+        """Unlocks the vault with its entry encryption key.
+
+        Args:
+            vault (tuple): The vault row (vid, vname, ...).
+            key (bytes): The vault's data key, already unwrapped by the caller.
+            substrings (bool, optional): Whether the vault has substring search,
+                see utils.blind_index. Defaults to False.
+        """
+        self.vid = vault[0]
+        self.vname = vault[1]
+        self._cipher = CipherSuite(key)
+        self.sites = SiteIndex(key, substrings)
+        self.plaintexts = LRUCache(self.plaintext_cache_size)
+
+    def reveal(self, entry: tuple) -> str:
+        """Returns the decrypted password of an entry, decrypting only on a cache miss.
+
+        Args:
+            entry (tuple): The (pid, vid, site, esp) entry.
+
+        Returns:
+            str: The decrypted password.
+        """
+        pwd = self.plaintexts.get(entry[0])
+        if pwd is None:
+            pwd = self.decrypt(entry[3])
+            self.plaintexts.put(entry[0], pwd)
+        return pwd
+
+    @timed("crypto.session.encrypt")
+    def encrypt(self, msg: str) -> bytes:
+        """Encrypts a single message with the vault key.
+
+        Args:
+            msg (str): The message to encrypt.
+
+        Returns:
+            bytes: The raw ciphertext, as stored in the database.
+        """
+        return self.encrypt_many([msg])[0]
+
+    @timed("crypto.session.decrypt")
+    def decrypt(self, ciphertext: bytes) -> str:
+        """Decrypts a single ciphertext with the vault key.
+
+        Args:
+            ciphertext (bytes): The ciphertext to decrypt.
+
+        Returns:
+            str: The decrypted plaintext, or "" if it could not be decrypted.
+        """
+        return self.decrypt_many([ciphertext])[0]
+
+    @timed("crypto.session.encrypt_many")
+    def encrypt_many(self, msgs: list) -> list:
+        """Encrypts a batch of messages with the vault key.
+
+        Args:
+            msgs (list): The messages to encrypt.
+
+        Returns:
+            list: The raw ciphertexts, in the same order as `msgs`.
+        """
+        encrypt = self._cipher.encrypt
+        return [encrypt(msg.encode()) for msg in msgs]
+
+    @timed("crypto.session.decrypt_many")
+    def decrypt_many(self, ciphertexts: list, strict: bool = False) -> list:
+        """Decrypts a batch of ciphertexts with the vault key.
+
+        Args:
+            ciphertexts (list): The ciphertexts to decrypt, as bytes (or as base64
+                text, the format used before BLOB storage).
+            strict (bool, optional): Raise InvalidToken instead of returning "" for
+                ciphertexts that fail to decrypt. Defaults to False.
+
+        Returns:
+            list: The plaintexts, in the same order as `ciphertexts`. Entries that
+            fail to decrypt are returned as "".
+        """
+        decrypt = self._cipher.decrypt
+        plaintexts = []
+        for ciphertext in ciphertexts:
+            try:
+                if isinstance(ciphertext, str):
+                    ciphertext = from_text(ciphertext)
+                plaintexts.append(decrypt(ciphertext).decode())
+            except (InvalidToken, ValueError) as e:
+                if strict:
+                    raise InvalidToken("ciphertext could not be decrypted") from e
+                print(f"Decryption error: {e}")
+                plaintexts.append("")
+        return plaintexts
+
+    def open_entries(self, entries: list) -> list:
+        """Decrypts the site names of entries read from the database.
+
+        Args:
+            entries (list): (pid, vid, site, esp, ...) rows whose site is a
+                ciphertext, or plain text in vaults whose sites are not encrypted
+                yet (see misc.encrypt_vault_sites()).
+
+        Returns:
+            list: The same rows with plain text site names.
+        """
+        sites = iter(self.decrypt_many([e[2] for e in entries if not isinstance(e[2], str)]))
+        return [
+            (e[0], e[1], e[2] if isinstance(e[2], str) else next(sites), *e[3:])
+            for e in entries
+        ]
+
+    def close(self) -> None:
+        """Wipes decrypted passwords and drops the keys held by this session."""
+        self.plaintexts.clear()
+        self._cipher = None
+        self.sites = None
@@ -0,0 +1,33 @@
+"""
+This is the startup component.
+It records when each phase of the app's startup ends, counted from the moment
+this module is first imported (the first import of app.py). Set
+CRYPTICAL_STARTUP_TIMING=1 to have the phases printed to stderr as one JSON
+object once startup is complete; benchmarks/bench_startup.py reads it.
+"""
+
+import json, os, sys, time
+
+# Whether the timings are reported.
+ENABLED = os.environ.get("CRYPTICAL_STARTUP_TIMING") == "1"
+# Quit as soon as startup is complete and reported, for benchmarks.
+EXIT_AFTER = os.environ.get("CRYPTICAL_STARTUP_EXIT") == "1"
+
+_start = time.perf_counter()
+_phases = {}
+
+
+def mark(phase: str) -> None:
+    """Records that a startup phase just ended."""
+    _phases[phase] = time.perf_counter()
+
+
+def timings() -> dict:
+    """Returns the milliseconds from the start to the end of every phase, in order."""
+    return {phase: round((end - _start) * 1000, 1) for phase, end in _phases.items()}
+
+
+def report() -> None:
+    """Prints the timings to stderr when CRYPTICAL_STARTUP_TIMING is set."""
+    if ENABLED:
+        print(json.dumps({"startup_ms": timings()}), file=sys.stderr, flush=True)
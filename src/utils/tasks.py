@@ -0,0 +1,167 @@
+"""
+This is the tasks component.
+It runs database, hashing and crypto work on a thread pool and hands the results
+back to the Tk main loop, so that the UI never blocks while the work is done.
+Tk widgets are only ever touched from the main thread: workers put their results
+on a queue that the main loop drains with after().
+"""
+
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Task:
+    """A unit of work submitted to the TaskScheduler.
+
+    Attributes:
+        cancelled (bool): Whether the task was cancelled; its callbacks are then skipped.
+    """
+
+    def __init__(self, fn, args, on_done, on_error, owner) -> None:
+        """Initializes the task.
+
+        Args:
+            fn (callable): The function to run on a worker thread.
+            args (tuple): Arguments for `fn`.
+            on_done (callable): Called on the main thread with the result of `fn`.
+            on_error (callable): Called on the main thread with the exception `fn` raised.
+            owner: A widget; the callbacks are skipped once it has been destroyed.
+        """
+        self.fn = fn
+        self.args = args
+        self.on_done = on_done
+        self.on_error = on_error
+        self.owner = owner
+        self.cancelled = False
+        self.future = None
+
+    def cancel(self) -> None:
+        """Cancels the task; it is not started if still queued and its callbacks never run."""
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel()
+
+    def owner_alive(self) -> bool:
+        """Returns whether the owner widget (if any) still exists."""
+        try:
+            return self.owner is None or bool(self.owner.winfo_exists())
+        except Exception:
+            return False
+
+
+class TaskScheduler:
+    """Runs tasks on a thread pool and delivers their results on the Tk main loop.
+
+    Attributes:
+        poll_ms (int): How often the main loop checks for finished tasks while
+            tasks are pending, in milliseconds.
+    """
+
+    poll_ms = 16  # roughly once per frame at 60 fps
+
+    def __init__(self, root, workers: int = 4) -> None:
+        """Initializes the scheduler.
+
+        Args:
+            root (tk.Tk): The application root whose main loop receives results.
+            workers (int, optional): Number of worker threads. Defaults to 4.
+        """
+        self.root = root
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="cryptical")
+        self._results = queue.Queue()
+        self._pending = set()
+        self._polling = False
+
+    def submit(self, fn, *args, on_done=None, on_error=None, owner=None) -> Task:
+        """Runs `fn(*args)` on a worker thread.
+
+        Args:
+            fn (callable): The function to run.
+            *args: Arguments for `fn`.
+            on_done (callable, optional): Called on the main thread with the result.
+            on_error (callable, optional): Called on the main thread with the exception.
+                Errors without a handler are printed.
+            owner (optional): A widget; if it is destroyed before the task finishes,
+                the task is cancelled and its callbacks are skipped.
+
+        Returns:
+            Task: The submitted task.
+        """
+        task = Task(fn, args, on_done, on_error, owner)
+        task.future = self._executor.submit(self._run, task)
+        self._pending.add(task)
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self._drain)
+        return task
+
+    def _run(self, task: Task) -> None:
+        """Runs a task on a worker thread and queues its outcome."""
+        if task.cancelled:
+            self._results.put((task, None, None))
+            return
+        try:
+            self._results.put((task, task.fn(*task.args), None))
+        except Exception as e:
+            self._results.put((task, None, e))
+
+    def _drain(self) -> None:
+        """Delivers finished task results on the main thread."""
+        while True:
+            try:
+                task, result, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._pending.discard(task)
+            if task.cancelled or not task.owner_alive():
+                continue
+            if error is not None:
+                if task.on_error:
+                    task.on_error(error)
+                else:
+                    print(f"Background task error: {error}")
+            elif task.on_done:
+                task.on_done(result)
+
+        # tasks cancelled before they started never reach the result queue
+        self._pending = {task for task in self._pending if not task.future.cancelled()}
+        if self._pending:
+            self.root.after(self.poll_ms, self._drain)
+        else:
+            self._polling = False
+
+    def cancel_owned(self, owner) -> None:
+        """Cancels every pending task owned by a widget, e.g. when it is closed.
+
+        Args:
+            owner: The widget whose tasks to cancel.
+        """
+        for task in list(self._pending):
+            if task.owner is owner:
+                task.cancel()
+
+    def shutdown(self) -> None:
+        """Stops the worker threads, dropping tasks that have not started yet."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_scheduler = None
+
+
+def start_scheduler(root) -> TaskScheduler:
+    """Creates the application-wide scheduler bound to the given Tk root.
+
+    Args:
+        root (tk.Tk): The application root.
+
+    Returns:
+        TaskScheduler: The scheduler.
+    """
+    global _scheduler
+    _scheduler = TaskScheduler(root)
+    return _scheduler
+
+
+def get_scheduler() -> TaskScheduler:
+    """Returns the application-wide scheduler started by start_scheduler()."""
+    return _scheduler
@@ -0,0 +1,142 @@
+"""
+This is the vacuum component.
+Deleted rows leave free pages behind in the database file. With
+auto_vacuum=INCREMENTAL, `PRAGMA incremental_vacuum(N)` moves up to N of them
+to the end of the file and truncates it; this component does that a few pages
+per transaction on a background thread after large deletes, so the file stays
+proportional to the live data without a long exclusive VACUUM.
+
+New databases use incremental auto-vacuum from the start. Databases created
+before need one VACUUM to switch to it, which rewrites the whole file, so it
+runs here too, in the background and only once there is space to reclaim.
+"""
+
+import sqlite3, threading, time
+from utils.db import BUSY_TIMEOUT_S, connection, transaction
+
+# Free pages worth reclaiming; smaller leftovers are reused by later inserts.
+MIN_FREE_PAGES = 256
+# Pages given back per transaction; other writers only wait for one step.
+PAGES_PER_STEP = 512
+# Pause between steps, leaving the database to the app's own queries.
+STEP_PAUSE_S = 0.01
+
+_running = {}  # database filename -> thread reclaiming it
+_running_lock = threading.Lock()
+
+
+def free_pages(conn: sqlite3.Connection) -> int:
+    """Returns the number of unused pages in the database file."""
+    return conn.execute("PRAGMA freelist_count;").fetchone()[0]
+
+
+def enable_incremental_vacuum(conn: sqlite3.Connection) -> bool:
+    """Switches a database to incremental auto-vacuum with a VACUUM, unless it is busy.
+
+    The VACUUM rewrites the whole file and gives back all of its free pages.
+    It does not wait for other writers: when another connection (e.g. another
+    process) holds the write lock, the database is left as it is, to be
+    converted after a later delete. Open windows see the rewrite as an outside
+    change and re-read their rows once. Must run outside of any transaction.
+
+    Args:
+        conn (sqlite3.Connection): A connection to the database.
+
+    Returns:
+        bool: Whether the database uses incremental auto-vacuum.
+    """
+    if conn.execute("PRAGMA auto_vacuum;").fetchone()[0] == 2:
+        return True
+    conn.execute("PRAGMA busy_timeout=0;")
+    try:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+        conn.execute("VACUUM;")
+    except sqlite3.OperationalError as e:
+        if "locked" not in str(e) and "busy" not in str(e):
+            raise
+        return False
+    finally:
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_S * 1000};")
+    return True
+
+
+def reclaim_space(db_file: str, min_free: int = MIN_FREE_PAGES, progress=None) -> int:
+    """Gives the free pages of a database back to the file system, step by step.
+
+    Steps run as write transactions of the database's pool (see
+    db.transaction()), so open windows do not take them for changes made by
+    another process. May be called on any thread.
+
+    Args:
+        db_file (str): The filename of the database.
+        min_free (int, optional): Only reclaim if at least this many pages are
+            free. Defaults to MIN_FREE_PAGES.
+        progress (callable, optional): Called with the pages still free after
+            every step.
+
+    Returns:
+        int: The number of pages reclaimed.
+    """
+    reclaimed = 0
+    try:
+        with connection(db_file) as conn:
+            before = free_pages(conn)
+            if before < min_free:
+                return 0
+            converting = conn.execute("PRAGMA auto_vacuum;").fetchone()[0] != 2
+            if converting:
+                if not enable_incremental_vacuum(conn):
+                    return 0
+                reclaimed = before - free_pages(conn)
+        while not converting:
+            with transaction(db_file) as conn:  # commits the step
+                before = free_pages(conn)
+                if not before:
+                    break
+                # the pragma gives back one page per statement step, and
+                # Python's sqlite3 steps a statement without columns only once
+                for _ in range(min(before, PAGES_PER_STEP)):
+                    conn.execute("PRAGMA incremental_vacuum(1);")
+                after = free_pages(conn)
+            reclaimed += before - after
+            if progress:
+                progress(after)
+            if after >= before:
+                break  # nothing moved; leave the rest for later
+            time.sleep(STEP_PAUSE_S)
+        # copy the moved pages into the database file so that it shrinks; a
+        # passive checkpoint leaves the log in place, so it does not change the
+        # data version open windows watch
+        with connection(db_file) as conn:
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE);").fetchall()
+    except sqlite3.Error as e:
+        print(f"Error reclaiming database space: {e}")
+    return reclaimed
+
+
+def reclaim_in_background(db_file: str) -> None:
+    """Starts reclaim_space() on a daemon thread unless it runs for db_file already.
+
+    Called after large deletes; it returns at once.
+    """
+    with _running_lock:
+        if db_file in _running:
+            return
+
+        def run():
+            try:
+                reclaim_space(db_file)
+            finally:
+                with _running_lock:
+                    del _running[db_file]
+
+        thread = _running[db_file] = threading.Thread(target=run, name="vacuum", daemon=True)
+        thread.start()
+
+
+def wait_for_reclaims() -> None:
+    """Waits for the running reclaims to finish, e.g. before a script exits."""
+    with _running_lock:
+        threads = list(_running.values())
+    for thread in threads:
+        thread.join()
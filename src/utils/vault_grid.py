@@ -0,0 +1,86 @@
+"""
+This is the vault grid component.
+The main window shows vaults as tiles, a row of them at a time, in a
+VirtualTable: only the rows in view have widgets, which are rebound to other
+vaults as the user scrolls, and every tile shares one cached lock image.
+"""
+
+import customtkinter as ctk
+from utils.assets import ctk_image
+
+VAULT_IMG_PATH = "assets/lock.png"
+VAULT_IMG_SIZE = (50, 60)
+
+
+class VaultTile(ctk.CTkFrame):
+    """A reusable tile showing one vault with a button to enter it."""
+
+    def __init__(self, master, on_enter, *args, **kwargs) -> None:
+        """Creates the tile widgets; they are bound to a vault later by show().
+
+        Args:
+            master: The parent widget.
+            on_enter (callable): Called with the vault id when "Enter Vault" is clicked.
+        """
+        super().__init__(master, fg_color="#212121", corner_radius=15, *args, **kwargs)
+        self.vault = None
+
+        # vault image, shared by every tile
+        self.image_label = ctk.CTkLabel(
+            self, text="", image=ctk_image(VAULT_IMG_PATH, VAULT_IMG_SIZE)
+        )
+        self.image_label.pack(expand=True, fill="x", ipady=10, padx=40, pady=10)
+
+        # vault label
+        self.label = ctk.CTkLabel(self, text="", justify="center")
+        self.label.cget("font").configure(size=18, weight="bold")
+        self.label.pack(expand=True, padx=20)
+
+        # vault button
+        self.button = ctk.CTkButton(
+            self, text="Enter Vault", command=lambda: self.vault and on_enter(self.vault[0])
+        )
+        self.button.pack(expand=True, pady=15, padx=20)
+
+    def show(self, vault: tuple) -> None:
+        """Binds the tile to a (vid, vname, ...) vault."""
+        self.vault = vault
+        self.label.configure(text=vault[1])
+
+
+class VaultRow(ctk.CTkFrame):
+    """A reusable row of vault tiles, the row widget of the vault grid."""
+
+    def __init__(self, master, per_row: int, on_enter, *args, **kwargs) -> None:
+        """Creates the row's tiles.
+
+        Args:
+            master: The parent widget.
+            per_row (int): Number of tiles in a row.
+            on_enter (callable): Called with the vault id when a tile's button is clicked.
+        """
+        super().__init__(master, fg_color="transparent", *args, **kwargs)
+        self.rowconfigure(0, weight=1)
+        self.tiles = []
+        for i in range(per_row):
+            self.columnconfigure(i, weight=1, uniform="tile")
+            self.tiles.append(VaultTile(self, on_enter))
+
+    def show(self, vaults: tuple) -> None:
+        """Binds the row's tiles to up to per_row vaults; None while loading."""
+        for i, tile in enumerate(self.tiles):
+            if vaults and i < len(vaults):
+                tile.show(vaults[i])
+                tile.grid(row=0, column=i, padx=10, sticky="nsew")
+            else:
+                tile.vault = None
+                tile.grid_remove()
+
+    def hide(self) -> None:
+        """Unbinds the row from its vaults."""
+        self.show(None)
+
+
+def vault_rows(vaults: list, per_row: int) -> list:
+    """Groups vaults into grid rows of `per_row` tiles."""
+    return [tuple(vaults[i : i + per_row]) for i in range(0, len(vaults), per_row)]
@@ -1,8 +1,99 @@
-import sqlite3
 import tkinter as tk
 import customtkinter as ctk
-from utils.misc import decrypt, get_data
+from utils.misc import search_sites
+from utils.entry_query import EntryQuery
+from utils.models import get_entry_store
+from utils.tasks import get_scheduler
+from utils.metrics import timed
 from utils.add_entry_dialog import AddEntryDialog
+from utils.virtual_table import KeysetSource, ListSource, VirtualTable
+
+
+class EntryRow(ctk.CTkFrame):
+    """A reusable table row showing one password entry with its options.
+
+    Passwords are shown masked and only decrypted once the row is revealed.
+    """
+
+    MASK = "●" * 8
+
+    def __init__(self, master, session, revealed, on_copy, on_delete, *args, **kwargs):
+        """Creates the row widgets; they are bound to an entry later by show().
+
+        Args:
+            master: The parent widget.
+            session (VaultSession): The unlocked vault the entries belong to.
+            revealed (set): pids of the entries shown unmasked, shared by all rows.
+                None shows every entry unmasked.
+            on_copy (callable): Called with the shown entry when "Copy" is clicked.
+            on_delete (callable): Called with the shown entry when "Delete" is clicked.
+        """
+        super().__init__(master, fg_color="#212121", corner_radius=5, *args, **kwargs)
+        self.session = session
+        self.revealed = revealed
+        self.entry = None
+        self.rowconfigure(0, weight=1)
+        self.columnconfigure(0, weight=5)
+        self.columnconfigure(1, weight=1)
+
+        self.label = ctk.CTkLabel(self, text="")
+        self.label.cget("font").configure(size=16)
+        self.label.grid(row=0, column=0)
+        self.buttons_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.buttons_frame.grid(row=0, column=1, pady=5)
+
+        # Create show/hide button for the shown entry
+        self.show_button = ctk.CTkButton(
+            self.buttons_frame, text="Show", width=70, command=self.toggle_reveal
+        )
+        if self.revealed is not None:
+            self.show_button.pack(side="left", padx=(0, 10))
+
+        # Create copy button for the shown entry
+        self.copy_button = ctk.CTkButton(
+            self.buttons_frame, text="Copy", command=lambda: self.entry and on_copy(self.entry)
+        )
+        self.copy_button.pack(side="left")
+
+        # Create delete button for the shown entry
+        self.del_button = ctk.CTkButton(
+            self.buttons_frame, text="Delete", command=lambda: self.entry and on_delete(self.entry)
+        )
+        self.del_button.pack(after=self.copy_button, padx=10)
+
+    def show(self, entry: tuple) -> None:
+        """Binds the row to an entry.
+
+        Args:
+            entry (tuple): The (pid, vid, site, esp) entry to show, or None while
+                it is still loading.
+        """
+        self.entry = entry
+        if entry is None:
+            self.label.configure(text="Loading…")
+            return
+        if self.revealed is None or entry[0] in self.revealed:
+            pwd = self.session.reveal(entry)
+            self.show_button.configure(text="Hide")
+        else:
+            pwd = self.MASK
+            self.show_button.configure(text="Show")
+        self.label.configure(text=f"{entry[2]} :: {pwd}")
+
+    def toggle_reveal(self) -> None:
+        """Switches the shown entry between masked and revealed."""
+        if self.entry is None:
+            return
+        if self.entry[0] in self.revealed:
+            self.revealed.discard(self.entry[0])
+        else:
+            self.revealed.add(self.entry[0])
+        self.show(self.entry)
+
+    def hide(self) -> None:
+        """Unbinds the row from its entry."""
+        self.entry = None
+        self.label.configure(text="")
 
 
 class VaultWindow(ctk.CTkToplevel):
@@ -10,51 +101,62 @@ class VaultWindow(ctk.CTkToplevel):
 
     Attributes:
         add_entry_dialog (AddRecordDialog): The add record dialog.
+        mask_passwords (bool): Whether passwords stay masked until revealed.
+        search_delay_ms (int): Typing pause after which the search runs.
         win_height (int): The window height.
         win_width (int): The window width.
     """
 
     add_entry_dialog = None
+    mask_passwords = True
+    search_delay_ms = 150
     win_height = 580
     win_width = 1100
 
-    def __init__(self, db_file: str, vault: tuple, vmp: str, *args, **kwargs):
+    @timed("ui.vault_window.open")
+    def __init__(self, db_file: str, session, *args, **kwargs):
         """Initializes the window.
 
         Args:
             db_file (str): The path to the database file.
-            vault (tuple): The vault information.
-            vmp (str): The vault master password.
+            session (VaultSession): The unlocked vault to display.
             *args: Arguments to be passed to the parent constructor.
             **kwargs: Keyword arguments to be passed to the parent constructor.
         """
         super().__init__(*args, **kwargs)  # call base constructor
-        vid = vault[0]
-        vname = vault[1]
 
         # Set window props
-        self.title(f"{vname}")  # title
+        self.title(f"{session.vname}")  # title
         self.geometry(f"{self.win_width}x{self.win_height}")  # dimensions
         self.configure(fg_color="#141212")  # bg color
-        self.rowconfigure(1, weight=1)  # enable horizontal scaling on resize
+        self.rowconfigure(2, weight=1)  # enable horizontal scaling on resize
         self.columnconfigure(0, weight=1)  # enable vertical scaling on resize
 
+        # pids of the entries the user revealed
+        self.revealed = set() if self.mask_passwords else None
+        self.db_file = db_file
+        self.session = session
+        self.search_query = ""  # the search the table shows; "" shows every entry
+        self.search_after = None  # pending debounced search
+
         # Build the UI
-        self.build_ui(db_file, vmp, vname, vid)
+        self.build_ui(db_file, session)
+
+        # Keep the table in sync with entries added or deleted anywhere in the app
+        self.unsubscribe = get_entry_store(db_file).subscribe(self.on_entry_change)
 
-    def build_ui(self, db_file: str, vmp: str, vname: str, vid: int):
+    @timed("ui.vault_window.build_ui")
+    def build_ui(self, db_file: str, session):
         """Builds the user interface.
 
         Args:
             db_file (str): The path to the database file.
-            vmp (str): The vault master password.
-            vname (str): The vault name.
-            vid (int): The vault ID.
+            session (VaultSession): The unlocked vault to display.
         """
         # Header UI
         self.header = ctk.CTkFrame(self, fg_color="#212121", corner_radius=0)
         self.header.grid(row=0, column=0, sticky="new")
-        self.header.label = ctk.CTkLabel(self.header, text=vname)
+        self.header.label = ctk.CTkLabel(self.header, text=session.vname)
         self.header.label.cget("font").configure(size=20, weight="bold")
         self.header.label.pack(side="left", padx=20, pady=10)
 
@@ -62,25 +164,25 @@ class VaultWindow(ctk.CTkToplevel):
         self.header.add_entry_button = ctk.CTkButton(
             self.header,
             text="Add Password",
-            command=lambda: self.init_add_entry_dialog(db_file, vmp, vname, vid),
+            command=lambda: self.init_add_entry_dialog(db_file, session),
         )
         self.header.add_entry_button.pack(side="right", padx=20, pady=10)
 
-        # Entry Table UI
-        available_entries = get_data(db_file, f"SELECT * FROM entries WHERE vid={vid};")
-
-        # Create scrollable frame for the table
-        self.table_frame = ctk.CTkScrollableFrame(self, fg_color="transparent")
-        self.table_frame.grid(row=1, column=0, sticky="nsew")
-
-        # Create frame for column names
-        self.colname_frame = ctk.CTkFrame(
-            self.table_frame, fg_color="#212121", corner_radius=5
+        # Search box; the table shows matching entries as the user types
+        self.header.search_entry = ctk.CTkEntry(
+            self.header, placeholder_text="Search sites", width=250
+        )
+        self.header.search_entry.pack(side="right", pady=10)
+        self.header.search_entry.bind(
+            "<KeyRelease>", lambda event: self.on_search_typed(db_file, session)
         )
+
+        # Column names UI
+        self.colname_frame = ctk.CTkFrame(self, fg_color="#212121", corner_radius=5)
         self.colname_frame.rowconfigure(0, weight=1)
         self.colname_frame.columnconfigure(0, weight=3)
         self.colname_frame.columnconfigure(1, weight=2)
-        self.colname_frame.pack(expand=True, fill="x", padx=10, pady=10, ipady=10)
+        self.colname_frame.grid(row=1, column=0, sticky="new", padx=10, pady=10, ipady=10)
 
         # Create label for "Site :: Password" column
         self.colname_splabel = ctk.CTkLabel(self.colname_frame, text="Site :: Password")
@@ -92,69 +194,125 @@ class VaultWindow(ctk.CTkToplevel):
         self.colname_olabel.cget("font").configure(size=18, weight="bold")
         self.colname_olabel.grid(row=0, column=1)
 
-        # Create UI elements for each password entry
-        for i, entry in enumerate(available_entries):
-            # Create frame for password entry
-            tmpe_frame = ctk.CTkFrame(
-                self.table_frame, fg_color="#212121", corner_radius=5
-            )
-            tmpe_frame.rowconfigure(0, weight=1)
-            tmpe_frame.columnconfigure(0, weight=5)
-            tmpe_frame.columnconfigure(1, weight=1)
-            tmpe_frame.pack(expand=True, fill="x", padx=10, pady=5, ipady=5)
-
-            # Get the site and password for the current entry
-            site = entry[2]
-            pwd = decrypt(key=vmp, ciphertext=entry[3])
-            tmpe_label = ctk.CTkLabel(tmpe_frame, text=f"{site} :: {pwd}")
-            tmpe_label.cget("font").configure(size=16)
-            tmpe_label.grid(row=0, column=0)
-            tmpe_buttons_frame = ctk.CTkFrame(tmpe_frame, fg_color="transparent")
-            tmpe_buttons_frame.grid(row=0, column=1, pady=5)
-
-            # Create copy button for the current entry
-            tmpe_copy_button = ctk.CTkButton(
-                tmpe_buttons_frame,
-                text="Copy",
-                command=lambda: self.copy_to_clipboard(vmp, entry[3]),
-            )
-            tmpe_copy_button.pack(side="left")
-
-            # Create delete button for the current entry
-            tmpe_del_button = ctk.CTkButton(
-                tmpe_buttons_frame,
-                text="Delete",
-                command=lambda pid=entry[0]: self.delete_entry(
-                    db_file, vmp, vname, vid, pid
-                ),
-            )
-            tmpe_del_button.pack(after=tmpe_copy_button, padx=10)
-
-    def delete_entry(self, db_file, vmp, vname, vid, pid) -> None:
-        """Delete a record from the database with a given pid (primary ID).
+        # Entry Table UI
+        # Entries are read a page at a time in the background and only the rows
+        # in view get widgets
+        self.table = VirtualTable(
+            self,
+            self.all_entries_source(db_file, session),
+            lambda master: EntryRow(
+                master,
+                session,
+                self.revealed,
+                on_copy=lambda entry: self.copy_to_clipboard(session, entry),
+                on_delete=lambda entry: self.delete_entry(db_file, entry),
+            ),
+            fg_color="transparent",
+        )
+        self.table.grid(row=2, column=0, sticky="nsew")
+
+    def all_entries_source(self, db_file: str, session) -> KeysetSource:
+        """Returns a data source reading every entry of the vault in the background."""
+        query = EntryQuery(db_file, session.vid)
+        # site names are decrypted on the worker thread, along with the read
+        return KeysetSource(
+            fetch=lambda after, offset, limit: session.open_entries(
+                query.page(after, offset, limit) or []
+            ),
+            count=query.count,
+            key=query.key,
+            scheduler=get_scheduler(),
+            owner=self,
+        )
+
+    def on_search_typed(self, db_file: str, session) -> None:
+        """Runs the search once the user pauses typing.
+
+        Args:
+            db_file (str): The path to the database file.
+            session (VaultSession): The unlocked vault to search.
+        """
+        if self.search_after is not None:
+            self.after_cancel(self.search_after)
+        self.search_after = self.after(
+            self.search_delay_ms, lambda: self.search(db_file, session)
+        )
+
+    def search(self, db_file: str, session) -> None:
+        """Shows the entries whose site matches the search box.
+
+        The matches are found (and their sites decrypted) on a worker thread,
+        then shown from memory; see misc.search_sites().
+
+        Args:
+            db_file (str): The path to the database file.
+            session (VaultSession): The unlocked vault to search.
+        """
+        self.search_after = None
+        query = self.header.search_entry.get().strip()
+        # reads for the previous search are no longer needed
+        get_scheduler().cancel_owned(self)
+        self.search_query = query
+        if not query:
+            self.table.set_source(self.all_entries_source(db_file, session))
+            return
+
+        def on_found(rows):
+            if query != self.search_query:
+                return  # the user typed on meanwhile
+            self.table.set_source(ListSource(lambda: rows))
+
+        get_scheduler().submit(
+            search_sites, db_file, session, query, on_done=on_found, owner=self
+        )
+
+    def delete_entry(self, db_file, entry) -> None:
+        """Delete a record from the database.
 
         Args:
             db_file (str): path to the database file
-            vmp (bytes): the master password used to decrypt the database
-            vname (str): the name of the vault to which the record belongs
-            vid (int): the ID of the vault to which the record belongs
-            pid (int): the primary ID of the record to delete
+            entry (tuple): the (pid, vid, site, esp) record to delete
 
         Returns: None
         """
-        with sqlite3.connect(db_file) as conn:
-            conn.cursor().execute(f"DELETE FROM entries WHERE pid={pid};")
-            conn.commit()
-        self.build_ui(db_file, vmp, vname, vid)
+        get_entry_store(db_file).delete(entry)
 
-    def init_add_entry_dialog(self, db_file, vmp, vname, vid) -> None:
+    def on_entry_change(self, event, entry) -> None:
+        """Adds or removes the one table row affected by an entry change.
+
+        Args:
+            event (str): "insert", "delete", or "reload" after another process
+                changed the database.
+            entry (tuple): the (pid, vid, site, esp) record that changed, or None
+
+        Returns: None
+        """
+        if event == "reload":
+            if self.search_query:
+                self.search(self.db_file, self.session)
+            else:
+                self.table.refresh()  # re-reads the rows in view
+            return
+        if entry[1] != self.session.vid:
+            return
+        if event == "delete":
+            self.session.plaintexts.discard(entry[0])
+            if self.revealed is not None:
+                self.revealed.discard(entry[0])
+        if self.search_query:
+            # search results are held in memory; search again
+            self.search(self.db_file, self.session)
+        elif event == "insert":
+            self.table.insert(entry)
+        else:
+            self.table.remove(entry)
+
+    def init_add_entry_dialog(self, db_file, session) -> None:
         """Initializes the Add Entry Dialog if it doesn't exist already.
 
         Args:
             db_file (str): path to the database file
-            vmp (bytes): the master password used to decrypt the database
-            vname (str): the name of the vault to which the record belongs
-            vid (int): the ID of the vault to which the record belongs
+            session (VaultSession): the unlocked vault to add the record to
 
         Returns: None
         """
@@ -165,16 +323,26 @@ class VaultWindow(ctk.CTkToplevel):
             return
 
         # If the dialog does not exist, create a new instance of AddEntryDialog
-        self.add_entry_dialog = AddEntryDialog(db_file, vmp, vname, vid, self)
+        self.add_entry_dialog = AddEntryDialog(db_file, session, self)
 
-    def copy_to_clipboard(self, vmp, esp) -> None:
+    def copy_to_clipboard(self, session, entry) -> None:
         """Copies a password to the system clipboard.
 
         Args:
-            pwd: str, the password to copy
+            session (VaultSession): the unlocked vault the password belongs to
+            entry (tuple): the (pid, vid, site, esp) entry whose password to copy
 
         Returns: None
         """
-        pwd = decrypt(vmp, esp)
+        pwd = session.reveal(entry)
         self.clipboard_append(pwd)
         self.update()
+
+    def destroy(self) -> None:
+        """Cancels pending reads and wipes decrypted passwords before closing the window."""
+        get_scheduler().cancel_owned(self)
+        if self.search_after is not None:
+            self.after_cancel(self.search_after)
+        self.unsubscribe()
+        self.session.close()
+        super().destroy()
@@ -0,0 +1,452 @@
+"""
+This is the virtual table component.
+It shows a large list of rows with a fixed pool of row widgets sized to the
+viewport, rebinding them to data as the user scrolls, so the number of widgets
+does not depend on the number of rows.
+"""
+
+import sys
+from collections import OrderedDict
+from tkinter import TclError
+import customtkinter as ctk
+from utils.metrics import timed
+
+
+class KeysetSource:
+    """A windowed view over rows that are read page by page from the database.
+
+    Pages are read with keyset pagination (`key > last key of previous page`)
+    whenever the previous page boundary is known, falling back to an offset only
+    on jumps. Only a bounded number of pages is kept in memory.
+
+    With a scheduler, pages and the row count are read on worker threads: rows of
+    pages that are still loading are returned as None and `on_loaded` is called
+    once they arrive.
+
+    Attributes:
+        page_size (int): Number of rows read per query.
+        max_pages (int): Number of pages kept cached.
+    """
+
+    page_size = 100
+    max_pages = 8
+
+    def __init__(
+        self, fetch, count, key=lambda row: row[0], scheduler=None, owner=None
+    ) -> None:
+        """Initializes the source.
+
+        Args:
+            fetch (callable): fetch(after_key, offset, limit) returning a list of rows.
+                When after_key is not None, offset is ignored.
+            count (callable): count() returning the total number of rows.
+            key (callable, optional): Returns the sort key of a row. Defaults to row[0].
+            scheduler (TaskScheduler, optional): Reads in the background when given.
+            owner (optional): The widget owning the background reads.
+        """
+        self._fetch = fetch
+        self._count = count
+        self._key = key
+        self._scheduler = scheduler
+        self._owner = owner
+        self._pages = OrderedDict()
+        self._last_keys = {}
+        self._total = None
+        self._loading = set()  # page numbers (and "count") being read
+        self._generation = 0  # bumped whenever in-flight reads become stale
+        self.on_loaded = None
+
+    @property
+    def loading(self) -> bool:
+        """Whether any background read is in progress."""
+        return bool(self._loading)
+
+    def count(self) -> int:
+        """Returns the total number of rows, cached until the next refresh.
+
+        Returns 0 while the count is still being read in the background.
+        """
+        if self._total is None:
+            if self._scheduler is None:
+                self._total = self._count()
+            else:
+                self._load("count", self._count, self._set_total)
+                return 0
+        return self._total
+
+    def _set_total(self, total: int) -> None:
+        """Stores a row count read in the background."""
+        self._total = total
+
+    def _load(self, what, fn, store, *args) -> None:
+        """Reads something on a worker thread unless it is already being read.
+
+        Args:
+            what: Name of the read, a page number or "count".
+            fn (callable): The read to run in the background.
+            store (callable): Called on the main thread with the result.
+            *args: Arguments for `fn`.
+        """
+        if what in self._loading:
+            return
+        self._loading.add(what)
+        generation = self._generation
+
+        def on_done(result):
+            if generation != self._generation:
+                return  # the data changed meanwhile; the read is retried on demand
+            self._loading.discard(what)
+            store(result)
+            if self.on_loaded:
+                self.on_loaded()
+
+        self._scheduler.submit(fn, *args, on_done=on_done, owner=self._owner)
+
+    def rows(self, start: int, stop: int) -> list:
+        """Returns the rows in the half-open range [start, stop).
+
+        Args:
+            start (int): Index of the first row.
+            stop (int): Index after the last row.
+
+        Returns:
+            list: The rows, possibly fewer if the range runs past the end. Rows
+            that are still loading are None.
+        """
+        rows = []
+        for page_no in range(start // self.page_size, (stop - 1) // self.page_size + 1):
+            page = self._page(page_no)
+            base = page_no * self.page_size
+            if page is None:
+                # page still loading; hold its place with None rows
+                page = [None] * min(self.page_size, self.count() - base)
+            rows.extend(page[max(start - base, 0) : max(stop - base, 0)])
+        return rows
+
+    def _page(self, page_no: int) -> list:
+        """Returns one page of rows, reading it from the database if not cached.
+
+        Args:
+            page_no (int): Index of the page.
+
+        Returns:
+            list: The rows of the page, or None while it is read in the background.
+        """
+        if page_no in self._pages:
+            self._pages.move_to_end(page_no)
+            return self._pages[page_no]
+
+        args = (self._last_keys.get(page_no - 1), page_no * self.page_size, self.page_size)
+        if self._scheduler is not None:
+            self._load(
+                page_no,
+                self._fetch,
+                lambda page: self._store_page(page_no, page or []),
+                *args,
+            )
+            return None
+        return self._store_page(page_no, self._fetch(*args) or [])
+
+    def _store_page(self, page_no: int, page: list) -> list:
+        """Caches a page that has been read, evicting the least recently used page.
+
+        Args:
+            page_no (int): Index of the page.
+            page (list): The rows of the page.
+
+        Returns:
+            list: The rows of the page.
+        """
+        if len(page) == self.page_size:
+            # only full pages have a stable boundary to continue from
+            self._last_keys[page_no] = self._key(page[-1])
+
+        self._pages[page_no] = page
+        if len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+        return page
+
+    def insert(self, row) -> None:
+        """Accounts for a row added to the database without re-reading cached pages.
+
+        Args:
+            row: The added row.
+        """
+        self._invalidate_from(self._key(row))
+        if self._total is not None:
+            self._total += 1
+
+    def remove(self, row) -> None:
+        """Accounts for a row removed from the database without re-reading cached pages.
+
+        Args:
+            row: The removed row.
+        """
+        self._invalidate_from(self._key(row))
+        if self._total is not None:
+            self._total = max(0, self._total - 1)
+
+    def _invalidate_from(self, key) -> None:
+        """Drops the cached pages whose contents shift when a row with `key` changes.
+
+        Full pages that end before `key` are unaffected and stay cached.
+
+        Args:
+            key: The sort key of the added or removed row.
+        """
+        self._generation += 1
+        self._loading.clear()
+        for page_no in [p for p, last in self._last_keys.items() if last >= key]:
+            del self._last_keys[page_no]
+        for page_no in [p for p in self._pages if p not in self._last_keys]:
+            del self._pages[page_no]
+
+    def refresh(self) -> None:
+        """Drops all cached pages and the cached row count."""
+        self._generation += 1
+        self._loading.clear()
+        self._pages.clear()
+        self._last_keys.clear()
+        self._total = None
+
+
+class ListSource:
+    """Rows that are already in memory, with the interface of KeysetSource.
+
+    Attributes:
+        loading (bool): Always False; nothing is read in the background.
+    """
+
+    loading = False
+
+    def __init__(self, read) -> None:
+        """Initializes the source.
+
+        Args:
+            read (callable): read() returning the list of rows; called again
+                after every refresh.
+        """
+        self._read = read
+        self._rows = None
+        self.on_loaded = None
+
+    def _all(self) -> list:
+        """Returns the rows, reading them if not cached."""
+        if self._rows is None:
+            self._rows = self._read()
+        return self._rows
+
+    def count(self) -> int:
+        """Returns the number of rows."""
+        return len(self._all())
+
+    def rows(self, start: int, stop: int) -> list:
+        """Returns the rows in the half-open range [start, stop)."""
+        return self._all()[start:stop]
+
+    def insert(self, row) -> None:
+        """Re-reads the rows after one was added."""
+        self.refresh()
+
+    def remove(self, row) -> None:
+        """Re-reads the rows after one was removed."""
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Drops the cached rows."""
+        self._rows = None
+
+
+class VirtualTable(ctk.CTkFrame):
+    """A scrollable table that only materializes the rows in view.
+
+    Attributes:
+        row_height (int): Height in pixels a row takes, padding included; an
+            estimate until the first row shown is measured.
+        row_pady (int): Padding in pixels above and below each row.
+    """
+
+    row_height = 50
+    row_pady = 5
+
+    def __init__(self, master, source, row_factory, *args, **kwargs) -> None:
+        """Initializes the table.
+
+        Args:
+            master: The parent widget.
+            source (KeysetSource | ListSource): Provides count() and rows(start, stop).
+            row_factory (callable): row_factory(parent) returning a row widget with
+                show(row) and hide() methods; show(None) marks a row still loading.
+            *args: Arguments to be passed to the parent constructor.
+            **kwargs: Keyword arguments to be passed to the parent constructor.
+        """
+        super().__init__(master, *args, **kwargs)  # call base constructor
+        self.source = source
+        self.row_factory = row_factory
+        self.first = 0  # index of the first row in view
+        self.pool = []  # row widgets, reused as the view scrolls
+        self.measured = False  # whether row_height was measured
+
+        self.source.on_loaded = self.render
+
+        self.rowconfigure(1, weight=1)
+        self.columnconfigure(0, weight=1)
+
+        # progress bar shown while rows are read in the background
+        self.progress = ctk.CTkProgressBar(self, mode="indeterminate")
+
+        # body holding the row pool; it must not grow with its rows
+        self.body = ctk.CTkFrame(self, fg_color="transparent")
+        self.body.grid(row=1, column=0, sticky="nsew")
+        self.body.pack_propagate(False)
+
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.on_scrollbar)
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
+
+        self.body.bind("<Configure>", self.on_resize)
+        # wheel events go to the widget under the pointer (or in focus), so they
+        # are caught for every widget and filtered in on_wheel; the handlers
+        # are removed again in destroy()
+        if sys.platform.startswith("linux"):
+            sequences = ("<Button-4>", "<Button-5>")
+        else:
+            sequences = ("<MouseWheel>",)
+        self.wheel_bindings = [
+            (sequence, self.bind_all(sequence, self.on_wheel, add="+")) for sequence in sequences
+        ]
+
+    def on_resize(self, event) -> None:
+        """Grows or shrinks the row pool to fit the viewport height."""
+        self.fit_pool(event.height)
+        self.render()
+
+    def fit_pool(self, height: int) -> None:
+        """Creates or destroys row widgets so that the pool fills `height` pixels."""
+        wanted = max(1, height // self.row_height)
+        while len(self.pool) < wanted:
+            self.pool.append(self.row_factory(self.body))
+        while len(self.pool) > wanted:
+            self.pool.pop().destroy()
+
+    def measure_rows(self) -> None:
+        """Measures row_height on the first row shown, and refits the pool to it.
+
+        A row takes the height its widget asks for (its own padding included)
+        plus row_pady above and below it.
+        """
+        self.measured = True
+        self.pool[0].update_idletasks()
+        height = self.pool[0].winfo_reqheight() + 2 * self.row_pady
+        if height != self.row_height:
+            self.row_height = height
+            self.fit_pool(self.body.winfo_height())
+            self.render()
+
+    @timed("ui.virtual_table.render")
+    def render(self) -> None:
+        """Binds the pooled row widgets to the rows currently in view."""
+        total = self.source.count()
+        self.first = max(0, min(self.first, total - len(self.pool)))
+        rows = self.source.rows(self.first, self.first + len(self.pool)) if total else []
+
+        for i, widget in enumerate(self.pool):
+            if i < len(rows):
+                widget.show(rows[i])
+                if not widget.winfo_manager():
+                    widget.pack(fill="x", padx=10, pady=self.row_pady)
+            else:
+                widget.hide()
+                widget.pack_forget()
+
+        if total:
+            self.scrollbar.set(self.first / total, (self.first + len(rows)) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+        if self.source.loading and not self.progress.winfo_manager():
+            self.progress.grid(row=0, column=0, columnspan=2, sticky="ew", padx=10)
+            self.progress.start()
+        elif not self.source.loading and self.progress.winfo_manager():
+            self.progress.stop()
+            self.progress.grid_remove()
+
+        if rows and not self.measured:
+            self.measure_rows()
+
+    def set_source(self, source) -> None:
+        """Shows the rows of another data source, scrolled to the top.
+
+        Args:
+            source (KeysetSource | ListSource): The new data source.
+        """
+        self.source.on_loaded = None
+        self.source = source
+        self.source.on_loaded = self.render
+        self.first = 0
+        self.render()
+
+    def refresh(self) -> None:
+        """Re-reads the data source and re-renders the rows in view."""
+        self.source.refresh()
+        self.render()
+
+    def insert(self, row) -> None:
+        """Shows a row added to the data source, re-rendering only the rows in view."""
+        self.source.insert(row)
+        self.render()
+
+    def remove(self, row) -> None:
+        """Drops a row removed from the data source, re-rendering only the rows in view."""
+        self.source.remove(row)
+        self.render()
+
+    def scroll_to(self, first: int) -> None:
+        """Scrolls so that the row at index `first` is at the top of the view."""
+        self.first = first
+        self.render()
+
+    def on_scrollbar(self, action, amount, unit=None) -> None:
+        """Handles scrollbar drags and clicks.
+
+        Args:
+            action (str): "moveto" or "scroll".
+            amount (str): Fraction for "moveto", number of units for "scroll".
+            unit (str, optional): "units" or "pages" for "scroll".
+        """
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * self.source.count()))
+        elif action == "scroll":
+            step = len(self.pool) if unit == "pages" else 1
+            self.scroll_to(self.first + int(amount) * step)
+
+    def on_wheel(self, event) -> None:
+        """Scrolls the view by three rows per mouse wheel notch over the table."""
+        if not self.contains(event.widget):
+            return
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.first - 3)
+        else:
+            self.scroll_to(self.first + 3)
+
+    def contains(self, widget) -> bool:
+        """Tells whether a widget (or its Tk path name) is the table body or inside it."""
+        path, body = str(widget), str(self.body)
+        try:
+            while path:
+                if path == body:
+                    return True
+                path = self.tk.call("winfo", "parent", path)
+        except TclError:  # destroyed meanwhile
+            pass
+        return False
+
+    def destroy(self) -> None:
+        """Removes the table's mouse wheel handlers, then destroys it."""
+        for sequence, funcid in self.wheel_bindings:
+            # keep the handlers other widgets bound to the same sequence
+            script = self.tk.call("bind", "all", sequence)
+            kept = "\n".join(line for line in script.split("\n") if funcid not in line)
+            self.tk.call("bind", "all", sequence, kept)
+        self.wheel_bindings = []
+        self.source.on_loaded = None
+        super().destroy()